@@ -0,0 +1,72 @@
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nugs_vid_dl  # noqa: E402
+
+# Moving a finished video into the library with a checksum: the old way (copy, then read
+# the copy again to hash it) against nugs_vid_dl.copy_with_checksum (hash while copying).
+# Bytes read come from /proc/self/io (rchar, Linux only) so the second pass shows even
+# when the page cache makes it cheap. Use --destination on another disk or a network share
+# to see the real cost of re-reading a file there.
+
+
+def bytes_read():
+    try:
+        with open('/proc/self/io', 'r', encoding='ascii') as f:
+            return int(next(line for line in f if line.startswith('rchar')).split()[1])
+    except (OSError, StopIteration):
+        return None
+
+
+def copy_then_hash(source, destination, algorithm):
+    shutil.copyfile(source, destination)
+    digest = hashlib.new(algorithm)
+    with open(destination, 'rb') as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b''):
+            digest.update(chunk)
+    return f'{algorithm}:{digest.hexdigest()}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy-then-hash against hashing while copying.')
+    parser.add_argument('--mb', type=int, default=512, help='Size of the test file in MB.')
+    parser.add_argument('--algorithm', default='sha256')
+    parser.add_argument('--destination', help='Folder to copy to (default: a temp folder).')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='nugs_checksum_')
+    destination_dir = args.destination or workdir
+    try:
+        source = os.path.join(workdir, 'source.ts')
+        with open(source, 'wb') as f:
+            for _ in range(args.mb):
+                f.write(os.urandom(1000 ** 2))
+        results = {}
+        for label, copy in (('copy, then hash', copy_then_hash), ('hash while copying', nugs_vid_dl.copy_with_checksum)):
+            samples = []
+            for i in range(args.repeat):
+                destination = os.path.join(destination_dir, f'.bench_copy_{i}.mkv')
+                before = bytes_read()
+                started = time.perf_counter()
+                digest = copy(source, destination, args.algorithm)
+                samples.append(time.perf_counter() - started)
+                read = bytes_read() - before if before is not None else None
+                os.remove(destination)
+            results[label] = digest
+            read_text = f", {read / 1000 ** 2:.0f} MB read" if read is not None else ''
+            print(f"{label:<20} best {min(samples):.2f}s ({args.mb / min(samples):.0f} MB/s){read_text}")
+        print('checksums match' if len(set(results.values())) == 1 else 'CHECKSUMS DIFFER')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+import argparse
+import contextlib
+import functools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+import nugs_vid_dl  # noqa: E402
+from catalog_export import iter_catalog  # noqa: E402
+from download_journal import DownloadJournal  # noqa: E402
+from image_cache import ImageCache  # noqa: E402
+from fake_nugs_site import FakeDriver, FakeNugsSite, read_fixture  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# (stage, function in nugs_vid_dl) timed on every call
+STAGES = [('login', 'login_to_nugs'), ('navigate', 'navigate_to_page'), ('card parse', 'collect_listing_cards'),
+          ('process_link', 'process_link'), ('download', 'run_go_program'), ('remux', 'convert_to_mkv'),
+          ('move', 'move_file'), ('verify', 'check_video'), ('finalize', 'finalize_download'), ('audio', 'extract_audio')]
+
+CONFIG_TEMPLATE = '''[nugsDownloader]
+email = bench@example.com
+password = bench
+format = 2
+videoFormat = 5
+outPath = Nugs downloads
+token =
+useFfmpegEnvVar = false
+
+[custom_paths]
+video_directory = {workdir}/video
+audio_directory = {workdir}/audio
+script_data_directory = {workdir}/data
+
+[pipeline]
+download_workers = {download_workers}
+job_queue_size = 8
+downloader_command = "{python}" "{bench_dir}/fake_downloader.py"
+ffmpeg_command = "{python}" "{bench_dir}/fake_ffmpeg.py"
+ffprobe_command = "{python}" "{bench_dir}/fake_ffprobe.py"
+download_timeout_minutes = 0
+stall_timeout_minutes = {stall_timeout_minutes}
+remux_workers = {remux_workers}
+scratch_directory = {workdir}/scratch
+
+[catalog]
+backend = {backend}
+api_base = {api_base}
+
+[session]
+max_age_hours = 12
+
+[images]
+cache_size_mb = 500
+workers = 4
+
+[crawl]
+stop_after_known = 5
+max_load_more = 200
+
+[storage]
+volumes = {volumes}
+placement = {placement}
+expected_size_gb = {expected_size_gb}
+min_free_gb = 0
+
+[audio]
+extract = {audio}
+workers = {audio_workers}
+extension = mka
+
+[verify]
+enabled = {verify}
+checksum = sha256
+min_duration_minutes = 5
+min_setlist_ratio = 0.9
+requeue = true
+max_attempts = 3
+
+[rate_limit]
+navigations_per_minute = {navigations_per_minute}
+requests_per_second = {requests_per_second}
+downloads_per_hour = 0
+adaptive = {adaptive}
+max_download_workers = {max_download_workers}
+'''
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.samples.setdefault(stage, []).append(elapsed)
+        return timed
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def prepare_workdir(workdir, site, args):
+    volumes = [os.path.join(workdir, 'video')] + [os.path.join(workdir, f'video{i}') for i in range(2, args.volumes + 1)]
+    for path in volumes + [os.path.join(workdir, name) for name in ('audio', 'data', 'scratch', 'binaries')]:
+        os.makedirs(path, exist_ok=True)
+    shutil.copyfile(os.path.join(ROOT_DIR, 'binaries', 'config.json'), os.path.join(workdir, 'binaries', 'config.json'))
+    with open(os.path.join(workdir, 'nugs_vid_dl_config.ini'), 'w', encoding='utf-8') as f:
+        f.write(CONFIG_TEMPLATE.format(workdir=workdir, python=sys.executable, bench_dir=BENCH_DIR,
+                                       download_workers=args.download_workers, remux_workers=args.remux_workers,
+                                       backend=args.backend, api_base=site.api_base, volumes=', '.join(volumes),
+                                       placement=args.placement, expected_size_gb=args.mb * 2 / 1000,
+                                       audio=str(args.audio_workers > 0).lower(), audio_workers=max(1, args.audio_workers),
+                                       verify=str(not args.no_verify).lower(), stall_timeout_minutes=args.stall_timeout / 60,
+                                       navigations_per_minute=args.navigations_per_minute,
+                                       requests_per_second=args.requests_per_second, adaptive=str(args.adaptive).lower(),
+                                       max_download_workers=max(args.download_workers, args.max_download_workers)))
+    steps = 20
+    os.environ['FAKE_DL_MB'] = str(args.mb)
+    os.environ['FAKE_DL_STEPS'] = str(steps)
+    os.environ['FAKE_DL_DELAY'] = str(args.download_seconds / steps)
+    os.environ['FAKE_FFMPEG_DELAY'] = str(args.remux_seconds)
+    os.environ['FAKE_FFPROBE_CHAPTERS'] = str(args.chapters)
+    # A bit longer than the fixture setlist (124 minutes), shorter when truncated
+    os.environ['FAKE_FFPROBE_DURATION'] = str(130 * 60)
+    os.environ['FAKE_FFPROBE_FULL_MB'] = str(args.mb)
+    os.environ['FAKE_DL_TRUNCATE'] = str(args.truncate)
+    os.environ['FAKE_DL_STALL_AT'] = str(args.stall_at) if args.stall_at is not None else ''
+
+
+def release_song_names():
+    # Every fake release page is built from this fixture, so they all have its setlist
+    return nugs_vid_dl.parse_html_for_setlist(read_fixture('release_33516.html'))[1]
+
+
+def check_audio(workdir, timer):
+    # Every video has one audio folder with a file per song of the setlist, in order, and a
+    # second pass of the audio command finds nothing left to extract. Returns what is wrong
+    expected = [f"{number:02d} - {nugs_vid_dl.sanitize_name(song)}.mka" for number, song in enumerate(release_song_names(), 1)]
+    audio_directory = os.path.join(workdir, 'audio')
+    videos = sum(1 for name in os.listdir(workdir) if name.startswith('video')
+                 for f in os.listdir(os.path.join(workdir, name)) if f.endswith('.mkv'))
+    folders = sorted(os.listdir(audio_directory))
+    problems = []
+    if not videos or len(folders) != videos:
+        problems.append(f"{len(folders)} audio folders for {videos} videos")
+    for folder in folders:
+        files = sorted(os.listdir(os.path.join(audio_directory, folder)))
+        if files != expected:
+            wrong = [f for f in files if f not in expected] or sorted(set(expected) - set(files))
+            problems.append(f"{folder}: {len(files)} files, e.g. {wrong[0] if wrong else '?'}, expected {expected[0]} ...")
+    before = {os.path.join(root, f): os.path.getmtime(os.path.join(root, f))
+              for root, _, files in os.walk(audio_directory) for f in files}
+    calls = len(timer.samples.get('audio', []))
+    nugs_vid_dl.audio_command(argparse.Namespace(pattern=None))
+    extracted = len(timer.samples.get('audio', [])) - calls
+    after = {os.path.join(root, f): os.path.getmtime(os.path.join(root, f))
+             for root, _, files in os.walk(audio_directory) for f in files}
+    if extracted or after != before:
+        problems.append(f"the second pass extracted {extracted} videos, {len(set(after) - set(before))} new files")
+    return problems
+
+
+def check_stall(downloader_results):
+    # Every download hung at --stall-at: each downloader has to be reported stalled and killed,
+    # and its job left unfinished in the journal. A second run without the stall then has to
+    # pick all of them up again. Returns what is wrong
+    problems = []
+    if not downloader_results:
+        problems.append("no download was started")
+    for result in downloader_results:
+        if not result.stalled:
+            problems.append(f"a download ended without being reported stalled (exit code {result.returncode})")
+        elif result.returncode >= 0 if os.name == 'posix' else result.returncode == 0:
+            problems.append(f"a stalled downloader exited on its own (exit code {result.returncode}) instead of being killed")
+    journal = DownloadJournal(nugs_vid_dl.download_journal_path())
+    stalled_jobs = [job for job in journal.unfinished() if job['error'] == 'download stalled']
+    journal.close()
+    if len(stalled_jobs) != len(downloader_results):
+        problems.append(f"{len(stalled_jobs)} stalled jobs left in the journal for {len(downloader_results)} stalled downloads")
+    os.environ['FAKE_DL_STALL_AT'] = ''
+    nugs_vid_dl.main()
+    journal = DownloadJournal(nugs_vid_dl.download_journal_path())
+    left = journal.unfinished()
+    journal.close()
+    if left:
+        problems.append(f"{len(left)} jobs still unfinished after a run without the stall")
+    return problems
+
+
+def run_benchmark(args):
+    site = FakeNugsSite(releases=args.releases, exclusives=args.exclusives, latency=args.latency_ms / 1000)
+    workdir = tempfile.mkdtemp(prefix='nugs_bench_')
+    timer = StageTimer()
+    originals = {name: getattr(nugs_vid_dl, name) for _, name in STAGES}
+    original_place = ImageCache.place
+    original_driver = nugs_vid_dl.setup_headless_driver
+    original_cwd = os.getcwd()
+    original_argv = sys.argv
+    try:
+        prepare_workdir(workdir, site, args)
+        for stage, name in STAGES:
+            setattr(nugs_vid_dl, name, timer.wrap(stage, originals[name]))
+        ImageCache.place = timer.wrap('image', original_place)
+        nugs_vid_dl.setup_headless_driver = lambda *driver_args, **driver_kwargs: FakeDriver(site)
+        downloader_results = []
+        if args.check_stall:
+            timed_download = nugs_vid_dl.run_go_program
+
+            def recorded_download(*download_args):
+                result = timed_download(*download_args)
+                downloader_results.append(result)
+                return result
+            nugs_vid_dl.run_go_program = recorded_download
+        os.chdir(workdir)
+        sys.argv = ['nugs_vid_dl.py', '--page-url', *args.pages, '--full', '--backend', args.backend]
+        if args.metrics:
+            sys.argv.append('--metrics')
+        log_path = os.path.join(workdir, 'run.log')
+        started = time.perf_counter()
+        with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+            nugs_vid_dl.main()
+            elapsed = time.perf_counter() - started
+            audio_problems = check_audio(workdir, timer) if args.check_audio else None
+            stall_problems = check_stall(downloader_results) if args.check_stall else None
+        records = list(iter_catalog(os.path.join(workdir, 'data', 'catalog.jsonl')))
+        audio_files = sum(len(files) for _, _, files in os.walk(os.path.join(workdir, 'audio')))
+        per_volume = {name: len([f for f in os.listdir(os.path.join(workdir, name)) if f.endswith('.mkv')])
+                      for name in sorted(os.listdir(workdir)) if name.startswith('video')}
+    finally:
+        for _, name in STAGES:
+            setattr(nugs_vid_dl, name, originals[name])
+        ImageCache.place = original_place
+        nugs_vid_dl.setup_headless_driver = original_driver
+        os.chdir(original_cwd)
+        sys.argv = original_argv
+        site.close()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    statuses = {}
+    for record in records:
+        statuses[record.get('status')] = statuses.get(record.get('status'), 0) + 1
+    downloaded_bytes = sum(record.get('size_bytes') or 0 for record in records)
+    stages = {}
+    for stage, _ in STAGES + [('image', None)]:
+        samples = timer.samples.get(stage)
+        if samples:
+            stages[stage] = {'count': len(samples), 'total': sum(samples), 'p50': percentile(samples, 0.5),
+                             'p90': percentile(samples, 0.9), 'p99': percentile(samples, 0.99), 'max': max(samples)}
+    return {'elapsed': elapsed, 'releases': len(records), 'statuses': statuses, 'downloaded_bytes': downloaded_bytes,
+            'releases_per_hour': statuses.get('downloaded', 0) / elapsed * 3600, 'pages_per_hour': len(records) / elapsed * 3600,
+            'site_requests': site.requests, 'per_volume': per_volume, 'audio_files': audio_files,
+            'verify_failures': sum(1 for record in records if record.get('verify_error')),
+            'checksummed': sum(1 for record in records if record.get('checksum')), 'audio_problems': audio_problems,
+            'stall_problems': stall_problems, 'stages': stages, 'workdir': workdir if args.keep else None}
+
+
+def print_report(result, args):
+    print(f"{result['releases']} releases in {result['elapsed']:.1f}s ({args.backend} backend, "
+          f"{args.download_workers} download / {args.remux_workers} remux workers, {args.mb} MB per video)")
+    print(f"statuses: {', '.join(f'{status} {count}' for status, count in sorted(result['statuses'].items()))}")
+    print(f"{result['releases_per_hour']:.0f} releases/hour downloaded, {result['pages_per_hour']:.0f} releases/hour looked at, "
+          f"{result['downloaded_bytes'] / 1000 ** 2:.0f} MB written, {result['site_requests']} requests to the fake site")
+    if len(result['per_volume']) > 1:
+        print(f"videos per volume ({args.placement}): " + ', '.join(f'{name} {count}' for name, count in result['per_volume'].items()))
+    if not args.no_verify:
+        print(f"{result['checksummed']} videos checksummed and verified, {result['verify_failures']} failed verification "
+              f"at least once (downloaded again once per run)")
+    if args.audio_workers:
+        print(f"{result['audio_files']} audio files extracted by {args.audio_workers} audio workers")
+    if result['audio_problems'] is not None:
+        for problem in result['audio_problems']:
+            print(f"audio check: {problem}")
+        print(f"audio check: files named from the setlist, second pass extracted nothing: "
+              f"{'FAILED' if result['audio_problems'] else 'ok'}")
+    if result['stall_problems'] is not None:
+        for problem in result['stall_problems']:
+            print(f"stall check: {problem}")
+        print(f"stall check: stalled downloads killed, kept in the journal and downloaded by the next run: "
+              f"{'FAILED' if result['stall_problems'] else 'ok'}")
+    print()
+    print(f"{'stage':<14}{'calls':>7}{'total s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, stats in result['stages'].items():
+        print(f"{stage:<14}{stats['count']:>7}{stats['total']:>10.2f}{stats['p50'] * 1000:>10.1f}"
+              f"{stats['p90'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}")
+    print('\n(process_link includes the wait for queued downloads when the download queue is full, '
+          'finalize includes remux and move)')
+    if args.metrics:
+        print(f"\nthe script's own run summary (metrics.py spans)\n{metrics.format_summary()}")
+    if result['workdir']:
+        print(f"\nrun folder kept at {result['workdir']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs nugs_vid_dl.main() end to end against a local fake nugs.net, '
+                                                 'fake downloader and fake ffmpeg, and times every stage.')
+    parser.add_argument('--releases', type=int, default=48, help='Releases on the "watch" listing.')
+    parser.add_argument('--exclusives', type=int, default=16, help='Exclusives on the "exclusive" listing.')
+    parser.add_argument('--pages', nargs='+', default=['watch', 'exclusive'], help='Pages to crawl, as for --page-url.')
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium', help='Release metadata backend.')
+    parser.add_argument('--mb', type=float, default=8, help='Size of every fake video in MB.')
+    parser.add_argument('--download-seconds', type=float, default=0.5, help='How long every fake download takes.')
+    parser.add_argument('--remux-seconds', type=float, default=0.0, help='Extra time every fake remux takes.')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Added to every page and API response of the fake site.')
+    parser.add_argument('--download-workers', type=int, default=2)
+    parser.add_argument('--remux-workers', type=int, default=1)
+    parser.add_argument('--volumes', type=int, default=1, help='Output volumes (folders) the videos are spread over.')
+    parser.add_argument('--placement', choices=['free_space', 'round_robin'], default='free_space')
+    parser.add_argument('--audio-workers', type=int, default=0, help='Extract the audio of every download with this many workers (0 = off).')
+    parser.add_argument('--chapters', type=int, default=12, help='Chapters in every fake video, one audio file each.')
+    parser.add_argument('--check-audio', action='store_true',
+                        help='Extract the audio of the "watch" releases with one chapter per song and exit 1 unless every '
+                             'file is named from the page setlist and a second "audio" pass extracts nothing.')
+    parser.add_argument('--stall-at', type=float, help='Make every fake download hang at this percent.')
+    parser.add_argument('--stall-timeout', type=float, default=120, help='[pipeline] stall_timeout_minutes, in seconds.')
+    parser.add_argument('--check-stall', action='store_true',
+                        help='Hang every download halfway and exit 1 unless each is killed as stalled, stays in the '
+                             'download journal and is downloaded by a second run without the stall.')
+    parser.add_argument('--truncate', type=float, default=0, help='Chance (0-1) that a fake download silently ends early.')
+    parser.add_argument('--no-verify', action='store_true', help='Turn the [verify] checksum and ffprobe checks off.')
+    parser.add_argument('--navigations-per-minute', type=float, default=0, help='[rate_limit] page navigation budget (0 = unlimited).')
+    parser.add_argument('--requests-per-second', type=float, default=0, help='[rate_limit] API and image request budget (0 = unlimited).')
+    parser.add_argument('--adaptive', action='store_true', help='Let the script move the number of download workers with the throughput.')
+    parser.add_argument('--max-download-workers', type=int, default=6, help='Most download workers with --adaptive.')
+    parser.add_argument('--metrics', action='store_true', help="Also run with the script's metrics enabled and show its summary.")
+    parser.add_argument('--json', metavar='PATH', help='Also write the results as JSON, e.g. to compare runs.')
+    parser.add_argument('--keep', action='store_true', help='Keep the run folder (video, data and run.log).')
+    parser.add_argument('--verbose', action='store_true', help="Show the script's output instead of writing it to run.log.")
+    args = parser.parse_args()
+    if args.check_audio:
+        # The exclusive fixture has a shorter setlist, the chapters can only line up with one of them
+        args.pages = ['watch']
+        args.audio_workers = max(1, args.audio_workers)
+        args.chapters = len(release_song_names())
+    if args.check_stall:
+        args.stall_at = 50 if args.stall_at is None else args.stall_at
+        args.stall_timeout = min(args.stall_timeout, 3)
+
+    result = run_benchmark(args)
+    print_report(result, args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.check_audio or args.check_stall:
+        sys.exit(1 if result['audio_problems'] or result['stall_problems'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_cache import ImageCache  # noqa: E402
+from fake_nugs_site import FakeNugsSite  # noqa: E402
+
+# Runs image_cache.ImageCache against the covers of the local fake site, which sends an ETag
+# and Last-Modified and answers conditional requests with 304.
+# First pass: every cover is downloaded once and hard linked into a release folder.
+# Second pass, after --revalidate seconds: every cover is revalidated, the site answers 304
+# and nothing is downloaded again. Eviction: with a cap of --cap covers the least recently
+# used blobs go, the release folders keep their links, an evicted cover is fetched again.
+# Exits 1 if any of that doesn't happen.
+
+
+def place_all(cache, site, folder, covers):
+    started = time.perf_counter()
+    for n in range(covers):
+        cache.place(f'{site.base_url}/images/cover_{n}.jpg', os.path.join(folder, f'cover_{n}.jpg'))
+    return time.perf_counter() - started
+
+
+def blob_count(cache):
+    return sum(len(files) for _, _, files in os.walk(cache.blob_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Image cache revalidation (304) and eviction against the fake nugs site.')
+    parser.add_argument('--covers', type=int, default=10)
+    parser.add_argument('--revalidate', type=float, default=2, help='Seconds before a cached cover is checked with the site again.')
+    parser.add_argument('--cap', type=int, default=4, help='Cache size cap, in covers.')
+    args = parser.parse_args()
+
+    site = FakeNugsSite(covers=args.covers)
+    workdir = tempfile.mkdtemp(prefix='nugs_image_cache_')
+    cover_size = len(site.cover_bytes) + len('/images/cover_0.jpg')
+    cache = ImageCache(os.path.join(workdir, 'image_cache'), max_bytes=args.cap * cover_size + cover_size // 2,
+                       revalidate_after=args.revalidate)
+    folder = os.path.join(workdir, 'releases')
+    os.makedirs(folder)
+    try:
+        seconds = place_all(cache, site, folder, args.covers)
+        first = site.image_requests
+        print(f"first pass: {args.covers} covers in {seconds * 1000:.0f} ms, {first} downloads, {blob_count(cache)} blobs")
+
+        place_all(cache, site, folder, args.covers)
+        cached = site.image_requests - first
+        print(f"within {args.revalidate:g}s: {cached} requests to the site")
+
+        time.sleep(args.revalidate)
+        before = site.image_requests
+        seconds = place_all(cache, site, folder, args.covers)
+        revalidated, not_modified = site.image_requests - before, site.image_not_modified
+        print(f"after {args.revalidate:g}s: {revalidated} revalidations in {seconds * 1000:.0f} ms, {not_modified} answered 304")
+
+        removed = cache.evict()
+        blobs = blob_count(cache)
+        links = len(os.listdir(folder))
+        print(f"evict with a cap of {args.cap} covers: {removed} removed, {blobs} blobs left, {links} covers still in the release folder")
+
+        before = site.image_requests
+        cache.place(f'{site.base_url}/images/cover_0.jpg', os.path.join(folder, 'cover_0_again.jpg'))
+        refetched = site.image_requests - before
+        print(f"an evicted cover: {refetched} download")
+    finally:
+        cache.close()
+        site.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ok = (first == args.covers and cached == 0 and revalidated == args.covers and not_modified == args.covers
+          and removed == args.covers - args.cap and blobs == args.cap and links == args.covers and refetched == 1)
+    print('ok' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
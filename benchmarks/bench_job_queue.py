@@ -0,0 +1,114 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import FileLock, SharedJobQueue  # noqa: E402
+
+# Several local processes sharing one job_queue folder, the way several hosts share the
+# data directory. Every worker claims jobs until the queue is empty and records what it
+# finished. Some workers are killed in the middle of a job: their leases expire and the
+# jobs are finished by the others. Every finished job also appends two halves of a line
+# to one file under FileLock, torn lines would mean the lock let two writers in.
+# Exits 1 if a job was finished twice, never finished, or a line was torn.
+
+
+def worker(root, name, lease_seconds, job_seconds, die_after, results_path):
+    jobs = SharedJobQueue(root, owner=name, lease_seconds=lease_seconds)
+    lock = FileLock(os.path.join(root, 'finished.txt.lock'))
+    finished = 0
+    idle_since = None
+    while True:
+        claimed = jobs.claim_next()
+        if claimed is None:
+            # Jobs of killed workers come back once their lease runs out
+            idle_since = idle_since or time.monotonic()
+            if time.monotonic() - idle_since > lease_seconds * 2:
+                break
+            time.sleep(0.05)
+            continue
+        idle_since = None
+        job_id, payload = claimed
+        time.sleep(job_seconds)
+        if die_after is not None and finished >= die_after:
+            # Dies holding the lease, like a host losing power mid-download
+            os._exit(1)
+        with lock:
+            with open(results_path, 'a', encoding='utf-8') as file:
+                file.write(f'{job_id} ')
+                file.flush()
+                time.sleep(0.001)
+                file.write(f'{name}\n')
+        jobs.complete(job_id)
+        finished += 1
+    jobs.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared job queue with several worker processes and some dying mid-job.')
+    parser.add_argument('--jobs', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=6)
+    parser.add_argument('--killed', type=int, default=2, help='Workers that die holding a lease.')
+    parser.add_argument('--job-ms', type=float, default=20, help='Time every job takes.')
+    parser.add_argument('--lease-seconds', type=float, default=1.5)
+    parser.add_argument('--root', help='Queue folder, e.g. on a network share (default: a temp folder).')
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix='nugs_job_queue_')
+    results_path = os.path.join(root, 'finished.txt')
+    try:
+        queue = SharedJobQueue(root, owner='producer')
+        for i in range(args.jobs):
+            queue.enqueue(f'release-{i}', {'url': f'https://play.nugs.net/release/{i}', 'display_text': f'show {i}'})
+        # Queuing again must not add anything
+        duplicates_queued = sum(queue.enqueue(f'release-{i}', {}) for i in range(args.jobs))
+        queue.close()
+
+        started = time.perf_counter()
+        processes = []
+        for i in range(args.workers):
+            die_after = 3 + i if i < args.killed else None
+            process = multiprocessing.Process(target=worker, args=(root, f'worker-{i}', args.lease_seconds,
+                                                                   args.job_ms / 1000, die_after, results_path))
+            process.start()
+            processes.append(process)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        finished = {}
+        torn = 0
+        with open(results_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                parts = line.split()
+                if len(parts) != 2:
+                    torn += 1
+                    continue
+                finished.setdefault(parts[0], []).append(parts[1])
+        twice = {job_id: names for job_id, names in finished.items() if len(names) > 1}
+        missing = args.jobs - len(finished)
+        killed = sum(1 for process in processes if process.exitcode)
+        print(f"{args.jobs} jobs, {args.workers} workers ({killed} killed mid-job) in {elapsed:.1f}s "
+              f"({args.jobs / elapsed:.0f} jobs/s, lease {args.lease_seconds:g}s)")
+        print(f"finished once: {len(finished) - len(twice)}, finished twice: {len(twice)}, never finished: {missing}, "
+              f"torn lines: {torn}, queued twice: {duplicates_queued}")
+        per_worker = {}
+        for names in finished.values():
+            for name in names:
+                per_worker[name] = per_worker.get(name, 0) + 1
+        print('per worker: ' + ', '.join(f'{name} {count}' for name, count in sorted(per_worker.items())))
+        ok = not twice and not missing and not torn and not duplicates_queued
+        print('ok' if ok else 'FAILED')
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import nugs_vid_dl  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def find_pages(paths):
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            pages.extend(glob.glob(os.path.join(path, '**', '*.html'), recursive=True))
+        else:
+            pages.append(path)
+    # Listing pages have no release details, only time release pages
+    return [page for page in sorted(pages) if not os.path.basename(page).startswith('recent')]
+
+
+def page_url(path):
+    return '/exclusive/0' if 'exclusive' in os.path.basename(path) else '/release/0'
+
+
+def parse_before(html, url):
+    # Mirrors the old flow, where process_link, download_image and parse_html_for_setlist
+    # each ran html.parser over a fresh copy of driver.page_source
+    soup = BeautifulSoup(html, 'html.parser')
+    if "/exclusive/" in url:
+        details = nugs_vid_dl.extract_exclusive_info(soup)
+    else:
+        details = nugs_vid_dl.extract_release_info(soup)
+    nugs_vid_dl.select_cover_image(BeautifulSoup(html, 'html.parser'))
+    setlist = nugs_vid_dl.parse_html_for_setlist(html)
+    return details, setlist
+
+
+def parse_after(html, url):
+    snapshot = nugs_vid_dl.PageSnapshot(html, url)
+    details = nugs_vid_dl.extract_page_details(snapshot, url)
+    nugs_vid_dl.select_cover_image(snapshot.soup)
+    setlist = nugs_vid_dl.parse_html_for_setlist(snapshot)
+    return details, setlist
+
+
+def check_backends():
+    # The selenium and http backends have to give the same details and setlist for every
+    # fixture page that has its API response next to it
+    mismatches = 0
+    checked = 0
+    for path in find_pages([FIXTURES_DIR]):
+        kind, release_id = os.path.splitext(os.path.basename(path))[0].split('_', 1)
+        api_path = os.path.join(FIXTURES_DIR, 'api', f'container_{release_id}.json')
+        if not os.path.exists(api_path):
+            continue
+        url = f'https://play.nugs.net/{kind}/{release_id}'
+        with open(path, 'r', encoding='utf-8') as f:
+            page = nugs_vid_dl.PageSnapshot(f.read(), url)
+        with open(api_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        api = nugs_vid_dl.ApiSnapshot(data.get('Response', data), url)
+        checked += 1
+        for what, from_page, from_api in [
+                ('details', nugs_vid_dl.extract_page_details(page, url), nugs_vid_dl.extract_api_info(api, url)),
+                ('setlist', nugs_vid_dl.parse_html_for_setlist(page), nugs_vid_dl.parse_html_for_setlist(api))]:
+            if from_page != from_api:
+                mismatches += 1
+                print(f'{kind} {release_id} {what} differ:\n  page: {from_page}\n  api:  {from_api}')
+    print(f'{checked} fixtures compared between the selenium and http backends, {mismatches} differences')
+    return checked > 0 and not mismatches
+
+
+def time_parse(func, pages, repeat):
+    samples = []
+    for _ in range(repeat):
+        for html, url in pages:
+            start = time.perf_counter()
+            func(html, url)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-release parse time of saved release pages, before and after PageSnapshot.')
+    parser.add_argument('paths', nargs='*', default=[FIXTURES_DIR], help='Saved .html pages or folders to search (default: benchmark fixtures).')
+    parser.add_argument('--repeat', type=int, default=20, help='Times to parse every page.')
+    parser.add_argument('--check-backends', action='store_true', help='Only compare the page and API parsers on the fixtures, exit 1 if they differ.')
+    args = parser.parse_args()
+
+    if args.check_backends:
+        sys.exit(0 if check_backends() else 1)
+
+    pages = []
+    for path in find_pages(args.paths):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append((f.read(), page_url(path)))
+    if not pages:
+        print('No saved pages found.')
+        return
+
+    print(f'{len(pages)} pages x {args.repeat} repeats, snapshot parser: {nugs_vid_dl.html_parser}\n')
+    results = {}
+    for name, func in [('before', parse_before), ('after', parse_after)]:
+        samples = time_parse(func, pages, args.repeat)
+        results[name] = statistics.median(samples)
+        print(f'{name:<8} median {results[name] * 1000:8.2f} ms/release   '
+              f'p95 {sorted(samples)[int(len(samples) * 0.95) - 1] * 1000:8.2f} ms/release')
+    print(f'\nspeedup: {results["before"] / results["after"]:.2f}x '
+          '(parse only, the three extra driver.page_source round trips are not included)')
+
+
+if __name__ == '__main__':
+    main()
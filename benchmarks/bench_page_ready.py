@@ -0,0 +1,89 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from selenium.webdriver.common.by import By  # noqa: E402
+from selenium.webdriver.support import expected_conditions as EC  # noqa: E402
+from selenium.webdriver.support.ui import WebDriverWait  # noqa: E402
+
+import nugs_vid_dl  # noqa: E402
+from fake_nugs_site import FakeDriver, FakeNugsSite  # noqa: E402
+
+# Page-ready time per release page, default Chrome against the lean driver.
+# "before" is the old setup: normal page load strategy, every image, font, video and tracker,
+# then a wait for the hashed cover class. "after" is browser_options(lean=True) with the CDP
+# URL blocking and the wait on release_page_ready. The pages come from the fake site with
+# page_weight on. By default FakeDriver stands in for Chrome and fetches what Chrome would
+# wait for; --chrome drives a real headless Chrome (needs Chrome and a chromedriver).
+
+
+def old_page_ready(driver):
+    return EC.presence_of_element_located((By.CLASS_NAME, "_cover_ex3y9_35"))(driver)
+
+
+def make_driver(site, lean, chrome, profile_directory):
+    if chrome:
+        return nugs_vid_dl.setup_headless_driver(lean=lean, profile_directory=profile_directory)
+    driver = FakeDriver(site, options=nugs_vid_dl.browser_options(lean, profile_directory))
+    if lean:
+        nugs_vid_dl.block_lean_urls(driver)
+    return driver
+
+
+def time_pages(site, urls, lean, chrome, profile_directory):
+    driver = make_driver(site, lean, chrome, profile_directory)
+    ready = nugs_vid_dl.release_page_ready if lean else old_page_ready
+    requests_before = site.resource_requests
+    samples = []
+    try:
+        for url in urls:
+            started = time.perf_counter()
+            driver.get(url)
+            WebDriverWait(driver, 20).until(ready)
+            samples.append(time.perf_counter() - started)
+    finally:
+        driver.quit()
+    return samples, site.resource_requests - requests_before
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Page-ready time per release page, default driver against the lean one.')
+    parser.add_argument('--releases', type=int, default=24, help='Release pages to load per mode (half releases, half exclusives).')
+    parser.add_argument('--latency-ms', type=float, default=40, help='Added to every page response.')
+    parser.add_argument('--resource-latency-ms', type=float, default=60, help='Added to every font, script, image and video.')
+    parser.add_argument('--chrome', action='store_true', help='Use a real headless Chrome instead of FakeDriver.')
+    args = parser.parse_args()
+
+    half = max(1, args.releases // 2)
+    site = FakeNugsSite(releases=half, exclusives=half, latency=args.latency_ms / 1000,
+                        resource_latency=args.resource_latency_ms / 1000, page_weight=True)
+    urls = [site.base_url + f'/release/{i}' for i in site.release_ids] + [site.base_url + f'/exclusive/{i}' for i in site.exclusive_ids]
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='nugs_profile_') as profile_directory:
+            for label, lean in (('before', False), ('after', True)):
+                # Only the lean driver reuses a profile, the old one always started empty
+                results[label] = time_pages(site, urls, lean, args.chrome, profile_directory if lean else '')
+    finally:
+        site.close()
+
+    print(f"{len(urls)} release pages, {'headless Chrome' if args.chrome else 'FakeDriver'}, "
+          f"{args.latency_ms:g} ms per page, {args.resource_latency_ms:g} ms per resource\n")
+    print(f"{'':<8}{'p50 ms':>9}{'p90 ms':>9}{'max ms':>9}{'mean ms':>9}{'resources':>11}")
+    for label, (samples, resources) in results.items():
+        print(f"{label:<8}{percentile(samples, 0.5) * 1000:>9.0f}{percentile(samples, 0.9) * 1000:>9.0f}"
+              f"{max(samples) * 1000:>9.0f}{statistics.mean(samples) * 1000:>9.0f}{resources:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nugs_downloader import is_throttled, parse_output_line  # noqa: E402
+from rate_limit import DownloadConcurrency, TokenBucket  # noqa: E402
+
+# Checks the two parts of rate_limit.py against a simulated server.
+# Token bucket: several threads share one bucket, the rate they get has to match its budget.
+# Concurrency: downloads share the server's bandwidth, every connection is also capped, so
+# throughput stops growing past bandwidth / per-connection downloads, and the server answers
+# 429 above --throttle-at downloads at once. The adaptive controller should settle near the
+# best fixed number of workers without being told what it is.
+# Downloader lines: only real 429 answers may count as throttling, never a byte count.
+# Exits 1 if the bucket is off by more than 10%, the controller gets less than 80% of
+# what the best fixed number of workers gets, or a downloader line is misread.
+
+
+# (line, stream, throttled)
+DOWNLOADER_LINES = [
+    ('429.5 MB / 4.2 GB  10.2% 12.3 MB/s ETA 05:12', 'stdout', False),
+    ('1.429 GB / 4.2 GB  34.0%', 'stderr', False),
+    ('downloaded 429 segments', 'stdout', False),
+    ('error: HTTP 429 Too Many Requests', 'stdout', True),
+    ('failed to get manifest: status code 429', 'stderr', True),
+    ('Too Many Requests, retrying', 'stderr', True),
+]
+
+
+def check_throttle_lines():
+    wrong = [line for line, stream, expected in DOWNLOADER_LINES
+             if is_throttled(parse_output_line(line, stream)) != expected]
+    for line in wrong:
+        print(f"misread downloader line: {line!r}")
+    return not wrong
+
+
+def bucket_rate(rate, tokens, threads):
+    bucket = TokenBucket('bench', rate, burst=1)
+    bucket.acquire()
+    remaining = [tokens]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            bucket.acquire()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return tokens / (time.perf_counter() - started)
+
+
+class FakeServer:
+    def __init__(self, bandwidth, per_connection, throttle_at):
+        self.bandwidth = bandwidth
+        self.per_connection = per_connection
+        self.throttle_at = throttle_at
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def download(self, size):
+        # (ok, throttled, bytes), the speed is fixed by how many run when it starts
+        with self.lock:
+            if self.active >= self.throttle_at:
+                throttled = True
+            else:
+                throttled = False
+                self.active += 1
+                active = self.active
+        if throttled:
+            # A 429 comes back right away and takes no bandwidth
+            time.sleep(0.01)
+            return False, True, 0
+        try:
+            time.sleep(size / min(self.per_connection, self.bandwidth / active))
+            return True, False, size
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def run_downloads(server, controller, downloads, size, threads):
+    remaining = [downloads]
+    lock = threading.Lock()
+    trace = []
+    totals = {'bytes': 0, 'throttled': 0}
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            controller.acquire()
+            started = time.monotonic()
+            try:
+                ok, throttled, byte_count = server.download(size)
+            finally:
+                controller.release()
+            change = controller.record(ok, throttled, byte_count, time.monotonic() - started)
+            with lock:
+                totals['bytes'] += byte_count
+                totals['throttled'] += throttled
+                if change:
+                    trace.append(change[1])
+                if not ok:
+                    # Failed downloads are tried again
+                    remaining[0] += 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return totals['bytes'] / (time.perf_counter() - started), totals['throttled'], trace
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Token bucket accuracy and adaptive download concurrency against a simulated server.')
+    parser.add_argument('--rate', type=float, default=50, help='Token bucket rate per second.')
+    parser.add_argument('--tokens', type=int, default=150)
+    parser.add_argument('--bandwidth', type=float, default=100, help='Server bandwidth in MB/s shared by all downloads.')
+    parser.add_argument('--per-connection', type=float, default=25, help='MB/s one download gets at most.')
+    parser.add_argument('--throttle-at', type=int, default=7, help='The server answers 429 above this many downloads.')
+    parser.add_argument('--downloads', type=int, default=300)
+    parser.add_argument('--mb', type=float, default=2.5, help='Size of every simulated download.')
+    parser.add_argument('--max-workers', type=int, default=10)
+    args = parser.parse_args()
+
+    measured = bucket_rate(args.rate, args.tokens, threads=4)
+    bucket_ok = abs(measured - args.rate) <= args.rate * 0.1
+    print(f"token bucket: {measured:.1f} tokens/s from 4 threads for a budget of {args.rate:g}/s")
+
+    size = args.mb * 1000 ** 2
+    bandwidth, per_connection = args.bandwidth * 1000 ** 2, args.per_connection * 1000 ** 2
+    best = min(args.throttle_at, int(args.bandwidth // args.per_connection))
+    print(f"\nserver: {args.bandwidth:g} MB/s, {args.per_connection:g} MB/s per download, 429 above {args.throttle_at} "
+          f"at once (best: {best} workers)")
+    fixed = {}
+    for workers in sorted({1, 2, best, args.throttle_at + 1}):
+        controller = DownloadConcurrency(workers, workers, workers, adaptive=False)
+        throughput, throttled, _ = run_downloads(FakeServer(bandwidth, per_connection, args.throttle_at), controller,
+                                                 args.downloads // 3, size, workers)
+        fixed[workers] = throughput
+        print(f"fixed {workers:>2} workers: {throughput / 1000 ** 2:6.1f} MB/s, {throttled} throttled")
+    controller = DownloadConcurrency(1, 1, args.max_workers, adaptive=True)
+    throughput, throttled, trace = run_downloads(FakeServer(bandwidth, per_connection, args.throttle_at), controller,
+                                                 args.downloads, size, args.max_workers)
+    print(f"adaptive 1-{args.max_workers}: {throughput / 1000 ** 2:6.1f} MB/s, {throttled} throttled, "
+          f"limit went {' -> '.join(str(limit) for limit in [1] + trace)}")
+    lines_ok = check_throttle_lines()
+    print(f"downloader lines: {len(DOWNLOADER_LINES)} checked, {'ok' if lines_ok else 'misread'}")
+    ok = bucket_ok and lines_ok and throughput >= fixed[best] * 0.8
+    print('ok' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import release_names  # noqa: E402
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_PATH = os.path.join(ROOT_DIR, 'benchmarks', 'fixtures', 'release_names_golden.jsonl')
+CORPUS_PATH = os.path.join(ROOT_DIR, 'examples', 'example_processed_filenames.txt')
+
+
+def process_filename_before(file_name):
+    # The old dedupe key, which compiled its pattern on every call
+    pattern = re.compile(r"(.*?)(\d{4}-\d{2}-\d{2})")
+    match = pattern.match(file_name)
+    if match:
+        return f"{match.group(1).strip()} {match.group(2).strip()}"
+    return None
+
+
+def format_exclusive_details_before(artist, venue_location, event_date):
+    date_pattern = re.compile(r'(\w+)\s(\d{1,2}),\s(\d{4})')
+    date_match = date_pattern.search(venue_location)
+    if date_match:
+        month, day, year = date_match.groups()
+        try:
+            formatted_date = datetime.strptime(f'{month} {day} {year}', '%B %d %Y').strftime('%Y-%m-%d')
+        except ValueError:
+            formatted_date = 'Invalid Date'
+        venue_location = date_pattern.sub('', venue_location).replace('  ', ' ').strip()
+    else:
+        formatted_date = event_date if event_date else 'Invalid Date'
+    return f"{artist} {formatted_date} {venue_location}"
+
+
+def letter_tag(number):
+    tag = ''
+    while True:
+        number, digit = divmod(number, 26)
+        tag = chr(ord('a') + digit) + tag
+        if not number:
+            return tag
+
+
+def check_golden(path):
+    failures = 0
+    count = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            result = getattr(release_names, case['func'])(*case['args'])
+            if isinstance(result, tuple):
+                result = list(result)
+            count += 1
+            if result != case['expected']:
+                failures += 1
+                print(f"FAIL {case['func']}{tuple(case['args'])}\n  expected {case['expected']!r}\n  got      {result!r}")
+    print(f'{count - failures}/{count} golden cases pass')
+    return failures == 0
+
+
+def clear_caches():
+    for func in (release_names.find_date, release_names.release_key, release_names.artist_key):
+        func.cache_clear()
+
+
+def time_names(func, names, repeat, cold):
+    samples = []
+    for _ in range(repeat):
+        if cold:
+            clear_caches()
+        start = time.perf_counter()
+        for name in names:
+            func(name)
+        samples.append((time.perf_counter() - start) / len(names))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dedupe key and exclusive name throughput, before and after release_names.')
+    parser.add_argument('--check', action='store_true', help='Only run the golden cases, exit 1 on a mismatch.')
+    parser.add_argument('--corpus', default=CORPUS_PATH, help='File names to key, one per line (default: example processed filenames).')
+    parser.add_argument('--scale', type=int, default=200, help='Copies of the corpus per pass, each copy with distinct artist names.')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed passes.')
+    args = parser.parse_args()
+
+    ok = check_golden(GOLDEN_PATH)
+    if args.check:
+        sys.exit(0 if ok else 1)
+
+    with open(args.corpus, 'r', encoding='utf-8') as f:
+        corpus = [line.strip() for line in f if line.strip()]
+    # Distinct names so the cold runs measure parsing, like a first scan of a big library
+    names = [f'{letter_tag(i)} {name}' for i in range(args.scale) for name in corpus]
+    print(f'\n{len(names)} names x {args.repeat} passes\n')
+    before = time_names(process_filename_before, names, args.repeat, cold=False)
+    cold = time_names(release_names.dedupe_key, names, args.repeat, cold=True)
+    warm = time_names(release_names.dedupe_key, names, args.repeat, cold=False)
+    print(f'dedupe key   before {before * 1e6:7.2f} us/name   after cold {cold * 1e6:7.2f} us/name   '
+          f'after warm {warm * 1e6:7.2f} us/name')
+
+    exclusives = [("Umphrey's McGee", f'Archival Roulette: December {i % 28 + 1}, 2004, Chicago, IL', '2023-12-25')
+                  for i in range(len(names))]
+    samples = {}
+    for label, func in [('before', format_exclusive_details_before), ('after', release_names.exclusive_display_name)]:
+        clear_caches()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for details in exclusives:
+                func(*details)
+        samples[label] = (time.perf_counter() - start) / (args.repeat * len(exclusives))
+    print(f'exclusive    before {samples["before"] * 1e6:7.2f} us/name   after      {samples["after"] * 1e6:7.2f} us/name')
+    # Names the old key couldn't dedupe at all
+    missed = sum(1 for name in corpus if process_filename_before(name) is None and release_names.dedupe_key(name))
+    print(f'\nnames without a dedupe key before, keyed now: {missed}')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SCRIPT = os.path.join(ROOT_DIR, 'nugs_vid_dl.py')
+
+# Start-up time of the subcommands, and whether they pulled in the heavy libraries.
+# Every sample is a fresh interpreter in a throwaway folder with a minimal config ini.
+# "eager imports" is what every command used to pay before reaching its own code: the
+# script's modules plus selenium, bs4 and requests.
+
+HEAVY_MODULES = ('selenium', 'bs4', 'requests')
+
+CONFIG = '''[nugsDownloader]
+email =
+password =
+
+[custom_paths]
+video_directory = {workdir}/video
+audio_directory = {workdir}/audio
+script_data_directory = {workdir}/data
+'''
+
+# Runs the script in-process so the modules it imported can be listed afterwards
+RUNNER = '''import runpy, sys
+sys.argv = [{script!r}] + {argv!r}
+try:
+    runpy.run_path({script!r}, run_name='__main__')
+except SystemExit:
+    pass
+print('HEAVY ' + ' '.join(name for name in {heavy!r} if name in sys.modules))
+'''
+
+IMPORT_ONLY = 'import sys, nugs_vid_dl\nprint("HEAVY " + " ".join(name for name in {heavy!r} if name in sys.modules))'
+
+EAGER = ('import selenium.webdriver, selenium.webdriver.support.ui, selenium.webdriver.chrome.service, '
+         'selenium.webdriver.support.expected_conditions, bs4, requests; import nugs_vid_dl')
+
+
+def run(code, workdir):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=workdir, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT_DIR))
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    heavy = [line[6:].split() for line in result.stdout.splitlines() if line.startswith('HEAVY')]
+    return elapsed, heavy[0] if heavy else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Start-up time of the nugs_vid_dl subcommands.')
+    parser.add_argument('--repeat', type=int, default=7, help='Runs per command, the median is shown.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='nugs_startup_')
+    try:
+        for name in ('video', 'audio', 'data'):
+            os.makedirs(os.path.join(workdir, name))
+        with open(os.path.join(workdir, 'nugs_vid_dl_config.ini'), 'w', encoding='utf-8') as f:
+            f.write(CONFIG.format(workdir=workdir))
+        with open(os.path.join(workdir, 'data', 'catalog.jsonl'), 'w', encoding='utf-8') as f:
+            f.write('{"release_id": "1", "status": "downloaded", "recorded_at": 0}\n')
+        cases = [('python only', 'pass'), ('eager imports', EAGER),
+                 ('import nugs_vid_dl', IMPORT_ONLY.format(heavy=HEAVY_MODULES))]
+        for argv in (['--help'], ['status'], ['list'], ['export', os.path.join(workdir, 'catalog.csv')]):
+            cases.append((argv[0], RUNNER.format(script=SCRIPT, argv=argv, heavy=HEAVY_MODULES)))
+        print(f"{'':<20}{'median ms':>10}{'min ms':>9}  heavy modules imported")
+        for label, code in cases:
+            samples = []
+            heavy = None
+            for _ in range(args.repeat):
+                elapsed, heavy = run(code, workdir)
+                samples.append(elapsed)
+            heavy_text = '-' if heavy is None else ', '.join(heavy) or 'none'
+            print(f"{label:<20}{statistics.median(samples) * 1000:>10.0f}{min(samples) * 1000:>9.0f}  {heavy_text}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
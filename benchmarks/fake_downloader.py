@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Stand-in for binaries/main.exe (nugs-downloader). Writes a .ts file of the requested size
+# into the -o folder while printing progress lines in the downloader's style.
+# Behaviour is scripted through environment variables:
+#   FAKE_DL_MB            size of the written file in MB (default 8)
+#   FAKE_DL_STEPS         number of progress updates (default 20)
+#   FAKE_DL_DELAY         seconds between progress updates (default 0.01)
+#   FAKE_DL_STDERR_LINES  noise lines written to stderr first, to exercise pipe handling (default 0)
+#   FAKE_DL_STALL_AT      stop making progress at this percent and hang (default off)
+#   FAKE_DL_FAIL_AT       exit with an error at this percent (default off)
+#   FAKE_DL_RESOLUTION    resolution suffix of the file name (default 1080p)
+#   FAKE_DL_TRUNCATE      chance (0-1) that the file silently ends early while the progress
+#                         still goes to 100% and the downloader exits 0 (default 0)
+
+
+def env_number(name, default):
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', dest='output', required=True)
+    parser.add_argument('link')
+    args = parser.parse_args()
+
+    size = int(env_number('FAKE_DL_MB', 8) * 1000 ** 2)
+    steps = max(1, int(env_number('FAKE_DL_STEPS', 20)))
+    delay = env_number('FAKE_DL_DELAY', 0.01)
+    stall_at = env_number('FAKE_DL_STALL_AT', None)
+    fail_at = env_number('FAKE_DL_FAIL_AT', None)
+    resolution = os.environ.get('FAKE_DL_RESOLUTION', '1080p')
+    truncate_at = random.randint(30, 90) if random.random() < env_number('FAKE_DL_TRUNCATE', 0) else None
+
+    for i in range(int(env_number('FAKE_DL_STDERR_LINES', 0))):
+        print(f'debug: stderr noise line {i} ' + 'x' * 200, file=sys.stderr)
+    print(f'Signed in successfully.\nVideo 1 of 1: {args.link}', flush=True)
+
+    os.makedirs(args.output, exist_ok=True)
+    container_id = args.link.rstrip('/').split('/')[-1]
+    path = os.path.join(args.output, f'{container_id}_{resolution}.ts')
+    chunk = b'\0' * (size // steps)
+    start = time.time()
+    with open(path, 'wb') as f:
+        for step in range(1, steps + 1):
+            percent = 100 * step // steps
+            if fail_at is not None and percent >= fail_at:
+                print(f'Failed to download segment: connection reset at {percent}%', file=sys.stderr, flush=True)
+                sys.exit(1)
+            if stall_at is not None and percent >= stall_at:
+                time.sleep(3600)
+            if truncate_at is None or percent < truncate_at:
+                f.write(chunk)
+            done = step * len(chunk)
+            speed = done / max(time.time() - start, 0.001)
+            sys.stdout.write(f'\r{percent}% @ {speed / 1000 ** 2:.1f} MB/s, {done / 1000 ** 2:.1f} MB/{size / 1000 ** 2:.1f} MB')
+            sys.stdout.flush()
+            time.sleep(delay)
+    print('\nDone.', flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import os
+import shutil
+import sys
+import time
+
+# Stand-in for binaries/ffmpeg. Understands the stream copy remux convert_to_mkv runs
+# (ffmpeg -y -i <input> ... <output>) and copies the input to the output, which is about
+# what a stream copy costs on disk. An audio extraction (-map 0:a, optionally cut with
+# -ss/-to) writes a tenth of the input instead, about the audio's share of a show.
+# Behaviour is scripted through environment variables:
+#   FAKE_FFMPEG_DELAY     extra seconds per remux (default 0)
+#   FAKE_FFMPEG_FAIL      exit with an error instead of writing the output (default off)
+
+
+def main():
+    args = sys.argv[1:]
+    if '-i' not in args or len(args) < 3:
+        print('fake ffmpeg: expected -i <input> ... <output>', file=sys.stderr)
+        sys.exit(1)
+    source = args[args.index('-i') + 1]
+    destination = args[-1]
+    if os.environ.get('FAKE_FFMPEG_FAIL'):
+        print(f'{source}: Invalid data found when processing input', file=sys.stderr)
+        sys.exit(1)
+    time.sleep(float(os.environ.get('FAKE_FFMPEG_DELAY') or 0))
+    if '0:a' in args:
+        with open(source, 'rb') as f:
+            audio = f.read(os.path.getsize(source) // 10)
+        with open(destination, 'wb') as f:
+            f.write(audio)
+        return
+    shutil.copyfile(source, destination)
+
+
+if __name__ == '__main__':
+    main()
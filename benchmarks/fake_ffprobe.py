@@ -0,0 +1,37 @@
+import json
+import os
+import sys
+
+# Stand-in for binaries/ffprobe. Answers -show_chapters with evenly spaced chapters and
+# -show_format/-show_streams with a duration and one video and one audio stream, as JSON
+# the way ffprobe -print_format json does. Scripted through environment variables:
+#   FAKE_FFPROBE_CHAPTERS   number of chapters (default 0, no chapters)
+#   FAKE_FFPROBE_DURATION   length of the video in seconds (default 10800)
+#   FAKE_FFPROBE_FULL_MB    size of a complete video, smaller files are reported as that
+#                           much shorter, like a truncated download (default off)
+
+
+def main():
+    if not sys.argv[1:] or not os.path.exists(sys.argv[-1]):
+        print('fake ffprobe: expected ... <input>', file=sys.stderr)
+        sys.exit(1)
+    count = int(os.environ.get('FAKE_FFPROBE_CHAPTERS') or 0)
+    duration = float(os.environ.get('FAKE_FFPROBE_DURATION') or 10800)
+    full_mb = float(os.environ.get('FAKE_FFPROBE_FULL_MB') or 0)
+    if full_mb:
+        duration *= min(1.0, os.path.getsize(sys.argv[-1]) / (full_mb * 1000 ** 2))
+    length = duration / count if count else 0
+    info = {}
+    if '-show_chapters' in sys.argv:
+        info['chapters'] = [{'id': i, 'start_time': f'{i * length:.6f}', 'end_time': f'{(i + 1) * length:.6f}',
+                             'tags': {'title': f'Chapter {i + 1}'}} for i in range(count)]
+    if '-show_streams' in sys.argv:
+        info['streams'] = [{'index': 0, 'codec_type': 'video', 'codec_name': 'h264'},
+                           {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac'}]
+    if '-show_format' in sys.argv:
+        info['format'] = {'filename': sys.argv[-1], 'duration': f'{duration:.6f}', 'size': str(os.path.getsize(sys.argv[-1]))}
+    print(json.dumps(info, indent=4))
+
+
+if __name__ == '__main__':
+    main()
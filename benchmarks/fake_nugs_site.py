@@ -0,0 +1,414 @@
+import concurrent.futures
+import datetime
+import email.utils
+import fnmatch
+import hashlib
+import html
+import http.server
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urljoin, urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+
+# An offline stand-in for nugs.net, built from the saved pages in fixtures/.
+# FakeNugsSite serves a login form, "recent" listings with Load More paging, release and
+# exclusive pages, cover art and the stream API for a synthetic catalog of any size.
+# Covers come with an ETag and Last-Modified and answer conditional requests with 304.
+# FakeDriver is just enough of a selenium WebDriver for nugs_vid_dl: it loads those pages
+# over HTTP and answers the handful of locators the script uses, without a browser.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ARTISTS = ["Joe Russo's Almost Dead", 'Kitchen Dwellers', 'Goose', "Umphrey's McGee", 'Twiddle',
+           'The String Cheese Incident', 'Trampled By Turtles', 'Del McCoury Band', 'Oteil Burbridge', 'SunSquabi']
+FIRST_RELEASE_ID = 40000
+FIRST_EXCLUSIVE_ID = 50000
+NUGS_HOSTS = ('play.nugs.net', 'id.nugs.net', 'secure.livedownloads.com', 'streamapi.nugs.net')
+
+LOGIN_PAGE = '''<!DOCTYPE html>
+<html><head><title>Log in | nugs.net</title></head><body>
+<form method="post" action="https://play.nugs.net/browse/home">
+<input name="Input.Email" type="email"><input name="Input.Password" type="password">
+<button class="btn btn-block btn-primary" type="submit">Log in</button>
+</form></body></html>'''
+# What a real release page pulls in besides the document: web fonts, trackers, a muted
+# preview video and track thumbnails. Added to release pages with page_weight=True.
+PAGE_WEIGHT_HEAD = '''<link rel="preload" href="/fonts/inter-400.woff2" as="font" crossorigin>
+<link rel="preload" href="/fonts/inter-700.woff2" as="font" crossorigin>
+<script async src="/third-party/www.googletagmanager.com/gtag/js?id=G-BENCH"></script>
+<script async src="/third-party/connect.facebook.net/en_US/fbevents.js"></script>
+'''
+PAGE_WEIGHT_BODY = ('<video autoplay muted playsinline src="/media/preview_{id}.mp4"></video>\n'
+                    + ''.join(f'<img src="/img/track_{{id}}_{n}.jpg" alt="">' for n in range(12)) + '\n')
+RESOURCE_SIZES = {'/fonts/': 40 * 1000, '/media/': 400 * 1000, '/third-party/': 30 * 1000, '/img/': 12 * 1000, '/assets/': 20 * 1000}
+HOME_PAGE = '<!DOCTYPE html><html><head><title>nugs.net</title></head><body><main>Home</main></body></html>'
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class FakeNugsSite:
+    def __init__(self, releases=48, exclusives=16, page_size=32, latency=0.0, covers=20, page_weight=False, resource_latency=0.0):
+        # latency is added to every page and API response, like a slow connection to nugs,
+        # resource_latency to every font, script, image and video the pages reference
+        self.release_ids = [FIRST_RELEASE_ID - i for i in range(releases)]
+        self.exclusive_ids = [FIRST_EXCLUSIVE_ID - i for i in range(exclusives)]
+        self.page_size = page_size
+        self.latency = latency
+        self.covers = covers
+        self.page_weight = page_weight
+        self.resource_latency = resource_latency
+        self.requests = 0
+        self.resource_requests = 0
+        self.image_requests = 0
+        self.image_not_modified = 0
+        self.lock = threading.Lock()
+        self.release_template = read_fixture('release_33516.html')
+        self.exclusive_template = read_fixture('exclusive_35973.html')
+        listing = read_fixture('recent.html')
+        self.listing_head = listing[:listing.index('<section class="_Grid_ex3y9_55">')]
+        self.listing_tail = listing[listing.index('</main>'):]
+        with open(os.path.join(FIXTURES_DIR, 'api', 'container_33516.json'), 'r', encoding='utf-8') as f:
+            self.container_template = json.load(f)
+        self.cover_bytes = b'\xff\xd8\xff\xe0' + os.urandom(60 * 1000)
+        self.covers_modified = email.utils.formatdate(time.time() - 86400, usegmt=True)
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-nugs-site', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def local_url(self, url):
+        # https://play.nugs.net/release/1 -> http://127.0.0.1:port/release/1
+        parsed = urlparse(url)
+        if parsed.netloc in NUGS_HOSTS:
+            return self.base_url + parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        return url
+
+    @property
+    def api_base(self):
+        return self.base_url + '/api/'
+
+    def release_details(self, release_id, exclusive=False):
+        index = (FIRST_EXCLUSIVE_ID if exclusive else FIRST_RELEASE_ID) - release_id
+        artist = ARTISTS[index % len(ARTISTS)]
+        # Every release gets its own artist/date pair so nothing dedupes by accident
+        start = datetime.date(2022, 1, 1) if exclusive else datetime.date(2012, 1, 1)
+        date = start + datetime.timedelta(days=index)
+        return artist, date, f'{self.base_url}/images/cover_{release_id % self.covers}.jpg'
+
+    def render_release(self, release_id):
+        artist, date, cover = self.release_details(release_id)
+        page = self.release_template.replace("Joe Russo&#x27;s Almost Dead", html.escape(artist))
+        page = page.replace("Joe Russo's Almost Dead", html.escape(artist))
+        page = page.replace('Jan 14, 2024', date.strftime('%b %d, %Y'))
+        return self.add_weight(page.replace('https://secure.livedownloads.com/images/cover_8430.jpg', cover), release_id)
+
+    def render_exclusive(self, release_id):
+        artist, date, cover = self.release_details(release_id, exclusive=True)
+        page = self.exclusive_template.replace('Kitchen Dwellers', html.escape(artist))
+        page = page.replace('2024-01-19T03:00:00.000Z', f'{date.isoformat()}T03:00:00.000Z')
+        page = page.replace('Jan 19, 2024', date.strftime('%b %d, %Y'))
+        return self.add_weight(page.replace('https://secure.livedownloads.com/images/cover_965.jpg', cover), release_id)
+
+    def add_weight(self, page, release_id):
+        if not self.page_weight:
+            return page
+        page = page.replace('</head>', PAGE_WEIGHT_HEAD + '</head>', 1)
+        return page.replace('</main>', PAGE_WEIGHT_BODY.format(id=release_id) + '</main>', 1)
+
+    def render_resource(self, path):
+        for prefix, size in RESOURCE_SIZES.items():
+            if path.startswith(prefix):
+                if self.resource_latency:
+                    time.sleep(self.resource_latency)
+                content_type = 'text/javascript' if prefix in ('/third-party/', '/assets/') else 'application/octet-stream'
+                return b'/' * size, content_type
+        return None, None
+
+    def render_listing(self, path, page_number):
+        # Cards for the first page_number pages, the way the app appends a page per Load More click
+        if 'livestreams' in path:
+            hrefs = [f'/watch/livestreams/exclusive/{i}' for i in self.exclusive_ids]
+        else:
+            hrefs = [f'/watch/release/{i}' for i in self.release_ids]
+        shown = hrefs[:page_number * self.page_size]
+        cards = ''.join(f'<a class="_Card_ex3y9_60" href="{href}"><img src="/img/{n}.jpg" alt=""><span>Release {n}</span></a>\n'
+                        for n, href in enumerate(shown))
+        more = ''
+        if len(shown) < len(hrefs):
+            more = f'<button class="_LoadMore_ex3y9_70" data-next="{path}?page={page_number + 1}">Load More</button>\n'
+        return f'{self.listing_head}<section class="_Grid_ex3y9_55">\n{cards}</section>\n{more}{self.listing_tail}'
+
+    def render_container(self, release_id):
+        exclusive = release_id > FIRST_RELEASE_ID
+        artist, date, cover = self.release_details(release_id, exclusive)
+        container = dict(self.container_template['Response'])
+        container.update({'containerID': release_id, 'artistName': artist, 'img': {'url': cover},
+                          'performanceDate': f'{date.month}/{date.day}/{date.year}',
+                          'containerInfo': f'{date.month}/{date.day}/{date.year} {container["venueName"]}'})
+        return {'methodName': 'catalog.container', 'responseAvailabilityCode': 0, 'Response': container}
+
+    def render_api(self, query):
+        method = query.get('method', [''])[0]
+        if method == 'catalog.container':
+            return self.render_container(int(query['containerID'][0]))
+        if method == 'catalog.containersAll':
+            offset = int(query.get('startOffset', ['1'])[0]) - 1
+            limit = int(query.get('limit', ['100'])[0])
+            ids = self.release_ids[offset:offset + limit]
+            return {'methodName': method, 'Response': {'containers': [{'containerID': i} for i in ids]}}
+        return None
+
+    def handle(self, request):
+        with self.lock:
+            self.requests += 1
+        parsed = urlparse(request.path)
+        path = parsed.path
+        query = parse_qs(parsed.query)
+        body, content_type = None, 'text/html; charset=utf-8'
+        if path.startswith('/images/'):
+            if self.resource_latency:
+                time.sleep(self.resource_latency)
+            self.send_cover(request, path)
+            return
+        elif path.startswith(tuple(RESOURCE_SIZES)):
+            with self.lock:
+                self.resource_requests += 1
+            body, content_type = self.render_resource(path)
+        else:
+            if self.latency:
+                time.sleep(self.latency)
+            match = re.search(r'/(release|exclusive)/(\d+)$', path)
+            if path == '/account/login':
+                body = LOGIN_PAGE
+            elif match and match.group(1) == 'release':
+                body = self.render_release(int(match.group(2)))
+            elif match:
+                body = self.render_exclusive(int(match.group(2)))
+            elif path.endswith('/recent'):
+                body = self.render_listing(path, int(query.get('page', ['1'])[0]))
+            elif path.startswith('/api/'):
+                data = self.render_api(query)
+                if data is not None:
+                    body, content_type = json.dumps(data), 'application/json'
+            elif path == '/favicon.ico':
+                body, content_type = b'', 'image/x-icon'
+            else:
+                body = HOME_PAGE
+        if body is None:
+            request.send_response(404)
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        request.send_response(200)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def send_cover(self, request, path):
+        # Every cover number has its own content, so the cache stores one blob per cover
+        etag = f'"{hashlib.md5(path.encode()).hexdigest()}"'
+        with self.lock:
+            self.image_requests += 1
+        if request.headers.get('If-None-Match') == etag or \
+                (not request.headers.get('If-None-Match') and request.headers.get('If-Modified-Since') == self.covers_modified):
+            with self.lock:
+                self.image_not_modified += 1
+            request.send_response(304)
+            request.send_header('ETag', etag)
+            request.end_headers()
+            return
+        body = self.cover_bytes + path.encode()
+        request.send_response(200)
+        request.send_header('Content-Type', 'image/jpeg')
+        request.send_header('Content-Length', str(len(body)))
+        request.send_header('ETag', etag)
+        request.send_header('Last-Modified', self.covers_modified)
+        request.end_headers()
+        request.wfile.write(body)
+
+
+# The XPath expressions nugs_vid_dl uses, as BeautifulSoup searches
+text_xpath_pattern = re.compile(r"^//(\w+)\[contains\(\., '([^']*)'\)\]$")
+attribute_xpath_pattern = re.compile(r"^//(\w+)\[(.+)\]$")
+attribute_contains_pattern = re.compile(r"contains\(@([\w-]+), '([^']*)'\)")
+position_xpath_pattern = re.compile(r"^\((.+)\)\[position\(\) > (\d+)\]$")
+
+
+class FakeElement:
+    def __init__(self, driver, tag):
+        self.driver = driver
+        self.tag = tag
+        self.text = tag.get_text(strip=True)
+        self.tag_name = tag.name
+
+    def get_attribute(self, name):
+        return self.tag.get(name)
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def send_keys(self, *values):
+        self.tag['value'] = self.tag.get('value', '') + ''.join(values)
+
+    def click(self):
+        if self.tag.get('data-next'):
+            # Load More: the app appends the next page without changing the address
+            self.driver.load('https://play.nugs.net' + self.tag['data-next'], keep_url=True)
+        elif self.tag.name == 'a' and self.tag.get('href'):
+            self.driver.get(self.tag['href'])
+        elif self.tag.find_parent('form') is not None:
+            form = self.tag.find_parent('form')
+            if form.find(attrs={'name': 'Input.Password'}) is not None:
+                self.driver.cookies = [{'name': 'nugs_session', 'value': 'bench', 'domain': 'play.nugs.net', 'path': '/',
+                                        'expiry': int(time.time()) + 3600},
+                                       {'name': 'idsrv', 'value': 'bench', 'domain': 'id.nugs.net', 'path': '/'}]
+            self.driver.get(form.get('action'))
+
+
+class FakeDriver:
+    # With options (nugs_vid_dl.browser_options) get() also fetches the subresources Chrome would
+    # wait for before returning: everything but video for the normal page load strategy, only
+    # blocking scripts for eager, never images when prefs turn them off or URLs blocked over CDP
+    def __init__(self, site, options=None):
+        self.site = site
+        self.session = requests.Session()
+        self.current_url = 'about:blank'
+        self.page_source = ''
+        self.cookies = []
+        self._soup = None
+        self.page_load_strategy = 'none'
+        self.images_enabled = True
+        self.blocked_urls = []
+        if options is not None:
+            self.page_load_strategy = options.page_load_strategy
+            prefs = options.experimental_options.get('prefs', {})
+            self.images_enabled = prefs.get('profile.managed_default_content_settings.images') != 2
+        self.resource_pool = concurrent.futures.ThreadPoolExecutor(max_workers=6)
+
+    def load(self, url, keep_url=False):
+        response = self.session.get(self.site.local_url(url), timeout=30)
+        self.page_source = response.text
+        self._soup = None
+        if not keep_url:
+            self.current_url = url
+        if self.page_load_strategy in ('normal', 'eager'):
+            resources = [resource for resource in self.subresources(response.url) if not self.is_blocked(resource)]
+            # Chrome fetches up to six at a time from one host
+            list(self.resource_pool.map(lambda resource: self.session.get(resource, timeout=30).content, resources))
+
+    def subresources(self, page_url):
+        urls = []
+        for script in self.soup.find_all('script', src=True):
+            if self.page_load_strategy == 'normal' or not script.has_attr('async'):
+                urls.append(script['src'])
+        if self.page_load_strategy == 'normal':
+            urls += [link['href'] for link in self.soup.find_all('link', href=True)]
+            if self.images_enabled:
+                urls += [image['src'] for image in self.soup.find_all('img', src=True)]
+        return [self.site.local_url(urljoin(page_url, url)) for url in urls]
+
+    def is_blocked(self, url):
+        return any(fnmatch.fnmatchcase(url, pattern) for pattern in self.blocked_urls)
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        if cmd == 'Network.setBlockedURLs':
+            self.blocked_urls = list(cmd_args['urls'])
+        return {}
+
+    def get(self, url):
+        if url.startswith('/'):
+            url = 'https://play.nugs.net' + url
+        self.load(url)
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.page_source, 'html.parser')
+        return self._soup
+
+    def find_elements(self, by, value):
+        if by == By.XPATH:
+            tags = []
+            for part in value.split(' | '):
+                tags.extend(self.xpath(part.strip()))
+        elif by == By.CSS_SELECTOR:
+            tags = self.soup.select(value)
+        elif by == By.CLASS_NAME:
+            tags = self.soup.find_all(class_=value)
+        elif by == By.NAME:
+            tags = self.soup.find_all(attrs={'name': value})
+        elif by == By.TAG_NAME:
+            tags = self.soup.find_all(value)
+        elif by == By.ID:
+            tags = self.soup.find_all(id=value)
+        else:
+            raise ValueError(f'FakeDriver does not support {by} locators')
+        return [FakeElement(self, tag) for tag in tags]
+
+    def xpath(self, expression):
+        match = position_xpath_pattern.match(expression)
+        if match:
+            inner, skip = match.groups()
+            return self.xpath(inner)[int(skip):]
+        match = text_xpath_pattern.match(expression)
+        if match:
+            name, text = match.groups()
+            return [tag for tag in self.soup.find_all(name) if text in tag.get_text()]
+        match = attribute_xpath_pattern.match(expression)
+        if match:
+            name, condition = match.groups()
+            terms = attribute_contains_pattern.findall(condition)
+            if terms:
+                return [tag for tag in self.soup.find_all(name)
+                        if any(needle in (tag.get(attribute) or '') for attribute, needle in terms)]
+        raise ValueError(f'FakeDriver does not understand the XPath {expression}')
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f'no element for {by}={value}')
+        return elements[0]
+
+    def add_cookie(self, cookie):
+        self.cookies = [c for c in self.cookies if c['name'] != cookie['name']] + [cookie]
+
+    def get_cookies(self):
+        return list(self.cookies)
+
+    def delete_all_cookies(self):
+        self.cookies = []
+
+    def quit(self):
+        self.resource_pool.shutdown()
+        self.session.close()
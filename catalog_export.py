@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+import threading
+
+# Append-only catalog of every release the script has processed.
+# Records are buffered a few at a time and appended to a JSONL file, so a large crawl
+# never holds more than buffer_size records in memory. The exporters stream the JSONL
+# into CSV or Parquet for dashboards without re-parsing any HTML.
+
+CATALOG_FIELDS = ['release_id', 'kind', 'url', 'artist', 'venue', 'date', 'exclusive', 'status', 'setlist',
+                  'output_path', 'resolution', 'size_bytes', 'checksum', 'duration_seconds', 'setlist_seconds',
+                  'verified', 'verify_error', 'page_seconds', 'download_seconds', 'finalize_seconds', 'recorded_at']
+
+
+class CatalogWriter:
+    def __init__(self, path, buffer_size=50):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.lock = threading.Lock()
+
+    def append(self, record):
+        with self.lock:
+            self.buffer.append(json.dumps(record, ensure_ascii=False))
+            if len(self.buffer) >= self.buffer_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write('\n'.join(self.buffer) + '\n')
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+
+
+def iter_catalog(path):
+    # path can also be a list of catalogs, e.g. one per cluster host, read one after the other
+    for one_path in [path] if isinstance(path, str) else path:
+        with open(one_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def csv_value(value):
+    if isinstance(value, list):
+        return ' | '.join(str(item) for item in value)
+    return value
+
+
+def export_csv(path, out_path):
+    count = 0
+    with open(out_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=CATALOG_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for record in iter_catalog(path):
+            writer.writerow({key: csv_value(record.get(key)) for key in CATALOG_FIELDS})
+            count += 1
+    return count
+
+
+def export_parquet(path, out_path, batch_size=1000):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError('Parquet export needs the pyarrow package (pip install pyarrow)')
+    schema = pyarrow.schema([
+        ('release_id', pyarrow.string()), ('kind', pyarrow.string()), ('url', pyarrow.string()),
+        ('artist', pyarrow.string()), ('venue', pyarrow.string()), ('date', pyarrow.string()),
+        ('exclusive', pyarrow.bool_()), ('status', pyarrow.string()), ('setlist', pyarrow.list_(pyarrow.string())),
+        ('output_path', pyarrow.string()), ('resolution', pyarrow.string()), ('size_bytes', pyarrow.int64()),
+        ('checksum', pyarrow.string()), ('duration_seconds', pyarrow.float64()),
+        ('setlist_seconds', pyarrow.int64()), ('verified', pyarrow.bool_()), ('verify_error', pyarrow.string()),
+        ('page_seconds', pyarrow.float64()), ('download_seconds', pyarrow.float64()),
+        ('finalize_seconds', pyarrow.float64()), ('recorded_at', pyarrow.float64()),
+    ])
+    count = 0
+    batch = []
+    with pyarrow.parquet.ParquetWriter(out_path, schema) as writer:
+        for record in iter_catalog(path):
+            batch.append({key: record.get(key) for key in CATALOG_FIELDS})
+            if len(batch) >= batch_size:
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export_catalog(path, out_path, file_format=None):
+    file_format = file_format or os.path.splitext(out_path)[1].lstrip('.').lower()
+    if file_format == 'csv':
+        return export_csv(path, out_path)
+    if file_format == 'parquet':
+        return export_parquet(path, out_path)
+    raise ValueError(f'unknown export format: {file_format}')
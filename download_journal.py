@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+import time
+
+# Crash-safe record of every download job and how far it got.
+# A job moves through the states below in order; each step is committed before the
+# next one starts, so after a crash or reboot a job that was downloaded or remuxed resumes
+# from there instead of downloading the whole video again. A job still 'downloading'
+# starts the download over, the downloader can't resume a partial file. A job that keeps failing
+# verification ends up 'failed' and is left alone until retry_failed().
+
+STATES = ('queued', 'downloading', 'downloaded', 'remuxed', 'moved', 'done', 'failed')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    url TEXT,
+    display_text TEXT,
+    exclusive INTEGER,
+    video_directory TEXT,
+    state TEXT,
+    staged_file TEXT,
+    output_file TEXT,
+    final_path TEXT,
+    attempts INTEGER DEFAULT 0,
+    error TEXT,
+    updated_at REAL,
+    checksum TEXT,
+    duration REAL
+);
+'''
+# Columns added after the first release, added to older journals when they are opened
+ADDED_COLUMNS = {'checksum': 'TEXT', 'duration': 'REAL'}
+job_fields = ('url', 'display_text', 'exclusive', 'video_directory', 'staged_file', 'output_file', 'final_path', 'attempts', 'error',
+              'checksum', 'duration')
+
+
+class DownloadJournal:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            columns = {row['name'] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+            for name, column_type in ADDED_COLUMNS.items():
+                if name not in columns:
+                    self.conn.execute(f'ALTER TABLE jobs ADD COLUMN {name} {column_type}')
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def enqueue(self, job_id, url, display_text, exclusive, video_directory):
+        # New jobs start queued, finished jobs that are queued again start over
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT state FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if row is None:
+                self.conn.execute('INSERT INTO jobs (job_id, url, display_text, exclusive, video_directory, state, updated_at) '
+                                  'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (job_id, url, display_text, int(bool(exclusive)), video_directory, 'queued', time.time()))
+            elif row['state'] == 'done':
+                self.conn.execute('UPDATE jobs SET url = ?, display_text = ?, exclusive = ?, video_directory = ?, state = ?, '
+                                  'staged_file = NULL, output_file = NULL, final_path = NULL, attempts = 0, error = NULL, checksum = NULL, duration = NULL, '
+                                  'updated_at = ? '
+                                  'WHERE job_id = ?',
+                                  (url, display_text, int(bool(exclusive)), video_directory, 'queued', time.time(), job_id))
+
+    def update(self, job_id, state=None, **fields):
+        unknown = set(fields) - set(job_fields)
+        if unknown:
+            raise ValueError(f'unknown job fields: {", ".join(sorted(unknown))}')
+        if state is not None:
+            if state not in STATES:
+                raise ValueError(f'unknown job state: {state}')
+            fields['state'] = state
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self.lock, self.conn:
+            self.conn.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?', (*fields.values(), job_id))
+
+    def add_attempt(self, job_id):
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE jobs SET attempts = attempts + 1, updated_at = ? WHERE job_id = ?', (time.time(), job_id))
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def unfinished(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs WHERE state NOT IN ('done', 'failed') ORDER BY updated_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def failed(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs WHERE state = 'failed' ORDER BY updated_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def retry_failed(self):
+        # Puts every given up job back in the queue with a fresh attempt count
+        with self.lock, self.conn:
+            return self.conn.execute("UPDATE jobs SET state = 'queued', attempts = 0, updated_at = ? WHERE state = 'failed'",
+                                     (time.time(),)).rowcount
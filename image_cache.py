@@ -0,0 +1,157 @@
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import metrics
+from rate_limit import retry_after_seconds
+
+# Content-addressed cache for cover art.
+# Images are stored once per distinct content hash under blobs/, looked up by URL, and
+# revalidated with conditional requests (ETag / Last-Modified). Release folders get a hard
+# link to the cached blob (or a copy where links aren't supported), so a poster shared by
+# many shows is only downloaded and stored once.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER,
+    fetched_at REAL,
+    used_at REAL
+);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256);
+'''
+
+
+class ImageCache:
+    def __init__(self, cache_dir, max_bytes=500 * 1000 ** 2, workers=4, revalidate_after=24 * 3600, timeout=10, limiter=None):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.timeout = timeout
+        self.limiter = limiter
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(cache_dir, 'images.sqlite3'), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-fetch')
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], sha256 + '.jpg')
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM images WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row else None
+
+    def fetch(self, url):
+        # Returns the path of the cached blob for url, downloading or revalidating it if needed
+        row = self.lookup(url)
+        now = time.time()
+        if row and os.path.exists(self.blob_path(row['sha256'])):
+            if now - row['fetched_at'] < self.revalidate_after:
+                self.touch(url, now)
+                return self.blob_path(row['sha256'])
+            headers = {}
+            if row['etag']:
+                headers['If-None-Match'] = row['etag']
+            if row['last_modified']:
+                headers['If-Modified-Since'] = row['last_modified']
+        else:
+            row, headers = None, {}
+        if self.limiter is not None:
+            self.limiter.acquire()
+        with metrics.span('image_fetch'):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 429 and self.limiter is not None:
+            self.limiter.pause(retry_after_seconds(response.headers.get('Retry-After')))
+        if response.status_code == 304 and row:
+            with self.lock, self.conn:
+                self.conn.execute('UPDATE images SET fetched_at = ?, used_at = ? WHERE url = ?', (now, now, url))
+            return self.blob_path(row['sha256'])
+        response.raise_for_status()
+        content = response.content
+        metrics.count('image_bytes', len(content))
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(content)
+            os.replace(temp_path, path)
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO images (url, sha256, etag, last_modified, size, fetched_at, used_at) '
+                              'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (url, sha256, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                               len(content), now, now))
+        return path
+
+    def touch(self, url, now):
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE images SET used_at = ? WHERE url = ?', (now, url))
+
+    def place(self, url, download_path):
+        # Puts the image for url at download_path as a hard link to the cached blob
+        blob = self.fetch(url)
+        if os.path.exists(download_path):
+            if os.path.samefile(blob, download_path):
+                return download_path
+            os.remove(download_path)
+        try:
+            os.link(blob, download_path)
+        except OSError:
+            # Different filesystem or no hard link support (e.g. some network shares)
+            shutil.copyfile(blob, download_path)
+        return download_path
+
+    def place_async(self, url, download_path):
+        def report_error(future):
+            if future.exception():
+                print(f'Error fetching image {url}: {future.exception()}')
+
+        future = self.executor.submit(self.place, url, download_path)
+        future.add_done_callback(report_error)
+        return future
+
+    def evict(self):
+        # Drops the least recently used blobs until the cache fits in max_bytes.
+        # Release folders keep their hard links, only the cached copy goes away
+        with self.lock:
+            blobs = self.conn.execute('SELECT sha256, MAX(size) AS size, MAX(used_at) AS used_at FROM images '
+                                      'GROUP BY sha256 ORDER BY used_at').fetchall()
+        total = sum(blob['size'] for blob in blobs)
+        removed = 0
+        for blob in blobs:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.blob_path(blob['sha256']))
+            except FileNotFoundError:
+                pass
+            with self.lock, self.conn:
+                self.conn.execute('DELETE FROM images WHERE sha256 = ?', (blob['sha256'],))
+            total -= blob['size']
+            removed += 1
+        return removed
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.evict()
+        self.session.close()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,245 @@
+import json
+import os
+import socket
+import threading
+import time
+
+# Download jobs shared by every host pointed at the same data directory.
+# Only plain files are used, no SQLite, because file locking over SMB/NFS shares is
+# unreliable while creating a file with O_EXCL is atomic on both (the SQLite files and
+# appended logs of the script are kept per host for the same reason):
+#   pending/<job_id>.json   queued job, kept until the job is done
+#   leases/<job_id>.lease   the host working on it and until when, renewed while it runs
+#   done/<job_id>           finished, the job is never queued again
+# A host claims a pending job by creating its lease. A lease that isn't renewed (the
+# host died, or the job failed) expires, and the job can then be claimed by anyone.
+
+STALE_LOCK_SECONDS = 120
+
+
+def default_owner():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def create_exclusive(path, data):
+    # False if the file already exists
+    try:
+        with open(path, 'x', encoding='utf-8') as file:
+            file.write(data)
+    except FileExistsError:
+        return False
+    return True
+
+
+def read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        # Gone, or still being written by the host that created it
+        return None
+
+
+class SharedJobQueue:
+    def __init__(self, root, owner=None, lease_seconds=600):
+        self.root = root
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.pending_dir = os.path.join(root, 'pending')
+        self.lease_dir = os.path.join(root, 'leases')
+        self.done_dir = os.path.join(root, 'done')
+        for folder in (self.pending_dir, self.lease_dir, self.done_dir):
+            os.makedirs(folder, exist_ok=True)
+        self.lock = threading.Lock()
+        self.held = set()
+        self.stopped = threading.Event()
+        self.heartbeat = threading.Thread(target=self._renew_loop, name='job-lease-heartbeat', daemon=True)
+        self.heartbeat.start()
+
+    def pending_path(self, job_id):
+        return os.path.join(self.pending_dir, job_id + '.json')
+
+    def lease_path(self, job_id):
+        return os.path.join(self.lease_dir, job_id + '.lease')
+
+    def done_path(self, job_id):
+        return os.path.join(self.done_dir, job_id)
+
+    def is_done(self, job_id):
+        return os.path.exists(self.done_path(job_id))
+
+    def enqueue(self, job_id, payload):
+        # False when the job is already queued, running or done on some host
+        if self.is_done(job_id):
+            return False
+        return create_exclusive(self.pending_path(job_id), json.dumps(payload))
+
+    def read_lease(self, job_id):
+        return read_json(self.lease_path(job_id))
+
+    def write_lease(self, job_id):
+        return json.dumps({'owner': self.owner, 'expires': time.time() + self.lease_seconds})
+
+    def claim(self, job_id):
+        # Returns the job's payload once this host holds its lease, None otherwise
+        if self.is_done(job_id):
+            return None
+        payload = read_json(self.pending_path(job_id))
+        if payload is None:
+            return None
+        if not create_exclusive(self.lease_path(job_id), self.write_lease(job_id)):
+            if not self.break_expired(job_id) or not create_exclusive(self.lease_path(job_id), self.write_lease(job_id)):
+                return None
+        if self.is_done(job_id):
+            # Finished by its last owner between the checks
+            self.remove(self.lease_path(job_id))
+            return None
+        with self.lock:
+            self.held.add(job_id)
+        return payload
+
+    def break_expired(self, job_id):
+        # Only one host can rename the expired lease away, the others get FileNotFoundError
+        lease = self.read_lease(job_id)
+        if lease is not None and lease.get('expires', 0) > time.time():
+            return False
+        if lease is None and not self.is_stale(self.lease_path(job_id)):
+            # Unreadable but fresh: its owner is still writing it
+            return False
+        broken_path = f'{self.lease_path(job_id)}.{self.owner}.expired'
+        try:
+            os.rename(self.lease_path(job_id), broken_path)
+        except OSError:
+            return False
+        moved = read_json(broken_path)
+        if moved is not None and moved.get('expires', 0) > time.time():
+            # Another host broke it first and already claimed the job, put its lease back
+            create_exclusive(self.lease_path(job_id), json.dumps(moved))
+            self.remove(broken_path)
+            return False
+        self.remove(broken_path)
+        previous = lease.get('owner') if lease else 'unknown'
+        print(f'lease on {job_id} held by {previous} expired, re-queued')
+        return True
+
+    def is_stale(self, path):
+        try:
+            return time.time() - os.path.getmtime(path) > STALE_LOCK_SECONDS
+        except FileNotFoundError:
+            return True
+
+    def claim_next(self):
+        # Oldest pending job nobody holds a live lease on, as (job_id, payload), or None
+        entries = []
+        for entry in os.scandir(self.pending_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.name[:-len('.json')]))
+                except FileNotFoundError:
+                    # Completed by another host while listing
+                    continue
+        for _, job_id in sorted(entries):
+            with self.lock:
+                if job_id in self.held:
+                    continue
+            if self.is_done(job_id):
+                self.remove(self.pending_path(job_id))
+                continue
+            payload = self.claim(job_id)
+            if payload is not None:
+                return job_id, payload
+        return None
+
+    def renew(self, job_id):
+        lease = self.read_lease(job_id)
+        if lease is None or lease.get('owner') != self.owner:
+            print(f'lost the lease on {job_id}')
+            self.release(job_id)
+            return False
+        temp_path = f'{self.lease_path(job_id)}.{self.owner}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(self.write_lease(job_id))
+        os.replace(temp_path, self.lease_path(job_id))
+        return True
+
+    def _renew_loop(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            with self.lock:
+                held = list(self.held)
+            for job_id in held:
+                try:
+                    self.renew(job_id)
+                except OSError as e:
+                    print(f'Exception in _renew_loop: {e}')
+
+    def release(self, job_id):
+        # Stops renewing, the job goes back to the queue once its lease expires, which
+        # spaces out retries of a job that keeps failing
+        with self.lock:
+            self.held.discard(job_id)
+
+    def complete(self, job_id):
+        create_exclusive(self.done_path(job_id), self.owner)
+        self.release(job_id)
+        self.remove(self.pending_path(job_id))
+        self.remove(self.lease_path(job_id))
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def counts(self):
+        # (pending, running, done), running meaning a live lease
+        now = time.time()
+        pending = [name[:-len('.json')] for name in os.listdir(self.pending_dir) if name.endswith('.json')]
+        running = 0
+        for job_id in pending:
+            lease = self.read_lease(job_id)
+            if lease is not None and lease.get('expires', 0) > now:
+                running += 1
+        return len(pending) - running, running, len(os.listdir(self.done_dir))
+
+    def close(self):
+        self.stopped.set()
+        self.heartbeat.join(timeout=5)
+        # Leases still held are released right away so another host can take over
+        with self.lock:
+            held = list(self.held)
+            self.held.clear()
+        for job_id in held:
+            lease = self.read_lease(job_id)
+            if lease is not None and lease.get('owner') == self.owner:
+                self.remove(self.lease_path(job_id))
+
+
+class FileLock:
+    # Cross-host lock on a shared folder, for short critical sections like appending a
+    # line. A lock file older than stale_seconds is left over from a crashed host
+    def __init__(self, path, stale_seconds=STALE_LOCK_SECONDS, poll=0.05):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.poll = poll
+        self.thread_lock = threading.Lock()
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        while not create_exclusive(self.path, default_owner()):
+            try:
+                if time.time() - os.path.getmtime(self.path) > self.stale_seconds:
+                    os.remove(self.path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(self.poll)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        finally:
+            self.thread_lock.release()
+        return False
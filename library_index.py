@@ -0,0 +1,181 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent dedupe index for the video library.
+# Every show is stored under its normalized "artist date" key (see release_names.dedupe_key) and, once known, under its nugs release/exclusive id, so "do we already
+# have this?" is a single indexed lookup instead of a scan of processed_filenames.txt
+# and the video directory.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS library (
+    key TEXT PRIMARY KEY,
+    filename TEXT,
+    source TEXT,
+    added_at REAL
+);
+CREATE TABLE IF NOT EXISTS releases (
+    kind TEXT,
+    release_id TEXT,
+    key TEXT,
+    seen_at REAL,
+    PRIMARY KEY (kind, release_id)
+);
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    path TEXT,
+    size_bytes INTEGER,
+    checksum TEXT,
+    duration REAL,
+    verified_at REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+class LibraryIndex:
+    def __init__(self, db_path, normalize, key_version=None):
+        # normalize turns a file or display name into its dedupe key (or None),
+        # key_version changes whenever normalize does
+        self.db_path = db_path
+        self.normalize = normalize
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+        if key_version is not None and self.get_meta('key_version') != str(key_version):
+            self.rekey()
+            self.set_meta('key_version', key_version)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM library').fetchone()[0]
+
+    def names(self, contains=None):
+        # File or display names of every show, sorted, optionally only those containing some text
+        with self.lock:
+            names = [row[0] for row in self.conn.execute('SELECT filename FROM library ORDER BY filename COLLATE NOCASE')]
+        if contains:
+            needle = contains.casefold()
+            names = [name for name in names if needle in name.casefold()]
+        return names
+
+    def has_key(self, key):
+        if not key:
+            return False
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM library WHERE key = ?', (key,)).fetchone() is not None
+
+    def add(self, name, source, kind=None, release_id=None):
+        key = self.normalize(name.strip())
+        now = time.time()
+        with self.lock, self.conn:
+            if key:
+                self.conn.execute('INSERT OR IGNORE INTO library (key, filename, source, added_at) VALUES (?, ?, ?, ?)',
+                                  (key, name.strip(), source, now))
+        if kind and release_id:
+            self.record_release(kind, release_id, key)
+        return key
+
+    def record_file(self, filename, path, size_bytes, checksum, duration):
+        # Checksum ('sha256:<hex>') and duration of a downloaded file, as verified when it was finalized
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO files (filename, path, size_bytes, checksum, duration, verified_at) '
+                              'VALUES (?, ?, ?, ?, ?, ?)', (filename, path, size_bytes, checksum, duration, time.time()))
+
+    def rekey(self):
+        # Recomputes every stored key from its file name after the key format changed
+        with self.lock:
+            rows = self.conn.execute('SELECT key, filename, source, added_at FROM library').fetchall()
+        renamed = {}
+        new_rows = []
+        for key, filename, source, added_at in rows:
+            new_key = self.normalize(filename)
+            renamed[key] = new_key
+            if new_key:
+                new_rows.append((new_key, filename, source, added_at))
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM library')
+            self.conn.executemany('INSERT OR IGNORE INTO library (key, filename, source, added_at) VALUES (?, ?, ?, ?)', new_rows)
+            self.conn.executemany('UPDATE releases SET key = ? WHERE key = ?',
+                                  [(new_key, key) for key, new_key in renamed.items() if new_key != key])
+        if rows:
+            print(f"Recomputed {len(new_rows)} library keys")
+        return len(new_rows)
+
+    def has_release(self, kind, release_id):
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM releases WHERE kind = ? AND release_id = ?',
+                                     (kind, str(release_id))).fetchone() is not None
+
+    def record_release(self, kind, release_id, key):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO releases (kind, release_id, key, seen_at) VALUES (?, ?, ?, ?)',
+                              (kind, str(release_id), key, time.time()))
+
+    def get_meta(self, name, default=None):
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, name, value):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, str(value)))
+
+    def get_crawl_mark(self, listing_url):
+        # The release ids ('kind/id') found at the top of a listing on its last crawl
+        return json.loads(self.get_meta(f'crawl_mark:{listing_url}', '[]'))
+
+    def set_crawl_mark(self, listing_url, release_keys):
+        self.set_meta(f'crawl_mark:{listing_url}', json.dumps(list(release_keys)))
+
+    def add_many(self, names, source):
+        now = time.time()
+        rows = []
+        for name in names:
+            key = self.normalize(name.strip())
+            if key:
+                rows.append((key, name.strip(), source, now))
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO library (key, filename, source, added_at) VALUES (?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def import_processed_file(self, file_path):
+        # One-time import of a processed_filenames.txt, later downloads are added as they finish
+        meta_name = f'imported:{os.path.abspath(file_path)}'
+        if self.get_meta(meta_name):
+            return 0
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+                added = self.add_many((line for line in file if line.strip()), 'processed_file')
+        except FileNotFoundError:
+            print(f"Error: File {file_path} not found.")
+            return 0
+        self.set_meta(meta_name, time.time())
+        print(f"Imported {added} names from {file_path} into the library index")
+        return added
+
+    def rescan_directory(self, folder_path):
+        # A folder's mtime only changes when entries are added, removed or renamed,
+        # so the (possibly network mounted) listing is only read when something changed
+        try:
+            mtime = os.stat(folder_path).st_mtime
+        except FileNotFoundError:
+            print(f"The folder at {folder_path} does not exist.")
+            return 0
+        meta_name = f'scan_mtime:{os.path.abspath(folder_path)}'
+        if self.get_meta(meta_name) == repr(mtime):
+            return 0
+        with os.scandir(folder_path) as entries:
+            added = self.add_many((entry.name for entry in entries), 'scan')
+        self.set_meta(meta_name, repr(mtime))
+        return added
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+
+# Stage timings and byte counters for a run.
+# Code wraps a stage in `with metrics.span('download'):` and adds bytes with
+# metrics.count('download_bytes', n). Nothing is recorded until start() is called,
+# a disabled span is one shared no-op object. When enabled every finished span is
+# appended to a JSON lines log, and close() writes a Prometheus textfile (for
+# node_exporter's textfile collector) and returns the end-of-run summary.
+
+enabled = False
+run_started = None
+stage_samples = {}
+counters = {}
+gauges = {}
+json_log = None
+json_buffer = []
+textfile_path = None
+lock = threading.Lock()
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_span(self.name, time.perf_counter() - self.started, self.labels, exc_type is None)
+        return False
+
+
+def span(name, **labels):
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, labels)
+
+
+def record_span(name, seconds, labels=None, ok=True):
+    with lock:
+        stage_samples.setdefault(name, []).append(seconds)
+        if json_log is not None:
+            event = {'time': round(time.time(), 3), 'span': name, 'seconds': round(seconds, 6), 'ok': ok}
+            if labels:
+                event.update(labels)
+            json_buffer.append(json.dumps(event, ensure_ascii=False))
+            if len(json_buffer) >= 100:
+                flush_json()
+
+
+def count(name, value=1):
+    if not enabled:
+        return
+    with lock:
+        counters[name] = counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    if not enabled:
+        return
+    with lock:
+        gauges[name] = value
+
+
+def flush_json():
+    # Called with the lock held
+    global json_buffer
+    if json_log is None or not json_buffer:
+        return
+    with open(json_log, 'a', encoding='utf-8') as file:
+        file.write('\n'.join(json_buffer) + '\n')
+    json_buffer = []
+
+
+def start(json_log_path=None, prometheus_path=None):
+    global enabled, run_started, json_log, textfile_path
+    with lock:
+        stage_samples.clear()
+        counters.clear()
+        gauges.clear()
+        json_buffer.clear()
+        json_log = json_log_path
+        textfile_path = prometheus_path
+        run_started = time.time()
+        enabled = True
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summary():
+    with lock:
+        stages = {name: list(samples) for name, samples in stage_samples.items()}
+        totals = dict(counters)
+    rows = []
+    for name, samples in stages.items():
+        rows.append((name, len(samples), sum(samples), percentile(samples, 0.5), percentile(samples, 0.95), max(samples)))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows, totals
+
+
+def format_bytes(value):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1000:
+            return f'{value:.0f} {unit}'
+        value /= 1000
+    return f'{value:.1f} TB'
+
+
+def format_summary():
+    rows, totals = summary()
+    elapsed = time.time() - run_started if run_started else 0
+    lines = [f"run time {elapsed:.0f}s", f"{'stage':<16}{'calls':>7}{'total s':>10}{'p50 s':>9}{'p95 s':>9}{'max s':>9}"]
+    for name, calls, total, p50, p95, longest in rows:
+        lines.append(f"{name:<16}{calls:>7}{total:>10.1f}{p50:>9.2f}{p95:>9.2f}{longest:>9.2f}")
+    with lock:
+        gauge_values = dict(gauges)
+    width = max([16] + [len(name) + 1 for name in list(totals) + list(gauge_values)])
+    for name, value in sorted(totals.items()) + sorted(gauge_values.items()):
+        lines.append(f"{name:<{width}}{format_value(name, value):>17}")
+    return '\n'.join(lines)
+
+
+def format_value(name, value):
+    if name.endswith('bytes'):
+        return format_bytes(value)
+    return f'{value:.1f}' if isinstance(value, float) else value
+
+
+def prometheus_text():
+    rows, totals = summary()
+    with lock:
+        gauge_values = dict(gauges)
+    lines = ['# HELP nugs_vid_dl_stage_seconds Time spent in each stage of the last run.',
+             '# TYPE nugs_vid_dl_stage_seconds summary']
+    for name, calls, total, p50, p95, longest in rows:
+        lines.append(f'nugs_vid_dl_stage_seconds{{stage="{name}",quantile="0.5"}} {p50:.6f}')
+        lines.append(f'nugs_vid_dl_stage_seconds{{stage="{name}",quantile="0.95"}} {p95:.6f}')
+        lines.append(f'nugs_vid_dl_stage_seconds_sum{{stage="{name}"}} {total:.6f}')
+        lines.append(f'nugs_vid_dl_stage_seconds_count{{stage="{name}"}} {calls}')
+    lines += ['# HELP nugs_vid_dl_total Counters of the last run (bytes, releases, ...).',
+              '# TYPE nugs_vid_dl_total counter']
+    for name, value in sorted(totals.items()):
+        lines.append(f'nugs_vid_dl_total{{name="{name}"}} {value}')
+    if gauge_values:
+        lines += ['# TYPE nugs_vid_dl_gauge gauge']
+        for name, value in sorted(gauge_values.items()):
+            lines.append(f'nugs_vid_dl_gauge{{name="{name}"}} {value}')
+    lines += ['# TYPE nugs_vid_dl_last_run_seconds gauge',
+              f'nugs_vid_dl_last_run_seconds {time.time() - (run_started or time.time()):.3f}',
+              '# TYPE nugs_vid_dl_last_run_timestamp_seconds gauge',
+              f'nugs_vid_dl_last_run_timestamp_seconds {time.time():.0f}']
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    # Written under a temporary name so the collector never reads half a file
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        file.write(prometheus_text())
+    os.replace(temp_path, path)
+
+
+def flush():
+    # Writes out what was recorded so far, for runs that don't end (--watch)
+    if not enabled:
+        return
+    with lock:
+        flush_json()
+    if textfile_path:
+        write_prometheus(textfile_path)
+
+
+def close():
+    # Flushes the JSON log, writes the textfile and returns the summary table (None when disabled)
+    global enabled
+    if not enabled:
+        return None
+    with lock:
+        flush_json()
+    if textfile_path:
+        write_prometheus(textfile_path)
+    table = format_summary()
+    enabled = False
+    return table
@@ -0,0 +1,128 @@
+import re
+from datetime import datetime
+from rate_limit import retry_after_seconds
+
+# Browser-free access to the catalog data play.nugs.net loads itself.
+# The web app (and nugs-downloader) read release metadata from the stream API,
+# so a pooled keep-alive session can replace a full headless Chrome page load.
+
+DEFAULT_API_BASE = 'https://streamapi.nugs.net/'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+release_url_pattern = re.compile(r'/(release|exclusive)/(\d+)')
+artist_url_pattern = re.compile(r'/artist/(\d+)')
+performance_date_formats = ['%m/%d/%Y', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%b %d, %Y']
+
+
+class NugsApiError(Exception):
+    pass
+
+
+class NugsApiClient:
+    def __init__(self, api_base=DEFAULT_API_BASE, pool_size=4, timeout=20, limiter=None):
+        self.api_base = api_base if api_base.endswith('/') else api_base + '/'
+        self.timeout = timeout
+        # Optional rate_limit.TokenBucket every request waits on
+        self.limiter = limiter
+        # requests is only imported once a client is made, parsing helpers don't need it
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.request_error = requests.RequestException
+        self.session = requests.Session()
+        # One keep-alive connection pool shared by every request in the run
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'User-Agent': USER_AGENT, 'Referer': 'https://play.nugs.net/'})
+
+    def call(self, method, **params):
+        params['method'] = method
+        try:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            response = self.session.get(self.api_base + 'api.aspx', params=params, timeout=self.timeout)
+            if response.status_code == 429 and self.limiter is not None:
+                self.limiter.pause(retry_after_seconds(response.headers.get('Retry-After')))
+            response.raise_for_status()
+            data = response.json()
+        except (self.request_error, ValueError) as e:
+            raise NugsApiError(f'{method} failed: {e}') from e
+        if not isinstance(data, dict) or not data.get('Response'):
+            raise NugsApiError(f'{method} returned no data')
+        return data['Response']
+
+    def get_container(self, container_id):
+        return self.call('catalog.container', containerID=container_id, vdisp=1)
+
+    def list_artist_containers(self, artist_id, page_size=100):
+        # Yields every video container id of an artist, newest first, one API page at a time
+        offset = 1
+        while True:
+            response = self.call('catalog.containersAll', artistList=artist_id, availType=1, vdisp=1,
+                                 startOffset=offset, limit=page_size)
+            containers = response.get('containers') or []
+            for container in containers:
+                if container.get('containerID'):
+                    yield str(container['containerID'])
+            if len(containers) < page_size:
+                return
+            offset += page_size
+
+    def close(self):
+        self.session.close()
+
+
+def parse_release_url(url):
+    # Returns ('release' | 'exclusive', id) for a release or exclusive link, otherwise None
+    match = release_url_pattern.search(url)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def parse_artist_url(url):
+    match = artist_url_pattern.search(url)
+    return match.group(1) if match else None
+
+
+def container_venue(container):
+    parts = [container.get('venueName'), container.get('venueCity'), container.get('venueState')]
+    parts = [part.strip() for part in parts if part and part.strip()]
+    if parts:
+        return ', '.join(parts)
+    return (container.get('venue') or '').strip() or "Unknown Venue_Location"
+
+
+def container_date(container):
+    date_str = (container.get('performanceDate') or container.get('performanceDateFormatted') or '').strip()
+    for date_format in performance_date_formats:
+        try:
+            return datetime.strptime(date_str, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return "Unknown Date"
+
+
+def container_sets(container):
+    # Groups the container's tracks into [(set name, [song, ...]), ...] in play order,
+    # named the way the release page heads them (Set 1, Set 2, ..., Encore)
+    tracks = [track for track in container.get('tracks') or [] if (track.get('songTitle') or '').strip()]
+    set_numbers = [track.get('setNum') or 1 for track in tracks]
+    # The API numbers the encore as one more set, the page calls a set after the second
+    # one the encore unless the track says otherwise
+    encore_set = max(set_numbers) if set_numbers and max(set_numbers) >= 3 else None
+    sets = []
+    for track, set_num in zip(tracks, set_numbers):
+        if track.get('isEncore') or 'encore' in str(track.get('setName') or '').lower() or set_num == encore_set:
+            set_name = "Encore"
+        else:
+            set_name = f"Set {set_num}"
+        if not sets or sets[-1][0] != set_name:
+            sets.append((set_name, []))
+        sets[-1][1].append(track['songTitle'].strip())
+    return sets
+
+
+def container_cover_url(container):
+    image = container.get('img') or {}
+    url = image.get('url') if isinstance(image, dict) else None
+    if not url:
+        return None
+    return url if url.startswith('http') else 'https://secure.livedownloads.com' + url
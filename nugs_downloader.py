@@ -0,0 +1,191 @@
+import os
+import queue
+import re
+import shlex
+import subprocess
+import threading
+import time
+
+# Runs the nugs-downloader executable without blocking on its pipes.
+# stdout and stderr are read by their own threads so neither pipe can fill up and
+# stall the download, and every line is turned into a DownloadEvent for the caller.
+
+percent_pattern = re.compile(r'(\d{1,3}(?:\.\d+)?)\s*%')
+size_units = {'b': 1, 'kb': 1000, 'mb': 1000 ** 2, 'gb': 1000 ** 3, 'tb': 1000 ** 4,
+              'kib': 1024, 'mib': 1024 ** 2, 'gib': 1024 ** 3, 'tib': 1024 ** 4}
+size = r'(\d+(?:\.\d+)?)\s*([kKMGT]?i?B)\b'
+transferred_pattern = re.compile(size + r'\s*(?:/|of)\s*' + size)
+speed_pattern = re.compile(size + r'\s*/\s*s\b')
+eta_pattern = re.compile(r'ETA[:\s]+(?:(\d+):)?(\d{1,2}):(\d{2})', re.IGNORECASE)
+error_pattern = re.compile(r'\b(error|failed|panic)\b', re.IGNORECASE)
+# Only anchored forms of 429, a progress line like "429.5 MB / 4.2 GB" must not match
+throttled_pattern = re.compile(r'\b(?:http|status(?: code)?)[\s:/=]*429\b|too many requests|rate.?limit', re.IGNORECASE)
+
+
+class DownloadEvent:
+    # kind is one of: progress, output, error, stalled, timeout, cancelled, exit
+    def __init__(self, kind, line='', stream=None, percent=None, bytes_done=None, bytes_total=None,
+                 speed=None, eta=None, returncode=None):
+        self.kind = kind
+        self.line = line
+        self.stream = stream
+        self.percent = percent
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.speed = speed
+        self.eta = eta
+        self.returncode = returncode
+        self.time = time.time()
+
+    def __repr__(self):
+        fields = ', '.join(f'{key}={value!r}' for key, value in vars(self).items() if value not in (None, '') and key != 'time')
+        return f'DownloadEvent({fields})'
+
+
+class DownloadResult:
+    def __init__(self):
+        self.returncode = None
+        self.timed_out = False
+        self.stalled = False
+        self.cancelled = False
+        self.throttled = False
+        self.errors = []
+        self.last_percent = None
+        self.last_bytes = None
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.timed_out and not self.stalled and not self.cancelled
+
+
+def parse_size(number, unit):
+    return int(float(number) * size_units.get(unit.lower(), 1))
+
+
+def is_throttled(event):
+    # Errors and stderr output only, progress lines carry byte counts
+    if event.kind != 'error' and (event.stream != 'stderr' or event.kind == 'progress'):
+        return False
+    return bool(throttled_pattern.search(event.line))
+
+
+def parse_output_line(line, stream='stdout'):
+    # Turns one line of downloader output into a progress, error or plain output event
+    line = line.strip()
+    if error_pattern.search(line):
+        return DownloadEvent('error', line, stream)
+    percent_match = percent_pattern.search(line)
+    transferred_match = transferred_pattern.search(line)
+    if percent_match or transferred_match:
+        event = DownloadEvent('progress', line, stream)
+        if percent_match:
+            event.percent = float(percent_match.group(1))
+        if transferred_match:
+            event.bytes_done = parse_size(*transferred_match.group(1, 2))
+            event.bytes_total = parse_size(*transferred_match.group(3, 4))
+            if event.percent is None and event.bytes_total:
+                event.percent = round(100.0 * event.bytes_done / event.bytes_total, 1)
+        speed_match = speed_pattern.search(line)
+        if speed_match:
+            event.speed = parse_size(*speed_match.group(1, 2))
+        eta_match = eta_pattern.search(line)
+        if eta_match:
+            hours, minutes, seconds = eta_match.groups()
+            event.eta = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+        elif event.speed and event.bytes_total and event.bytes_done is not None:
+            event.eta = int((event.bytes_total - event.bytes_done) / event.speed)
+        return event
+    return DownloadEvent('output', line, stream)
+
+
+def split_command(command, windows=os.name == 'nt'):
+    # A command line from the config ini. On Windows backslashes in paths are kept, so it is
+    # split without posix rules, and the quotes around a token such as
+    # "C:\Program Files\Python311\python.exe" are taken off
+    if not windows:
+        return shlex.split(command)
+    return [arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in '"\'' else arg
+            for arg in shlex.split(command, posix=False)]
+
+
+def build_command(command, cwd, output_path, link):
+    # command comes from the config ini, e.g. "main.exe" or "python fake_downloader.py"
+    args = split_command(command)
+    program = os.path.join(cwd, args[0])
+    if os.path.exists(program):
+        args[0] = os.path.abspath(program)
+    return args + ['-o', output_path, link]
+
+
+def read_stream(stream, name, lines):
+    # Universal newlines also split on the \r the downloader uses to redraw its progress line
+    for line in stream:
+        if line.strip():
+            lines.put((name, line))
+    lines.put((name, None))
+
+
+def run_downloader(args, cwd=None, on_event=None, timeout=None, stall_timeout=None, cancel=None):
+    # Runs the downloader, calling on_event(DownloadEvent) for every line of output.
+    # The process is killed if it runs longer than timeout seconds, if stall_timeout
+    # seconds pass without any new progress, or once the cancel event is set.
+    result = DownloadResult()
+    on_event = on_event or (lambda event: None)
+    lines = queue.Queue()
+    proc = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            encoding='utf-8', errors='replace')
+    readers = [threading.Thread(target=read_stream, args=(proc.stdout, 'stdout', lines), daemon=True),
+               threading.Thread(target=read_stream, args=(proc.stderr, 'stderr', lines), daemon=True)]
+    for reader in readers:
+        reader.start()
+    started = last_progress = time.monotonic()
+    open_streams = len(readers)
+    try:
+        while open_streams:
+            try:
+                name, line = lines.get(timeout=1)
+            except queue.Empty:
+                name, line = None, None
+            else:
+                if line is None:
+                    open_streams -= 1
+                    continue
+                event = parse_output_line(line, name)
+                if is_throttled(event):
+                    result.throttled = True
+                if event.kind == 'progress':
+                    if (event.percent is not None and event.percent != result.last_percent) or \
+                            (event.bytes_done is not None and event.bytes_done != result.last_bytes):
+                        last_progress = time.monotonic()
+                    if event.percent is not None:
+                        result.last_percent = event.percent
+                    if event.bytes_done is not None:
+                        result.last_bytes = event.bytes_done
+                elif event.kind == 'error':
+                    # Only the most recent errors are kept for the report
+                    result.errors = result.errors[-19:] + [event.line]
+                on_event(event)
+            now = time.monotonic()
+            if timeout and now - started > timeout:
+                result.timed_out = True
+                on_event(DownloadEvent('timeout', f'no result after {int(now - started)}s, killing downloader'))
+                break
+            if stall_timeout and now - last_progress > stall_timeout:
+                result.stalled = True
+                on_event(DownloadEvent('stalled', f'no progress for {int(now - last_progress)}s, killing downloader'))
+                break
+            if cancel is not None and cancel.is_set():
+                result.cancelled = True
+                on_event(DownloadEvent('cancelled', 'stopping, killing downloader'))
+                break
+    finally:
+        # Still reading means we gave up on it (timeout, stall or an interrupt)
+        if proc.poll() is None and open_streams:
+            proc.kill()
+        result.returncode = proc.wait()
+        for reader in readers:
+            reader.join(timeout=5)
+        proc.stdout.close()
+        proc.stderr.close()
+    on_event(DownloadEvent('exit', returncode=result.returncode))
+    return result
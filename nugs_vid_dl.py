@@ -1,22 +1,39 @@
 import argparse
+import concurrent.futures
 import configparser
+import contextlib
+import hashlib
+import importlib.util
 import json
 import os
+import queue
+import random
 import re
 import shutil
+import signal
+import socket
 import subprocess
 import tempfile
-from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.common.exceptions import (TimeoutException)
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support import expected_conditions as EC
+import threading
+import sys
+import time
 from urllib.parse import urlparse
+import nugs_api
+import metrics
+import nugs_downloader
+import release_names
+from download_journal import DownloadJournal
+from snapshot_store import SnapshotStore
+from catalog_export import CatalogWriter, export_catalog, iter_catalog
+from library_index import LibraryIndex
+from job_queue import FileLock, SharedJobQueue
+from storage_pool import GB, StoragePool, expected_size_bytes
+from rate_limit import DownloadConcurrency, TokenBucket
+# bs4 is imported when a page is first parsed, lxml is used when installed
+html_parser = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+# selenium is only imported by load_selenium(), the subcommands that don't open a browser never pay for it
+webdriver = WebDriverWait = Options = Service = By = EC = None
+TimeoutException = WebDriverException = StaleElementReferenceException = None
 global driver_vis
 global driver
 global headless_driver
@@ -28,13 +45,134 @@ data_directory = None
 audio_directory = None
 folder_name = None
 folder_names_set = set()
-extracted_info = []
+catalog_writer = None
+catalog_records = {}
+catalog_lock = threading.Lock()
 driver = None
 use_headless_driver = True
-date_pattern = re.compile(r'\b\w+\s\d{1,2},\s\d{4}\b')
+download_pipeline = None
+download_workers = 2
+job_queue_size = 8
+downloader_command = 'main.exe'
+ffmpeg_command = ''
+# In the shared data directory in cluster mode, where several hosts append to it under the
+# lock file next to it. Both are set by load_config
+processed_filenames_path = 'processed_filenames.txt'
+processed_filenames_lock = FileLock('processed_filenames.txt.lock')
+download_event_hooks = []
+download_timeout_minutes = 0
+remux_workers = 1
+scratch_directory = os.path.join(tempfile.gettempdir(), 'nugs_vid_dl')
+finalize_pool = None
+download_journal = None
+image_cache = None
+snapshot_store = None
+image_cache_size_mb = 500
+image_workers = 4
+stall_timeout_minutes = 10
+catalog_backend = 'selenium'
+api_base = nugs_api.DEFAULT_API_BASE
+api_client = None
+library_index = None
+session_max_age_hours = 12
+crawl_stop_after_known = 5
+crawl_max_load_more = 200
+crawl_mark_size = 50
+metrics_enabled = False
+metrics_textfile = ''
+watch_interval_minutes = 30
+watch_jitter = 0.2
+watch_max_backoff_minutes = 240
+# Set by the first SIGINT/SIGTERM: stop crawling, let running downloads finish.
+# The second one also stops the running downloads, the journal resumes them next run
+shutdown_event = threading.Event()
+cancel_event = threading.Event()
+browser_lean = True
+browser_profile_directory = ''
+shared_queue_enabled = False
+shared_queue_directory = ''
+lease_minutes = 10
+shared_queue = None
+storage_volumes = []
+storage_placement = 'free_space'
+expected_size_gb = 0
+min_free_gb = 1
+video_format = 5
+storage_pool = None
+# job_id -> [(volume, bytes)] reserved in storage_pool until the job is done or fails
+storage_reservations = {}
+ffprobe_command = ''
+audio_extract = False
+audio_workers = 1
+audio_extension = 'mka'
+audio_pool = None
+verify_enabled = True
+checksum_algorithm = 'sha256'
+verify_min_duration_minutes = 0
+verify_requeue = True
+verify_min_setlist_ratio = 0.9
+verify_max_attempts = 3
+# None until the first verify tries to start ffprobe, then whether it could not run
+ffprobe_unavailable = None
+# Jobs downloaded again this run after failing verification, only retried once per run
+requeued_jobs = set()
+# Remuxes not finished yet, the download workers are kept until these are done since a
+# video failing verification queues its download again
+finalize_futures = set()
+navigations_per_minute = 30
+requests_per_second = 5
+downloads_per_hour = 0
+adaptive_downloads = True
+min_download_workers = 1
+max_download_workers = 4
+max_download_error_rate = 0.2
+# Unlimited until load_config reads [rate_limit]
+navigation_bucket = TokenBucket('navigations', 0)
+request_bucket = TokenBucket('requests', 0)
+download_bucket = TokenBucket('downloads', 0)
+download_concurrency = None
+# What a lean browser never requests: video, web fonts and trackers (images are off through prefs)
+lean_blocked_urls = ['*.mp4', '*.m4v', '*.webm', '*.m3u8', '*.woff', '*.woff2', '*.ttf', '*.otf',
+                     '*googletagmanager.com*', '*google-analytics.com*', '*doubleclick.net*', '*facebook.net*',
+                     '*hotjar.com*', '*segment.io*', '*nr-data.net*', '*newrelic.com*']
 
-def load_credentials():
-    global nugs_email, nugs_password, data_directory, video_directory, audio_directory
+def load_selenium():
+    global webdriver, WebDriverWait, Options, Service, By, EC
+    global TimeoutException, WebDriverException, StaleElementReferenceException
+    if webdriver is not None:
+        return
+    from selenium import webdriver as selenium_webdriver
+    from selenium.common import exceptions
+    from selenium.webdriver.support.ui import WebDriverWait as selenium_wait
+    from selenium.webdriver.chrome.options import Options as chrome_options
+    from selenium.webdriver.common.by import By as selenium_by
+    from selenium.webdriver.chrome.service import Service as chrome_service
+    from selenium.webdriver.support import expected_conditions
+    WebDriverWait, Options, Service, By, EC = selenium_wait, chrome_options, chrome_service, selenium_by, expected_conditions
+    TimeoutException = exceptions.TimeoutException
+    WebDriverException = exceptions.WebDriverException
+    StaleElementReferenceException = exceptions.StaleElementReferenceException
+    webdriver = selenium_webdriver
+
+def make_soup(html):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, html_parser)
+
+def load_config(quiet=False):
+    # Paths and settings from the config ini, everything but the nugs login
+    global data_directory, video_directory, audio_directory
+    global download_workers, job_queue_size, downloader_command, ffmpeg_command, catalog_backend, api_base, session_max_age_hours
+    global crawl_stop_after_known, crawl_max_load_more, download_timeout_minutes, stall_timeout_minutes
+    global remux_workers, scratch_directory, image_cache_size_mb, image_workers, metrics_enabled, metrics_textfile
+    global browser_lean, browser_profile_directory, watch_interval_minutes, watch_jitter, watch_max_backoff_minutes
+    global shared_queue_enabled, shared_queue_directory, lease_minutes, processed_filenames_path, processed_filenames_lock
+    global storage_volumes, storage_placement, expected_size_gb, min_free_gb, video_format
+    global ffprobe_command, audio_extract, audio_workers, audio_extension
+    global verify_enabled, checksum_algorithm, verify_min_duration_minutes, verify_requeue, verify_min_setlist_ratio
+    global verify_max_attempts
+    global navigations_per_minute, requests_per_second, downloads_per_hour, adaptive_downloads
+    global min_download_workers, max_download_workers, max_download_error_rate
+    global navigation_bucket, request_bucket, download_bucket
     config = configparser.ConfigParser()
     config.read('nugs_vid_dl_config.ini')
     
@@ -47,14 +185,114 @@ def load_credentials():
     video_directory = get_valid_path(custom_paths['video_directory'], local_paths['video'])
     audio_directory = get_valid_path(custom_paths['audio_directory'], local_paths['audio'])
     
-    print("\nData Directory:", data_directory)
-    print("Video Directory:", video_directory)
-    print("Audio Directory:", audio_directory)
-    
+    if not quiet:
+        print("\nData Directory:", data_directory)
+        print("Video Directory:", video_directory)
+        print("Audio Directory:", audio_directory)
+
+    # Pipeline settings, older config files may not have this section
+    download_workers = max(1, config.getint('pipeline', 'download_workers', fallback=download_workers))
+    job_queue_size = max(1, config.getint('pipeline', 'job_queue_size', fallback=job_queue_size))
+    downloader_command = config.get('pipeline', 'downloader_command', fallback=downloader_command) or 'main.exe'
+    # Blank runs binaries/ffmpeg
+    ffmpeg_command = config.get('pipeline', 'ffmpeg_command', fallback=ffmpeg_command).strip()
+    ffprobe_command = config.get('pipeline', 'ffprobe_command', fallback=ffprobe_command).strip()
+    # 0 disables the limit
+    download_timeout_minutes = max(0.0, config.getfloat('pipeline', 'download_timeout_minutes', fallback=download_timeout_minutes))
+    stall_timeout_minutes = max(0.0, config.getfloat('pipeline', 'stall_timeout_minutes', fallback=stall_timeout_minutes))
+    remux_workers = max(1, config.getint('pipeline', 'remux_workers', fallback=remux_workers))
+    # Local disk the downloads are staged on before the remux writes them to the video directory
+    scratch_directory = config.get('pipeline', 'scratch_directory', fallback='').strip() or scratch_directory
+    if not quiet:
+        print(f"Download Workers: {download_workers} (queue size {job_queue_size}), remux workers: {remux_workers}")
+        print("Scratch Directory:", scratch_directory)
+
+    # Where release metadata comes from: 'selenium' (headless Chrome) or 'http' (stream API)
+    catalog_backend = config.get('catalog', 'backend', fallback=catalog_backend).strip().lower() or 'selenium'
+    api_base = config.get('catalog', 'api_base', fallback=api_base).strip() or nugs_api.DEFAULT_API_BASE
+
+    # How long saved login cookies without their own expiry are trusted
+    session_max_age_hours = config.getfloat('session', 'max_age_hours', fallback=session_max_age_hours)
+
+    # Cover art cache in the data directory
+    image_cache_size_mb = max(0, config.getint('images', 'cache_size_mb', fallback=image_cache_size_mb))
+    image_workers = max(1, config.getint('images', 'workers', fallback=image_workers))
+
+    # Incremental crawl: stop a listing after this many already seen releases in a row
+    crawl_stop_after_known = max(1, config.getint('crawl', 'stop_after_known', fallback=crawl_stop_after_known))
+    crawl_max_load_more = max(0, config.getint('crawl', 'max_load_more', fallback=crawl_max_load_more))
+
+    # Stage timings, metrics.jsonl and a Prometheus textfile (blank = nugs_vid_dl.prom in the data directory)
+    metrics_enabled = config.getboolean('metrics', 'enabled', fallback=metrics_enabled)
+    metrics_textfile = config.get('metrics', 'textfile', fallback=metrics_textfile).strip()
+
+    # --watch: minutes between polls, +/- this fraction of jitter, and the longest wait after failed polls
+    watch_interval_minutes = max(1.0, config.getfloat('watch', 'interval_minutes', fallback=watch_interval_minutes))
+    watch_jitter = min(0.9, max(0.0, config.getfloat('watch', 'jitter', fallback=watch_jitter)))
+    watch_max_backoff_minutes = max(watch_interval_minutes, config.getfloat('watch', 'max_backoff_minutes', fallback=watch_max_backoff_minutes))
+
+    # Lean Chrome: eager page loads, no images, video, fonts or trackers, one reused profile
+    browser_lean = config.getboolean('browser', 'lean', fallback=browser_lean)
+    browser_profile_directory = config.get('browser', 'profile_directory', fallback='').strip() or os.path.join(os.getcwd(), 'chrome_profile')
+
+    # Several hosts sharing the data directory split the downloads through a job queue in it
+    shared_queue_enabled = config.getboolean('cluster', 'shared_queue', fallback=shared_queue_enabled)
+    shared_queue_directory = config.get('cluster', 'queue_directory', fallback='').strip() or os.path.join(data_directory, 'job_queue')
+    lease_minutes = max(1.0, config.getfloat('cluster', 'lease_minutes', fallback=lease_minutes))
+    processed_filenames_path = os.path.join(data_directory, 'processed_filenames.txt') if shared_queue_enabled else 'processed_filenames.txt'
+    processed_filenames_lock = FileLock(processed_filenames_path + '.lock')
+
+    # Output volumes (comma or line separated, blank = just the video directory), filled by
+    # free_space or round_robin, with room for expected_size_gb (blank = by videoFormat) kept free first
+    volumes = config.get('storage', 'volumes', fallback='').replace('\n', ',').split(',')
+    storage_volumes = [volume.strip() for volume in volumes if volume.strip()] or [video_directory]
+    storage_placement = config.get('storage', 'placement', fallback=storage_placement).strip().lower() or 'free_space'
+    if storage_placement not in ('free_space', 'round_robin'):
+        print(f"Unknown placement '{storage_placement}' in [storage], using free_space")
+        storage_placement = 'free_space'
+    expected_size_gb = max(0.0, float(config.get('storage', 'expected_size_gb', fallback='').strip() or 0))
+    min_free_gb = max(0.0, config.getfloat('storage', 'min_free_gb', fallback=min_free_gb))
+    video_format = config.getint('nugsDownloader', 'videoFormat', fallback=video_format)
+    if not quiet and storage_volumes != [video_directory]:
+        print(f"Storage Volumes ({storage_placement}):", ', '.join(storage_volumes))
+
+    # Stream copy the audio of every finished download into the audio directory, one file per song
+    audio_extract = config.getboolean('audio', 'extract', fallback=audio_extract)
+    audio_workers = max(1, config.getint('audio', 'workers', fallback=audio_workers))
+    audio_extension = config.get('audio', 'extension', fallback=audio_extension).strip().lstrip('.') or 'mka'
+
+    # Checksum finished videos as they are moved into the library and check them with ffprobe,
+    # a video that fails is downloaded again (right away when requeue is on, else next run)
+    verify_enabled = config.getboolean('verify', 'enabled', fallback=verify_enabled)
+    checksum_algorithm = config.get('verify', 'checksum', fallback=checksum_algorithm).strip().lower()
+    if checksum_algorithm and checksum_algorithm not in hashlib.algorithms_available:
+        print(f"Unknown checksum '{checksum_algorithm}' in [verify], using sha256")
+        checksum_algorithm = 'sha256'
+    verify_min_duration_minutes = max(0.0, config.getfloat('verify', 'min_duration_minutes', fallback=verify_min_duration_minutes))
+    verify_min_setlist_ratio = max(0.0, config.getfloat('verify', 'min_setlist_ratio', fallback=verify_min_setlist_ratio))
+    verify_requeue = config.getboolean('verify', 'requeue', fallback=verify_requeue)
+    verify_max_attempts = max(1, config.getint('verify', 'max_attempts', fallback=verify_max_attempts))
+
+    # Budgets for the traffic sent to nugs (0 = unlimited), and download_workers moved
+    # between min and max download workers by the measured throughput when adaptive
+    navigations_per_minute = max(0.0, config.getfloat('rate_limit', 'navigations_per_minute', fallback=navigations_per_minute))
+    requests_per_second = max(0.0, config.getfloat('rate_limit', 'requests_per_second', fallback=requests_per_second))
+    downloads_per_hour = max(0.0, config.getfloat('rate_limit', 'downloads_per_hour', fallback=downloads_per_hour))
+    adaptive_downloads = config.getboolean('rate_limit', 'adaptive', fallback=adaptive_downloads)
+    min_download_workers = max(1, config.getint('rate_limit', 'min_download_workers', fallback=min_download_workers))
+    max_download_workers = max(download_workers, config.getint('rate_limit', 'max_download_workers', fallback=max_download_workers))
+    max_download_error_rate = config.getfloat('rate_limit', 'max_error_rate', fallback=max_download_error_rate)
+    navigation_bucket = TokenBucket('navigations', navigations_per_minute / 60, burst=3)
+    request_bucket = TokenBucket('requests', requests_per_second, burst=max(1.0, requests_per_second))
+    download_bucket = TokenBucket('downloads', downloads_per_hour / 3600, burst=1)
+    return config
+
+def load_credentials():
+    global nugs_email, nugs_password
+    config = load_config()
     # Load email and password from configuration
     nugs_email = config['nugsDownloader']['email']
     nugs_password = config['nugsDownloader']['password']
-    
     # Update JSON configuration
     update_json_config(config['nugsDownloader'])
     return nugs_email, nugs_password,video_directory
@@ -80,6 +318,7 @@ def update_json_config(nugs_config):
         return
     with open(config_file_path, 'r') as config_file:
         config_json = json.load(config_file)
+    original_json = dict(config_json)
     # Define a mapping for the keys from ini to json
     key_mapping = {
         'email': 'email',
@@ -100,60 +339,101 @@ def update_json_config(nugs_config):
                 config_json[json_key] = value.lower() in ['true', '1', 't', 'y', 'yes']
             else:
                 config_json[json_key] = value
+    # Only rewritten when a value changed, the file is usually already up to date
+    if config_json == original_json:
+        return
     # Write the updated config back to config.json
     with open(config_file_path, 'w') as config_file:
         json.dump(config_json, config_file, indent=4)
     print("\nnugs-downloader-config.json updated successfully.")
 
 def process_filename(file_name):
-    pattern = re.compile(r"(.*?)(\d{4}-\d{2}-\d{2})")
-    match = pattern.match(file_name)
-    if match:
-        # Extract band name and date
-        band_name = match.group(1).strip()
-        date = match.group(2).strip()
-        return f"{band_name} {date}"
-    else:
-        return None
+    # "artist date" dedupe key, or None when the name has no date
+    return release_names.dedupe_key(file_name)
 
-def initialize_folder_names_set(folder_path):
-    folder_names_set = set()
-    try:
-        files = os.listdir(folder_path)
-        for file_name in files:
-            simplified_name = process_filename(file_name)
-            if simplified_name:
-                folder_names_set.add(simplified_name)
-    except FileNotFoundError:
-        print(f"The folder at {folder_path} does not exist.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    return folder_names_set
+def open_library_index(volumes):
+    # Opens the dedupe index in the data directory, importing processed_filenames.txt the
+    # first time and picking up files added to any of the volumes since the last run
+    index = LibraryIndex(host_data_path('library_index.sqlite3'), process_filename,
+                         key_version=release_names.KEY_VERSION)
+    index.import_processed_file(processed_filenames_path)
+    rescan_volumes(index, volumes)
+    return index
 
-def process_filenames_from_file(file_path):
-    folder_names_set = set()
-    try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                simplified_name = process_filename(line.strip())
-                if simplified_name:
-                    folder_names_set.add(simplified_name)
-    except FileNotFoundError:
-        print(f"Error: File {file_path} not found.")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-    return folder_names_set
+def rescan_volumes(index, volumes):
+    for volume in volumes:
+        added = index.rescan_directory(volume)
+        if added:
+            print(f"Indexed {added} files from {volume}")
+
+listing_card_xpath = "//a[contains(@href, '/release/') or contains(@href, '/exclusive/')]"
 
 def click_load_more_button(driver):
+    card_xpath = listing_card_xpath
+    button_xpath = "//button[contains(., 'Load More')]"
+    # The button renders with the cards, so a listing without one has run out
+    if not driver.find_elements(By.XPATH, button_xpath):
+        print("no more 'Load More' button. parsing...\n")
+        return False
     try:
         # Locate the "Load More" button by its text and click it
-        load_more_button = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, "//button[contains(., 'Load More')]")))
+        load_more_button = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, button_xpath)))
+        cards_before = len(driver.find_elements(By.XPATH, card_xpath))
         load_more_button.click()
+        # Wait for the next batch of cards to render
+        WebDriverWait(driver, 10).until(lambda d: len(d.find_elements(By.XPATH, card_xpath)) > cards_before)
     except TimeoutException:
-        print("clicked 'Load More' button. parsing...\n")
+        print("no more 'Load More' button. parsing...\n")
         return False
     return True
 
+class IncrementalCrawl:
+    # Walks a listing newest first and stops once it reaches a run of release ids that were
+    # already seen: ids in the library index, or ids at the top of this listing last time
+    # (its high-water mark). full=True walks the whole listing.
+    def __init__(self, listing_url, full=False):
+        self.listing_url = listing_url
+        self.full = full
+        self.previous_mark = set(library_index.get_crawl_mark(listing_url)) if library_index is not None else set()
+        self.listed_ids = []
+        self.known_run = 0
+
+    def reached_known(self, kind, release_id):
+        release_key = f'{kind}/{release_id}'
+        self.listed_ids.append(release_key)
+        known = release_key in self.previous_mark or (library_index is not None and library_index.has_release(kind, release_id))
+        self.known_run = self.known_run + 1 if known else 0
+        if not self.full and self.known_run >= crawl_stop_after_known:
+            print(f"reached {self.known_run} already seen releases on {self.listing_url}, stopping crawl")
+            return True
+        return False
+
+    def save(self):
+        if library_index is not None and self.listed_ids:
+            library_index.set_crawl_mark(self.listing_url, self.listed_ids[:crawl_mark_size])
+
+def collect_listing_cards(driver, crawl):
+    # Keeps clicking "Load More" until the listing runs out or the crawl reaches known releases
+    cards = []
+    seen_hrefs = set()
+    parsed = 0
+    clicks = 0
+    while True:
+        # Load More appends to the listing, so only the cards after the last batch are read
+        for element in driver.find_elements(By.XPATH, f"({listing_card_xpath})[position() > {parsed}]"):
+            parsed += 1
+            href = element.get_attribute('href') or ''
+            release = nugs_api.parse_release_url(href)
+            if not release or href in seen_hrefs:
+                continue
+            seen_hrefs.add(href)
+            if crawl.reached_known(*release):
+                return cards
+            cards.append({'href': href})
+        if clicks >= crawl_max_load_more or not click_load_more_button(driver):
+            return cards
+        clicks += 1
+
 def scrape_release_info(driver, video_directory, combined_folder_names_set, args):
     try:
         url = driver.current_url
@@ -166,85 +446,165 @@ def scrape_release_info(driver, video_directory, combined_folder_names_set, args
 
             process_link(driver, url,exclusive_tag, video_directory, combined_folder_names_set, args)
         else:
-            # Extract relevant links from the page for further processing
-            page_source = driver.page_source
-            soup = BeautifulSoup(page_source, 'html.parser')
-            cards = soup.find_all(href=re.compile(r"/release/|/exclusive/\d+"))
+            # Extract relevant links from the page (and its "Load More" pages) for further processing
+            crawl = IncrementalCrawl(url, full=getattr(args, 'full', False))
+            with metrics.span('card_parse'):
+                cards = collect_listing_cards(driver, crawl)
+            print(f"found {len(cards)} releases to check on {url}")
             for card in cards:
+                if shutdown_event.is_set():
+                    # The crawl mark is not saved, so the next run checks these cards again
+                    return True
                 process_card(driver, card, video_directory, combined_folder_names_set, args)
+            crawl.save()
+        return True
     except Exception as e:
         print(f'Exception in scrap_release_info: {e}')
+        return False
+
+def scrape_release_info_http(page, video_directory, combined_folder_names_set, args):
+    # Serves release, exclusive and artist links straight from the stream API.
+    # Returns False for pages that still need the browser to find their cards (e.g. "recent" listings)
+    release = nugs_api.parse_release_url(page)
+    if release:
+        # Falls back to the browser when the API has no data for this release
+        return process_link(None, page, release[0] == 'exclusive', video_directory, combined_folder_names_set, args)
+    artist_id = nugs_api.parse_artist_url(page)
+    if not artist_id:
+        return False
+    processed = 0
+    crawl = IncrementalCrawl(page, full=getattr(args, 'full', False))
+    try:
+        # Only fetches further API pages until the crawl reaches releases it has already seen
+        for container_id in api_client.list_artist_containers(artist_id):
+            if crawl.reached_known('release', container_id) or shutdown_event.is_set():
+                break
+            processed += 1
+            if is_known_release('release', container_id):
+                continue
+            process_link(None, f'https://play.nugs.net/release/{container_id}', False, video_directory, combined_folder_names_set, args)
+    except nugs_api.NugsApiError as e:
+        print(f'Exception in scrape_release_info_http: {e}')
+        # Nothing listed yet, let the browser crawl the artist page instead
+        return processed > 0
+    crawl.save()
+    return True
+
+def is_known_release(kind, release_number):
+    # Release ids already matched to a show in the library, checked before opening the page
+    if library_index is not None and library_index.has_release(kind, release_number):
+        print(f"{kind} {release_number} is already in the library, skipping")
+        return True
+    if download_pipeline is not None and download_pipeline.is_queued(f"{kind}-{release_number}"):
+        # Taken earlier in this run (e.g. an earlier watch poll), no need to load its page again
+        print(f"{kind} {release_number} is already queued, skipping")
+        return True
+    return False
 
 def process_card(driver, card, video_directory, combined_folder_names_set, args):
     try:
         exclusive_tag = False
         if "/release/" in card['href']:
             release_number = card['href'].split('/')[-1]
+            if is_known_release('release', release_number):
+                return
             save_link = f'https://play.nugs.net/release/{release_number}'
             process_link(driver, save_link, exclusive_tag, video_directory, combined_folder_names_set, args)
         elif "/exclusive/" in card['href']:
             exclusive_tag = True
             release_number = card['href'].split('/')[-1]
+            if is_known_release('exclusive', release_number):
+                return
             save_link_exclusive = f'https://play.nugs.net/watch/livestreams/exclusive/{release_number}'
             process_link(driver, save_link_exclusive, exclusive_tag, video_directory, combined_folder_names_set, args)
     except Exception as e:
         print(f'Exception in process_card: {e}')
         
+class PageSnapshot:
+    # A single capture of a page: the raw HTML and one parsed tree shared by every extractor,
+    # so the DOM is serialized over the WebDriver wire and parsed only once per page
+    def __init__(self, html, url=None):
+        self.html = html
+        self.url = url
+        self.load_seconds = None
+        self._soup = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = make_soup(self.html)
+        return self._soup
+
+def capture_page_snapshot(driver):
+    return PageSnapshot(driver.page_source, driver.current_url)
+
+class ApiSnapshot:
+    # Release data read from the stream API instead of a rendered page
+    def __init__(self, container, url=None):
+        self.container = container
+        self.url = url
+        self.load_seconds = None
+        self.sets = nugs_api.container_sets(container)
+        self.cover_url = nugs_api.container_cover_url(container)
+
+def fetch_api_snapshot(url):
+    parsed = nugs_api.parse_release_url(url)
+    if not parsed:
+        raise nugs_api.NugsApiError(f'not a release link: {url}')
+    return ApiSnapshot(api_client.get_container(parsed[1]), url)
+
+def extract_api_info(snapshot, url):
+    container = snapshot.container
+    artist = (container.get('artistName') or '').strip() or "Unknown Artist"
+    venue_location = nugs_api.container_venue(container)
+    event_date = nugs_api.container_date(container)
+    if "/exclusive/" in url:
+        return format_exclusive_details(artist, venue_location, event_date), artist, release_names.clean_venue(venue_location), event_date
+    venue_location = release_names.clean_venue(venue_location)
+    return release_names.display_name(artist, event_date, venue_location), artist, venue_location, event_date
+
 def process_link(driver, url, exclusive_tag, video_directory, combined_folder_names_set, args):
+    if api_client is not None:
+        try:
+            started = time.monotonic()
+            with metrics.span('api_fetch', url=url):
+                snapshot = fetch_api_snapshot(url)
+            snapshot.load_seconds = time.monotonic() - started
+            details = extract_api_info(snapshot, url)
+            handle_additional_processing(snapshot, details, exclusive_tag, video_directory, combined_folder_names_set, args, url)
+            return True
+        except nugs_api.NugsApiError as e:
+            if driver is None:
+                print(f'Exception in process_link: {e}')
+                return False
+            print(f'{e}, falling back to the browser')
     try:
-        # Navigate to the link and extract the page source
-        driver.get(url)
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CLASS_NAME, "_cover_ex3y9_35")))
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, 'html.parser')
-
-        # Initialize 'details' variable
-        details = None
+        # Navigate to the link and capture the page once
+        started = time.monotonic()
+        wait_for_budget(navigation_bucket)
+        with metrics.span('page_load', url=url):
+            driver.get(url)
+            WebDriverWait(driver, 20).until(release_page_ready)
+            snapshot = capture_page_snapshot(driver)
+        snapshot.load_seconds = time.monotonic() - started
+        metrics.count('page_bytes', len(snapshot.html))
 
         # Extract and process information based on URL type
-        if "/exclusive/" in url:
-            formatted_details, artist, venue, event_date = extract_exclusive_info(soup)
-            details = (formatted_details, artist, venue, event_date)
-        else:  # Assuming it's a "/release/" URL
-            formatted_details, artist, venue, event_date = extract_release_info(soup)
-            details = (formatted_details, artist, venue, event_date)
+        with metrics.span('extract'):
+            details = extract_page_details(snapshot, url)
 
         # Additional processing, saving files, and downloading images
-        handle_additional_processing(driver, details, exclusive_tag, video_directory, combined_folder_names_set, args, url)
+        handle_additional_processing(snapshot, details, exclusive_tag, video_directory, combined_folder_names_set, args, url)
+        return True
     except Exception as e:
         print(f'Exception in process_link: {e}')
+        return False
 
-def extract_and_process_date(details):
-    # Extended pattern to match a wider range of date formats, including "MM DD YYYY"
-    date_patterns = [
-        r'\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},\s+\d{4}\b',
-        r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2},\s+\d{4}\b',
-        r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{1,2}\b',
-        r'\b\d{2}\s\d{2}\s\d{4}\b'  # Pattern for "MM DD YYYY"
-    ]
-    for pattern in date_patterns:
-        date_match = re.search(pattern, details)
-        if date_match:
-            date_str = date_match.group()
-            # Attempt to parse the date string
-            try:
-                date_obj = datetime.strptime(date_str, '%B %d, %Y')
-            except ValueError:
-                try:
-                    date_obj = datetime.strptime(date_str, '%b %d, %Y')
-                except ValueError:
-                    try:
-                        # Handle "MM DD YYYY" format
-                        date_obj = datetime.strptime(date_str, '%m %d %Y')
-                    except ValueError:
-                        # Handle case where year is missing
-                        date_obj = datetime.strptime(f"{date_str}, {datetime.now().year}", '%b %d, %Y')
-            formatted_date = date_obj.strftime('%Y-%m-%d')
-            new_details = re.sub(pattern, '', details).strip()
-            new_details = re.sub(r'\s*:\s*,', ':', new_details)
-            new_details = re.sub(r'\s*,\s*', ', ', new_details).strip(', ')
-            new_details = re.sub(r'\s*:\s*', ': ', new_details)
-    return formatted_date, new_details if new_details is not None else ''    
+def extract_page_details(snapshot, url):
+    if "/exclusive/" in url:
+        return extract_exclusive_info(snapshot.soup)
+    # Assuming it's a "/release/" URL
+    return extract_release_info(snapshot.soup)
 
 def extract_exclusive_info(soup):
     try:
@@ -256,46 +616,26 @@ def extract_exclusive_info(soup):
         
         time_tag = soup.find('time')
         if time_tag and time_tag.has_attr('datetime'):
-            # Extract and format the date
-            date_str = time_tag['datetime']
-            try:
-                event_date = datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%S.%fZ').strftime('%Y-%m-%d')
-            except ValueError:
-                event_date = 'Invalid Date'
+            # e.g. 2024-01-19T03:00:00.000Z
+            event_date = release_names.parse_date(time_tag['datetime']) or 'Invalid Date'
         else:
             event_date = 'Unknown Date'
     
         formatted_details = format_exclusive_details(artist, venue, event_date)
-        return formatted_details, artist, venue, event_date
+        # Without the "Premiere:" style prefix, as the API has it
+        return formatted_details, artist, release_names.clean_venue(venue), event_date
     except Exception as e:
         print(f'Error in extract_exclusive_info: {e}')
         return "Unknown Artist at Unknown Venue on Unknown Date", "Unknown Artist", "Unknown Venue", "Unknown Date"
     
 def format_exclusive_details(artist, venue_location, event_date):
-    # Regular expression to find and extract date in the details
-    date_pattern = re.compile(r'(\w+)\s(\d{1,2}),\s(\d{4})')
-    date_match = date_pattern.search(venue_location)
-
-    if date_match:
-        # Extract and format the date
-        month, day, year = date_match.groups()
-        try:
-            formatted_date = datetime.strptime(f'{month} {day} {year}', '%B %d %Y').strftime('%Y-%m-%d')
-        except ValueError:
-            formatted_date = 'Invalid Date'
-        venue_location = date_pattern.sub('', venue_location)
-        venue_location = venue_location.replace('  ', ' ').strip()
-    else:
-        # If no date found in details, use event_date
-        formatted_date = event_date if event_date else 'Invalid Date'
-    # Construct the display text
-    display_text = f"{artist} {formatted_date} {venue_location}"
-    return display_text
+    # A date in the venue text wins over the stream date, see release_names.exclusive_display_name
+    return release_names.exclusive_display_name(artist, venue_location, event_date)
     
 def extract_release_info(soup):
     try:
         artist, venue_location, date_text = extract_common_details(soup)
-        formatted_details = f"{artist} {date_text} {venue_location}"
+        formatted_details = release_names.display_name(artist, date_text, venue_location)
         return formatted_details, artist, venue_location, date_text
     except Exception as e:
         print(f'Error in extract_release_info: {e}')
@@ -316,25 +656,33 @@ def extract_venue_location(address_tag):
         # Directly use the text from the <address> tag
         full_address = address_tag.get_text(strip=True)
         # If the address contains more details (like 'Premiere:', 'Friday Night Cheese:', etc.), extract only the venue and location part
-        venue_location = re.sub(r'^(Premiere:|Friday Night Cheese:)\s*', '', full_address)
+        venue_location = release_names.clean_venue(full_address)
     else:
         venue_location = "Unknown Venue_Location"
     return venue_location
 
-def handle_additional_processing(driver, details, exclusive_tag, video_directory, combined_folder_names_set, args, url):
+def handle_additional_processing(snapshot, details, exclusive_tag, video_directory, combined_folder_names_set, args, url):
     global data_directory
     # Handles additional processing steps
     display_text, artist, venue_location, date_text = details
     folder_name = process_folder_name(display_text)
     folder_path = create_data_folder(folder_name, data_directory)
-    save_html_content(driver, folder_path, display_text)
-    download_image(driver, folder_path, display_text)
-    formatted_setlist = handle_setlist_and_info(driver, folder_path, display_text, exclusive_tag, args)
-    download_video_if_applicable(display_text, exclusive_tag, folder_path, video_directory, args, combined_folder_names_set,url)
+    with metrics.span('save_page'):
+        save_html_content(snapshot, folder_path, display_text, artist, url)
+    with metrics.span('image'):
+        download_image(snapshot, folder_path, display_text)
+    with metrics.span('setlist'):
+        formatted_setlist, song_names = handle_setlist_and_info(snapshot, folder_path, display_text, exclusive_tag, args)
+    start_catalog_record(url, details, song_names, exclusive_tag, snapshot.load_seconds)
+    update_catalog_record(url, setlist_seconds=parse_setlist_seconds(snapshot))
+    # Includes waiting for room in the download queue
+    with metrics.span('queue_download'):
+        download_video_if_applicable(display_text, exclusive_tag, folder_path, video_directory, args, combined_folder_names_set,url)
     # Write the link and formatted setlist to the file
     info_txt_path = os.path.join(folder_path, "info.txt")
     with open(info_txt_path, 'w', encoding='utf-8') as f:
         f.write(f"{url}\n{formatted_setlist}")
+    metrics.count('releases')
 
 def process_folder_name(display_text):
     # Sanitizes and processes folder name
@@ -346,127 +694,628 @@ def create_data_folder(folder_name, video_directory):
     os.makedirs(folder_path, exist_ok=True)
     return folder_path
 
-def save_html_content(driver, folder_path, display_text):
+def save_html_content(snapshot, folder_path, display_text, artist=None, url=None):
+    if isinstance(snapshot, ApiSnapshot):
+        # No rendered page in http mode, keep the API response instead
+        json_path = os.path.join(folder_path, f"{display_text}.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot.container, f, indent=4)
+        return
+    if snapshot_store is not None:
+        # Compressed into the per-artist snapshot archive instead of a loose .html per release
+        snapshot_store.put(snapshot_key(url or snapshot.url, display_text), snapshot.html, url or snapshot.url, display_text, artist)
+        return
     html_path = os.path.join(folder_path, f"{display_text}.html")
     with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(driver.page_source)
+        f.write(snapshot.html)
+
+def snapshot_key(url, display_text):
+    release = nugs_api.parse_release_url(url or '')
+    if release:
+        return f"{release[0]}/{release[1]}"
+    return f"name/{display_text}"
 
-def download_image(driver, folder_path, display_text):
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
+def iter_saved_pages(data_directory):
+    # Yields (folder_path, url, display_text, html) for every saved release page,
+    # reading one page at a time from the snapshot archive and any loose .html files
+    for store_dir in [os.path.join(data_directory, 'snapshots')] + host_data_paths(data_directory, 'snapshots'):
+        if not os.path.exists(os.path.join(store_dir, 'snapshots.sqlite3')):
+            continue
+        store = SnapshotStore(store_dir)
+        try:
+            for key, url, display_text in store.entries():
+                folder_path = os.path.join(data_directory, process_folder_name(display_text or key))
+                yield folder_path, url, display_text, store.get(key)
+        finally:
+            store.close()
+    for folder_path, _, files in os.walk(data_directory):
+        html_files = [file_name for file_name in files if file_name.endswith('.html')]
+        if not html_files:
+            continue
+        url = None
+        info_txt_path = os.path.join(folder_path, "info.txt")
+        if os.path.exists(info_txt_path):
+            with open(info_txt_path, 'r', encoding='utf-8') as f:
+                url = f.readline().strip()
+        for file_name in html_files:
+            with open(os.path.join(folder_path, file_name), 'r', encoding='utf-8') as f:
+                yield folder_path, url, file_name[:-len('.html')], f.read()
+
+def reindex_page(folder_path, url, display_text, html):
+    # Runs in a worker process: re-parses one saved page with the current extractors
+    page_url = url or 'https://play.nugs.net/release/0'
+    snapshot = PageSnapshot(html, page_url)
+    details = extract_page_details(snapshot, page_url)
+    formatted_setlist, song_names, song_counter = parse_html_for_setlist(snapshot)
+    return folder_path, url, display_text, details[0], formatted_setlist
+
+def reindex_saved_pages(data_directory, workers=None):
+    # Re-runs the extractors over every saved page in a process pool and rewrites info.txt
+    # only where the output changed. At most a few pages per worker are in flight, so
+    # memory stays flat however many pages there are
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    pages = iter_saved_pages(data_directory)
+    counts = {'pages': 0, 'updated': 0, 'renamed': 0, 'failed': 0}
+    started = time.monotonic()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        while True:
+            for page in pages:
+                in_flight.add(pool.submit(reindex_page, *page))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            finished, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                counts['pages'] += 1
+                try:
+                    folder_path, url, display_text, new_display_text, formatted_setlist = future.result()
+                except Exception as e:
+                    print(f'Exception in reindex_page: {e}')
+                    counts['failed'] += 1
+                    continue
+                if display_text and new_display_text != display_text:
+                    print(f"name changed: {display_text} -> {new_display_text}")
+                    counts['renamed'] += 1
+                info_txt_path = os.path.join(folder_path, "info.txt")
+                new_info = f"{url}\n{formatted_setlist}" if url else formatted_setlist
+                old_info = None
+                if os.path.exists(info_txt_path):
+                    with open(info_txt_path, 'r', encoding='utf-8') as f:
+                        old_info = f.read()
+                if new_info != old_info:
+                    os.makedirs(folder_path, exist_ok=True)
+                    with open(info_txt_path, 'w', encoding='utf-8') as f:
+                        f.write(new_info)
+                    counts['updated'] += 1
+                if counts['pages'] % 500 == 0:
+                    print(f"{counts['pages']} pages, {counts['pages'] / (time.monotonic() - started):.1f} pages/s")
+    elapsed = time.monotonic() - started
+    print(f"Reindexed {counts['pages']} pages in {elapsed:.1f}s ({counts['pages'] / max(elapsed, 1e-9):.1f} pages/s) "
+          f"with {workers} workers: {counts['updated']} info.txt updated, {counts['renamed']} names changed, {counts['failed']} failed")
+    return counts
+
+def migrate_html_snapshots(data_directory):
+    # Moves the loose .html files of older runs into the snapshot archive
+    store = SnapshotStore(host_data_path('snapshots'))
+    migrated = 0
+    try:
+        for folder_path, _, files in os.walk(data_directory):
+            url = None
+            info_txt_path = os.path.join(folder_path, "info.txt")
+            if os.path.exists(info_txt_path):
+                with open(info_txt_path, 'r', encoding='utf-8') as f:
+                    url = f.readline().strip()
+            for file_name in files:
+                if not file_name.endswith('.html'):
+                    continue
+                html_path = os.path.join(folder_path, file_name)
+                display_text = file_name[:-len('.html')]
+                with open(html_path, 'r', encoding='utf-8') as f:
+                    html = f.read()
+                name_key = release_names.release_key(display_text)
+                key = snapshot_key(url, display_text)
+                store.put(key, html, url, display_text, name_key.artist if name_key else None)
+                # Only remove the original once the archive gives the same page back
+                if store.get(key) == html:
+                    os.remove(html_path)
+                    migrated += 1
+                else:
+                    print(f"Could not verify {html_path}, keeping it")
+        stats = store.stats()
+        print(f"Migrated {migrated} pages: {stats['snapshots']} releases, {stats['unique_pages']} unique pages, "
+              f"{stats['raw_bytes'] / 1000 ** 2:.1f} MB stored as {stats['stored_bytes'] / 1000 ** 2:.1f} MB")
+    finally:
+        store.close()
+    return migrated
+
+def select_cover_image(soup):
     image_element = soup.select_one(".my1 > div:nth-child(1) > div:nth-child(1) > img:nth-child(1)")
-    if image_element:
-        image_url = image_element['src'].replace('https://', 'http://')
+    if image_element and image_element.get('src'):
+        return image_element['src']
+    return None
+
+def download_image(snapshot, folder_path, display_text):
+    if isinstance(snapshot, ApiSnapshot):
+        image_url = snapshot.cover_url
+    else:
+        image_url = select_cover_image(snapshot.soup)
+    if image_url:
+        image_url = image_url.replace('https://', 'http://')
         download_path = os.path.join(folder_path, f"{display_text}.jpg")
+        if image_cache is not None:
+            # Fetched in the background while the rest of the release is processed
+            return image_cache.place_async(image_url, download_path)
+        import requests
+        wait_for_budget(request_bucket)
         response = requests.get(image_url, timeout=10)
         response.raise_for_status()
         with open(download_path, 'wb') as file:
             file.write(response.content)
 
-def handle_setlist_and_info(driver, folder_path, display_text, exclusive_tag, args):
+def handle_setlist_and_info(snapshot, folder_path, display_text, exclusive_tag, args):
     # Parses HTML content for setlist and handles additional info
-    page_source = driver.page_source
-    formatted_setlist, song_names, song_counter = parse_html_for_setlist(page_source)
+    formatted_setlist, song_names, song_counter = parse_html_for_setlist(snapshot)
     # Additional logic for handling info
-    return formatted_setlist
+    return formatted_setlist, song_names
+
+def start_catalog_record(url, details, song_names, exclusive_tag, page_seconds=None):
+    # Held until the release is skipped, downloaded or fails, then appended to the catalog
+    if catalog_writer is None:
+        return
+    display_text, artist, venue_location, date_text = details
+    kind, release_id = nugs_api.parse_release_url(url) or (None, None)
+    record = {'release_id': release_id, 'kind': kind, 'url': url, 'artist': artist, 'venue': venue_location,
+              'date': date_text, 'exclusive': bool(exclusive_tag), 'status': 'pending', 'setlist': song_names,
+              'output_path': None, 'resolution': None, 'size_bytes': None,
+              'page_seconds': round(page_seconds, 3) if page_seconds is not None else None,
+              'download_seconds': None, 'finalize_seconds': None}
+    with catalog_lock:
+        catalog_records[download_job_id(url)] = record
+
+def update_catalog_record(url, **fields):
+    with catalog_lock:
+        record = catalog_records.get(download_job_id(url))
+        if record is not None:
+            record.update(fields)
+
+def catalog_field(url, name):
+    # e.g. the setlist from the release page, None for jobs resumed from an earlier run
+    with catalog_lock:
+        record = catalog_records.get(download_job_id(url))
+    return record.get(name) if record else None
+
+def finish_catalog_record(url, status, **fields):
+    if catalog_writer is None:
+        return
+    with catalog_lock:
+        record = catalog_records.pop(download_job_id(url), None)
+    if record is None:
+        # e.g. a job resumed from an earlier run
+        kind, release_id = nugs_api.parse_release_url(url) or (None, None)
+        record = {'release_id': release_id, 'kind': kind, 'url': url, 'exclusive': kind == 'exclusive'}
+    record.update(fields)
+    record['status'] = status
+    record['recorded_at'] = time.time()
+    catalog_writer.append(record)
 
 def download_video_if_applicable(display_text, exclusive_tag, folder_path, video_directory, args, combined_folder_names_set,url):
-    normalized_folder_names = {process_filename(name.strip()) for name in combined_folder_names_set}
     normalized_display_text = process_filename(display_text.strip())
-    if normalized_display_text not in normalized_folder_names:
-        if exclusive_tag:
-            print(display_text)
-            perform_download(url, video_directory, args, display_text, exclusive=True)
+    if library_index is not None:
+        already_have = library_index.has_key(normalized_display_text)
+    else:
+        already_have = normalized_display_text in {process_filename(name.strip()) for name in combined_folder_names_set}
+    job = download_journal.get(download_job_id(url)) if download_journal is not None else None
+    if not already_have and job is not None and job['state'] == 'failed':
+        print(f"{display_text} failed verification {job['attempts']} times, skipping it (download --retry-failed tries again)")
+        finish_catalog_record(url, 'failed', verify_error=job['error'])
+    elif not already_have:
+        print(display_text)
+        if download_pipeline is not None:
+            # Hand the download to the worker pool so the crawler can move on to the next release
+            if not download_pipeline.submit(url, video_directory, args, display_text, exclusive=exclusive_tag):
+                # Queued already, this run or by another host
+                finish_catalog_record(url, 'duplicate')
         else:
-            print(display_text)
-            perform_download(url, video_directory, args, display_text, exclusive=False)
+            perform_download(url, video_directory, args, display_text, exclusive=exclusive_tag)
     else:
-        print(f"{display_text} is in processed_filenames.txt, skipping: {normalized_display_text}")
+        print(f"{display_text} is already in the library, skipping: {normalized_display_text}")
+        finish_catalog_record(url, 'skipped')
+        release = nugs_api.parse_release_url(url)
+        if library_index is not None and release:
+            # Remember the id so the next crawl skips this card without loading the page
+            library_index.record_release(release[0], release[1], normalized_display_text)
+
+class DownloadPipeline:
+    # Producer/consumer stage between the crawler and nugs-downloader.
+    # The crawler submits jobs into a bounded queue (blocking when it is full) and
+    # a pool of worker threads runs perform_download for each job.
+    # With a shared job queue the jobs themselves wait in it, the local queue only wakes
+    # idle workers, and every worker also takes jobs other hosts queued.
+    def __init__(self, workers, queue_size, combined_folder_names_set, shared_jobs=None, idle_poll=30):
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.combined_folder_names_set = combined_folder_names_set
+        self.shared_jobs = shared_jobs
+        self.idle_poll = idle_poll
+        self.lock = threading.Lock()
+        # job_id -> dedupe key of every job taken this run, and the jobs waiting or downloading
+        self.queued = {}
+        self.active = set()
+        self.threads = []
+        for i in range(workers):
+            target = self._shared_worker if shared_jobs is not None else self._worker
+            thread = threading.Thread(target=target, name=f'download-worker-{i + 1}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, url, video_directory, args, display_text, exclusive=False):
+        key = process_filename(display_text.strip())
+        with self.lock:
+            # The same show can be linked from several cards, only queue it once per run
+            if key and key in self.combined_folder_names_set:
+                print(f"{display_text} is already queued, skipping")
+                return False
+            if key:
+                self.combined_folder_names_set.add(key)
+            self.queued[download_job_id(url)] = key
+            if self.shared_jobs is None:
+                self.active.add(download_job_id(url))
+        # Journaled only once it passed the check, a duplicate card would leave a job behind
+        if download_journal is not None and self.shared_jobs is None:
+            download_journal.enqueue(download_job_id(url), url, display_text, exclusive, video_directory)
+        if self.shared_jobs is not None:
+            job = {'url': url, 'video_directory': video_directory, 'display_text': display_text, 'exclusive': exclusive}
+            if not self.shared_jobs.enqueue(download_job_id(url), job):
+                print(f"{display_text} is already queued or downloaded by another host, skipping")
+                self.forget(download_job_id(url))
+                return False
+            print(f"queued for download in the shared queue: {display_text}")
+            try:
+                self.jobs.put_nowait(True)
+            except queue.Full:
+                pass
+            return True
+        print(f"queued for download ({self.jobs.qsize() + 1} waiting): {display_text}")
+        self.jobs.put((url, video_directory, args, display_text, exclusive))
+        return True
+
+    def retry(self, url, video_directory, display_text, exclusive=False):
+        # Queues a show again that submit() already took this run
+        print(f"queued for download again: {display_text}")
+        with self.lock:
+            self.active.add(download_job_id(url))
+        self.jobs.put((url, video_directory, None, display_text, exclusive))
+
+    def is_queued(self, job_id):
+        with self.lock:
+            return job_id in self.queued
+
+    def is_active(self, job_id):
+        with self.lock:
+            return job_id in self.active
+
+    def forget(self, job_id):
+        # Lets the show be queued again this run, e.g. by the next watch poll
+        with self.lock:
+            self.active.discard(job_id)
+            key = self.queued.pop(job_id, None)
+            if key:
+                self.combined_folder_names_set.discard(key)
+
+    def finished(self, job_id):
+        # A download that failed is forgotten, the next watch poll queues it again
+        with self.lock:
+            self.active.discard(job_id)
+        job = download_journal.get(job_id) if download_journal is not None else None
+        if job is not None and job['state'] in ('queued', 'downloading'):
+            self.forget(job_id)
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                url, video_directory, args, display_text, exclusive = job
+                perform_download(url, video_directory, args, display_text, exclusive=exclusive)
+            except Exception as e:
+                print(f'Exception in {threading.current_thread().name}: {e}')
+            finally:
+                if job is not None:
+                    self.finished(download_job_id(job[0]))
+                self.jobs.task_done()
+
+    def _shared_worker(self):
+        while True:
+            claimed = None if shutdown_event.is_set() else self.shared_jobs.claim_next()
+            if claimed is None:
+                # Nothing to claim, wait for a new job, the stop sentinel or the next look
+                try:
+                    token = self.jobs.get(timeout=self.idle_poll)
+                except queue.Empty:
+                    continue
+                self.jobs.task_done()
+                if token is None:
+                    return
+                continue
+            job_id, job = claimed
+            print(f"claimed {job['display_text']} from the shared queue")
+            try:
+                # This host's own video directory, the share may be mounted elsewhere on the host that queued it
+                perform_download(job['url'], video_directory, None, job['display_text'], exclusive=job['exclusive'])
+            except Exception as e:
+                print(f'Exception in {threading.current_thread().name}: {e}')
+                update_job(job_id, error=str(e))
+
+    def drop_pending(self):
+        # Takes the jobs that haven't started off the queue, they stay 'queued' in the
+        # journal and are picked up by resume_unfinished_jobs next run
+        dropped = 0
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return dropped
+            self.jobs.task_done()
+            if job is not None:
+                dropped += 1
+
+    def close(self, busy=None):
+        # Wait for every queued download to finish, and for busy() to turn False when more
+        # downloads may still be queued (e.g. by remuxes still running), then stop the workers
+        while True:
+            self.jobs.join()
+            if busy is None or not busy():
+                if not self.jobs.unfinished_tasks:
+                    break
+                continue
+            time.sleep(0.2)
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
 
 def extract_date(date_tag):
     if date_tag:
-        date_text = date_tag.get_text(strip=True)
-        date_obj = datetime.strptime(date_text, '%b %d, %Y')
-        formatted_date = date_obj.strftime('%Y-%m-%d')
+        formatted_date = release_names.parse_date(date_tag.get_text(strip=True)) or "Invalid Date"
     else:
         formatted_date = "Unknown Date"
     return formatted_date
 
 def sanitize_name(name):
-    # Define illegal characters for file names
-    illegal_chars = r'[<>:"/\\|?*]'
-    # Replace illegal characters with an underscore
-    return re.sub(illegal_chars, '_', name)
+    # Replace characters that aren't allowed in file names with an underscore
+    return release_names.safe_filename(name)
+
+def parse_setlist_seconds(snapshot):
+    # Running time of all the tracks on a release page, None when the page doesn't show them
+    if not isinstance(snapshot, PageSnapshot):
+        return None
+    total = 0
+    for span in snapshot.soup.find_all('span', class_=re.compile('Duration')):
+        parts = span.get_text(strip=True).split(':')
+        if all(part.isdigit() for part in parts):
+            total += sum(int(part) * 60 ** power for power, part in enumerate(reversed(parts)))
+    return total or None
+
+set_header_pattern = re.compile(r'\bset\s+(\d+|one|two|three|four|five)\b')
+set_number_words = {'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5'}
 
 def parse_html_for_setlist(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    setlist_data = []
-    song_names = []
-    song_counter = 0
+    # Accepts a PageSnapshot (reusing its parsed tree) or a raw HTML string
+    if isinstance(html_content, ApiSnapshot):
+        return format_setlist(html_content.sets)
+    if isinstance(html_content, PageSnapshot):
+        soup = html_content.soup
+    else:
+        soup = make_soup(html_content)
     # Identify all headers and track cards
     elements = soup.find_all(['h2', 'div'], class_=['mt2 gray fs fs-14 ls-1 lh-20 bold', '_TrackCard_btsdq_2 track-card track-item'])
     # Initialize current set and track list
     current_set_name = "Set 1"
-    current_tracks = []
+    sets = [(current_set_name, [])]
     for element in elements:
         if element.name == 'h2':  # Check if it is a header
-            # If the current track list is not empty, append it to the setlist data
-            if current_tracks:
-                setlist_data.append(f"    {current_set_name}:\n" + ''.join(current_tracks))
-                current_tracks = []  # Reset the current tracks for the next set
-            set_name = element.get_text(strip=True)
-            if 'set one' in set_name.lower() or 'set 1' in set_name.lower():
-                current_set_name = "Set 1"
-            elif 'set two' in set_name.lower() or 'set 2' in set_name.lower():
-                current_set_name = "Set 2"
-            elif 'encore' in set_name.lower():
+            set_name = element.get_text(strip=True).lower()
+            set_match = set_header_pattern.search(set_name)
+            if 'encore' in set_name:
                 current_set_name = "Encore"
+            elif set_match:
+                number = set_match.group(1)
+                current_set_name = f"Set {set_number_words.get(number, number)}"
+            # Start a new set unless the previous header had no tracks
+            if sets[-1][1]:
+                sets.append((current_set_name, []))
+            else:
+                sets[-1] = (current_set_name, [])
         elif element.name == 'div':  # Check if it is a track card
             track_info = element.find('span', class_='hidden')
             if track_info:
-                song_counter += 1
-                track_name = track_info.get_text(strip=True).split('. ', 1)[-1]
-                song_names.append(track_name)
-                current_tracks.append(f"    {song_counter}. {track_name}\n")
-    # Append any remaining tracks to the setlist data
-    if current_tracks:
-        setlist_data.append(f"    {current_set_name}:\n" + ''.join(current_tracks))
+                sets[-1][1].append(track_info.get_text(strip=True).split('. ', 1)[-1])
+    return format_setlist(sets)
+
+def format_setlist(sets):
+    # Formats [(set name, [song, ...]), ...] into the SETLIST block written to info.txt
+    setlist_data = []
+    song_names = []
+    song_counter = 0
+    for set_name, songs in sets:
+        current_tracks = []
+        for track_name in songs:
+            song_counter += 1
+            song_names.append(track_name)
+            current_tracks.append(f"    {song_counter}. {track_name}\n")
+        if current_tracks:
+            setlist_data.append(f"    {set_name}:\n" + ''.join(current_tracks))
     # Join the setlist parts into one formatted string
     formatted_setlist = "SETLIST:\n" + ''.join(setlist_data)
     return formatted_setlist.strip(), song_names, song_counter
 
-def extract_identifier(video_name):
-    # Strip the resolution part from the video file name
-    # Assuming the resolution part is formatted like "_1080p.mkv"
-    return video_name.rsplit('_', 1)[0]
-
 def sanitize_name_colon(name):
-    # Replace illegal characters with underscores
-    sanitized_name = re.sub(r':', '_', name)
-    return sanitized_name
+    # Replace colons with underscores
+    return release_names.replace_colons(name)
+
+def release_page_ready(driver):
+    # The app has rendered a release once the artist heading has text and the date or venue is in,
+    # which holds across deploys where the hashed class names change
+    try:
+        headings = driver.find_elements(By.TAG_NAME, 'h1')
+        return bool(headings and headings[0].text.strip() and driver.find_elements(By.CSS_SELECTOR, 'time, address'))
+    except StaleElementReferenceException:
+        return False
 
-def setup_headless_driver():
+def browser_options(lean, profile_directory):
+    load_selenium()
     chrome_options = Options()
     chrome_options.add_argument("--headless")  # Running in headless mode
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
+    if lean:
+        # driver.get returns at DOMContentLoaded, process_link waits for the content itself
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        chrome_options.add_argument("--mute-audio")
+    if profile_directory:
+        # Keeps the HTTP cache and compiled scripts of the app between runs
+        chrome_options.add_argument(f"--user-data-dir={os.path.abspath(profile_directory)}")
+    return chrome_options
+
+def block_lean_urls(driver):
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': lean_blocked_urls})
+    except Exception as e:
+        print(f'Exception in block_lean_urls: {e}')
+
+def setup_headless_driver(lean=None, profile_directory=None):
+    load_selenium()
+    lean = browser_lean if lean is None else lean
+    profile_directory = browser_profile_directory if profile_directory is None else profile_directory
+    if profile_directory:
+        os.makedirs(profile_directory, exist_ok=True)
     chromedriver_path = os.path.join(os.getcwd(), "binaries", "chromedriver.exe")
-    service = Service(chromedriver_path)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    # Without the bundled chromedriver selenium finds one itself
+    service = Service(chromedriver_path) if os.path.exists(chromedriver_path) else Service()
+    try:
+        driver = webdriver.Chrome(service=service, options=browser_options(lean, profile_directory))
+    except WebDriverException as e:
+        if not profile_directory:
+            raise
+        # Usually another Chrome still has the profile open
+        print(f'Could not start Chrome with the profile in {profile_directory}, using a temporary one: {e.msg}')
+        return setup_headless_driver(lean, '')
+    if lean:
+        block_lean_urls(driver)
     return driver
 
 def login_to_nugs(driver, nugs_email, nugs_password):
     print('Logging in to Nugs...')
-    driver.get('https://id.nugs.net/account/login')
-    email_elem = driver.find_element(By.NAME, "Input.Email")
-    email_elem.send_keys(nugs_email)
-    password_elem = driver.find_element(By.NAME, "Input.Password")
-    password_elem.send_keys(nugs_password)
-    login_button = driver.find_element(By.CSS_SELECTOR, 'button.btn.btn-block.btn-primary')
-    login_button.click()
-    WebDriverWait(driver, 20).until(EC.url_changes('https://id.nugs.net/account/login'))
+    wait_for_budget(navigation_bucket)
+    with metrics.span('login'):
+        driver.get('https://id.nugs.net/account/login')
+        email_elem = driver.find_element(By.NAME, "Input.Email")
+        email_elem.send_keys(nugs_email)
+        password_elem = driver.find_element(By.NAME, "Input.Password")
+        password_elem.send_keys(nugs_password)
+        login_button = driver.find_element(By.CSS_SELECTOR, 'button.btn.btn-block.btn-primary')
+        login_button.click()
+        WebDriverWait(driver, 20).until(EC.url_changes('https://id.nugs.net/account/login'))
     print('\n\nlogged in successfully\n')
     return driver
 
+class BrowserSession:
+    # Keeps one warm, logged-in driver for the whole run and saves the auth cookies
+    # to the data directory so the next run can skip the login form while they are valid
+    def __init__(self, nugs_email, nugs_password, cookie_path, max_age_hours=12):
+        self.nugs_email = nugs_email
+        self.nugs_password = nugs_password
+        self.cookie_path = cookie_path
+        self.max_age_seconds = max_age_hours * 3600
+        self.driver = None
+        self.logged_in = False
+
+    def get_driver(self):
+        if self.driver is None:
+            self.driver = setup_headless_driver()
+        if not self.logged_in:
+            if self.restore_cookies():
+                print('Restored saved nugs session, skipping login')
+            else:
+                login_to_nugs(self.driver, self.nugs_email, self.nugs_password)
+                self.save_cookies()
+            self.logged_in = True
+        return self.driver
+
+    def load_valid_cookies(self):
+        try:
+            with open(self.cookie_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+        now = time.time()
+        # Session cookies have no expiry of their own, trust them for max_age_hours after saving
+        session_deadline = saved.get('saved_at', 0) + self.max_age_seconds
+        cookies = saved.get('cookies', [])
+        if not cookies:
+            return []
+        for cookie in cookies:
+            expiry = cookie.get('expiry', session_deadline)
+            if expiry <= now:
+                print(f"Saved session cookie {cookie.get('name')} expired, logging in again")
+                return []
+        return cookies
+
+    def restore_cookies(self):
+        cookies = self.load_valid_cookies()
+        if not cookies:
+            return False
+        try:
+            # The driver only accepts cookies for the domain it is currently on
+            by_domain = {}
+            for cookie in cookies:
+                by_domain.setdefault(cookie.get('domain', 'play.nugs.net').lstrip('.'), []).append(cookie)
+            for domain, domain_cookies in by_domain.items():
+                wait_for_budget(navigation_bucket)
+                self.driver.get(f'https://{domain}/favicon.ico')
+                for cookie in domain_cookies:
+                    self.driver.add_cookie(cookie)
+        except Exception as e:
+            print(f'Could not restore saved session: {e}')
+            self.driver.delete_all_cookies()
+            return False
+        return True
+
+    def save_cookies(self):
+        try:
+            cookies = {}
+            # Login leaves cookies on both the id and play domains
+            for domain in ('id.nugs.net', 'play.nugs.net'):
+                if urlparse(self.driver.current_url).netloc != domain:
+                    wait_for_budget(navigation_bucket)
+                    self.driver.get(f'https://{domain}/favicon.ico')
+                for cookie in self.driver.get_cookies():
+                    cookies[(cookie['name'], cookie.get('domain'), cookie.get('path'))] = cookie
+            cookies = list(cookies.values())
+            temp_path = self.cookie_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'saved_at': time.time(), 'cookies': cookies}, f, indent=4)
+            os.replace(temp_path, self.cookie_path)
+        except Exception as e:
+            print(f'Could not save session cookies: {e}')
+
+    def invalidate(self):
+        # Forget the saved cookies, e.g. when nugs sends the browser back to the login page
+        self.logged_in = False
+        if os.path.exists(self.cookie_path):
+            os.remove(self.cookie_path)
+
+    def quit(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+            self.logged_in = False
+
 def navigate_to_page(driver, page):
     urls = {
         'exclusive': 'https://play.nugs.net/watch/livestreams/recent',
@@ -474,102 +1323,609 @@ def navigate_to_page(driver, page):
     }
     target_url = urls.get(page, page)  # Use the provided page URL if not in predefined list
     print(f'\nNavigating to {target_url}...\n')
-    driver.get(target_url)
-    try:
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//button[contains(., 'Finish')] | //a[contains(@href, '/release/') or contains(@href, '/exclusive/')]")))
-        finish_buttons = driver.find_elements(By.XPATH, "//button[contains(., 'Finish')]")
-        if finish_buttons:
-            finish_buttons[0].click()
-            print('Clicked Finish')
-    except TimeoutException:
-        print('Timeout waiting for elements on page.')
-    except Exception as e:
-        print(f'Unexpected error: {e}')
+    wait_for_budget(navigation_bucket)
+    with metrics.span('navigate'):
+        driver.get(target_url)
+        try:
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.XPATH, "//button[contains(., 'Finish')] | //a[contains(@href, '/release/') or contains(@href, '/exclusive/')]")))
+            finish_buttons = driver.find_elements(By.XPATH, "//button[contains(., 'Finish')]")
+            if finish_buttons:
+                finish_buttons[0].click()
+                print('Clicked Finish')
+        except TimeoutException:
+            print('Timeout waiting for elements on page.')
+        except Exception as e:
+            print(f'Unexpected error: {e}')
     return driver
 
+def add_download_event_hook(hook):
+    # hook(release_number, DownloadEvent) is called for every event of every download
+    download_event_hooks.append(hook)
+
+def print_download_event(numbers, event):
+    if event.kind == 'progress':
+        details = [f"{event.percent:g}% complete" if event.percent is not None else "downloading"]
+        if event.speed:
+            details.append(f"{event.speed / 1000 ** 2:.1f} MB/s")
+        if event.eta is not None:
+            details.append(f"ETA {event.eta // 60}m{event.eta % 60:02d}s")
+        print(f"[{numbers}] {', '.join(details)}", end='\r', flush=True)
+    elif event.kind in ('error', 'stalled', 'timeout', 'cancelled'):
+        print(f"\n[{numbers}] {event.kind.upper()}: {event.line}")
+    elif event.kind == 'output':
+        print(f"[{numbers}] {event.stream.upper()}: {event.line}", end='\r')
+
 def run_go_program(release_link, video_save_path, video_dl_base_url):
     print("starting nugs-downloader...")
     match = re.search(r'/(\d+)$', release_link)
     numbers = match.group(1) if match else None
 
-    if numbers:
-        video_dl_link = video_dl_base_url + numbers
-        # Convert the path to Unix-style
-        unix_style_video_save_path = video_save_path.replace('\\', '/')
-        working_dir = 'binaries/'
-        # Construct the command to run the nugs_downloader executable
-        command = f'main.exe -o "{unix_style_video_save_path}" {video_dl_link}'
-        print(f"Command to be executed: {command}")
-        # Use the working directory in subprocess
-        with subprocess.Popen(command, cwd=working_dir, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as proc:
-            last_percentage = None
-            for line in proc.stdout:
-                match = re.search(r'(\d+)%', line)
-                if match:
-                    current_percentage = match.group(1)
-                    if current_percentage != last_percentage:
-                        print(f"{current_percentage}% complete", end='\r', flush=True)
-                        last_percentage = current_percentage
-                else:
-                    # Printing the remaining stdout line only if it's not a percentage update
-                    print(f"STDOUT: {line.strip()}", end='\r')
-            for line in proc.stderr:
-                print(f"STDERR: {line.strip()}")
-    else:
+    if not numbers:
         print("Invalid release link provided.")
-    print("\nrun_go_program completed.")
+        return None
+    video_dl_link = video_dl_base_url + numbers
+    # Convert the path to Unix-style
+    unix_style_video_save_path = video_save_path.replace('\\', '/')
+    working_dir = 'binaries/'
+    # Construct the command to run the nugs_downloader executable
+    command = nugs_downloader.build_command(downloader_command, working_dir, unix_style_video_save_path, video_dl_link)
+    print(f"Command to be executed: {subprocess.list2cmdline(command)}")
+
+    def on_event(event):
+        print_download_event(numbers, event)
+        for hook in download_event_hooks:
+            hook(numbers, event)
+
+    # Both output streams are read concurrently, hung downloads are killed
+    result = nugs_downloader.run_downloader(command, cwd=working_dir, on_event=on_event,
+                                            timeout=download_timeout_minutes * 60 or None,
+                                            stall_timeout=stall_timeout_minutes * 60 or None, cancel=cancel_event)
+    print(f"\nrun_go_program completed (exit code {result.returncode}).")
+    return result
+
+def download_job_id(link):
+    release = nugs_api.parse_release_url(link)
+    if release:
+        return f"{release[0]}-{release[1]}"
+    return re.sub(r'[^A-Za-z0-9]+', '-', link).strip('-')[-80:]
+
+def update_job(job_id, state=None, **fields):
+    if download_journal is not None:
+        download_journal.update(job_id, state, **fields)
+    if state == 'done' or fields.get('error'):
+        release_storage(job_id)
+    if shared_queue is not None:
+        if state == 'done':
+            shared_queue.complete(job_id)
+        elif fields.get('error'):
+            # The lease runs out and any host retries the job, spacing out retries
+            shared_queue.release(job_id)
+
+def reserve_storage(job_id, display_text, video_directory):
+    # Reserves the expected size on the scratch disk and on the emptiest (or next) volume,
+    # returns the volume or None when there isn't room, before anything is downloaded
+    if storage_pool is None:
+        return video_directory
+    size = expected_size_bytes(video_format, expected_size_gb)
+    os.makedirs(scratch_directory, exist_ok=True)
+    if not storage_pool.reserve_on(scratch_directory, size):
+        print(f"Not enough space in {scratch_directory} for {display_text} ({size / GB:.1f} GB expected)")
+        return None
+    volume = storage_pool.reserve(size)
+    if volume is None:
+        storage_pool.release(scratch_directory, size)
+        print(f"No storage volume has {size / GB:.1f} GB free for {display_text}")
+        return None
+    storage_reservations[job_id] = [(scratch_directory, size), (volume, size)]
+    return volume
+
+def release_storage(job_id):
+    for volume, size in storage_reservations.pop(job_id, []):
+        storage_pool.release(volume, size)
 
 def perform_download(link,video_directory , args,display_text, exclusive=False):
-    target_drive=video_directory
     if not link:
         print("No link provided for download.")
         return
     video_dl_base_url = 'https://play.nugs.net/#/videos/artist/1045/Dead%20and%20Company/container/' if not exclusive else 'https://play.nugs.net/watch/livestreams/exclusive/'
-    with tempfile.TemporaryDirectory(dir=target_drive) as temp_dir:
-        print(f"\ntemporary download path: {temp_dir}")
-        # print(f"Link: {link}")
-        try:
-            run_go_program(link, temp_dir, video_dl_base_url)
-        except Exception as e:
-            print(f"Error running Go program: {e}")
-            return
-        files = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir)]
-        files.sort(key=os.path.getctime, reverse=True)
-        if not files:
-            print("No files found in the temporary directory.")
-            return
-
-        latest_file = files[0]
-        latest_file=convert_to_mkv(latest_file)
-        latest_filename = os.path.basename(latest_file)
+    job_id = download_job_id(link)
+    if not start_download_turn():
+        print(f"not starting {display_text}, stopping")
+        return
+    # Download onto fast local scratch, the video directory is often a network share.
+    # The staging folder is stable per release and kept until the job is done, so a finished
+    # download is remuxed on the next run. An interrupted download starts over, the downloader
+    # can't resume a partial file
+    temp_dir = os.path.join(scratch_directory, job_id)
+    os.makedirs(temp_dir, exist_ok=True)
+    print(f"\ntemporary download path: {temp_dir}")
+    if download_journal is not None:
+        download_journal.enqueue(job_id, link, display_text, exclusive, video_directory)
+    video_directory = reserve_storage(job_id, display_text, video_directory)
+    if video_directory is None:
+        end_download_turn(None, temp_dir, 0)
+        update_job(job_id, error="not enough disk space")
+        finish_catalog_record(link, 'failed')
+        return
+    update_job(job_id, 'downloading', error=None, video_directory=video_directory)
+    started = time.monotonic()
+    result = None
+    try:
+        with metrics.span('download', job=job_id):
+            result = run_go_program(link, temp_dir, video_dl_base_url)
+    except Exception as e:
+        print(f"Error running Go program: {e}")
+        update_job(job_id, error=str(e))
+        finish_catalog_record(link, 'failed')
+        return
+    finally:
+        end_download_turn(result, temp_dir, time.monotonic() - started)
+    update_catalog_record(link, download_seconds=round(time.monotonic() - started, 3))
+    if result is None or not result.ok:
+        reason = 'stalled' if result and result.stalled else 'timed out' if result and result.timed_out else \
+            'stopped' if result and result.cancelled else 'failed'
+        print(f"Download {reason} for {display_text}, it will be downloaded again next run.")
+        for line in (result.errors if result else [])[-5:]:
+            print(f"    {line}")
+        update_job(job_id, error=f"download {reason}")
+        finish_catalog_record(link, 'failed')
+        return
+    files = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if not f.startswith('.')]
+    files.sort(key=os.path.getctime, reverse=True)
+    if not files:
+        print("No files found in the temporary directory.")
+        update_job(job_id, error="no file downloaded")
+        finish_catalog_record(link, 'failed')
+        return
+    if verify_enabled and result.last_percent is not None and result.last_percent < 99:
+        # Exited without an error before its progress reached the end
+        requeue_failed_verification(job_id, link, display_text, f"download stopped at {result.last_percent:g}%", [temp_dir])
+        return
+    update_job(job_id, 'downloaded', staged_file=files[0])
+    metrics.count('download_bytes', os.path.getsize(files[0]))
+
+    if finalize_pool is not None:
+        # Remux and move in the background so this worker can start the next download
+        submit_finalize(job_id, files[0], link, video_directory, display_text)
+    else:
+        finalize_download(job_id, files[0], link, video_directory, display_text)
+
+def wait_for_budget(bucket):
+    waited = bucket.acquire(shutdown_event)
+    if waited:
+        metrics.count(f'{bucket.name}_wait_seconds', waited)
+
+def start_download_turn():
+    # Waits for a free download slot and the downloads budget. False when stopping
+    # meanwhile, the job then stays queued for the next run
+    if download_concurrency is not None and not download_concurrency.acquire(shutdown_event):
+        return False
+    wait_for_budget(download_bucket)
+    if shutdown_event.is_set():
+        end_download_turn(None, None, 0)
+        return False
+    return True
+
+def end_download_turn(result, temp_dir, seconds):
+    # Frees the slot and tells the concurrency controller how the download went
+    if download_concurrency is None:
+        return
+    download_concurrency.release()
+    if result is None or result.cancelled or temp_dir is None:
+        report_rate_limits()
+        return
+    if result.throttled:
+        print("nugs is throttling downloads, pausing new ones for a minute")
+        download_bucket.pause(60)
+    # Partial files picked up from an earlier run count as well, close enough for a trend
+    byte_count = sum(entry.stat().st_size for entry in os.scandir(temp_dir) if entry.is_file())
+    change = download_concurrency.record(result.ok, result.throttled, byte_count, seconds)
+    if change:
+        old, new, why = change
+        print(f"download workers {old} -> {new} ({why})")
+    report_rate_limits()
+
+def report_rate_limits():
+    for bucket, rate in ((navigation_bucket, navigations_per_minute), (request_bucket, requests_per_second),
+                         (download_bucket, downloads_per_hour)):
+        metrics.set_gauge(f'{bucket.name}_limit', rate)
+        metrics.set_gauge(f'{bucket.name}_throttled', bucket.throttled)
+    if download_concurrency is not None:
+        metrics.set_gauge('download_workers_limit', download_concurrency.limit)
+        if download_concurrency.throughput is not None:
+            metrics.set_gauge('download_throughput_mb_s', round(download_concurrency.throughput / 1000 ** 2, 3))
+
+def submit_finalize(*args):
+    future = finalize_pool.submit(finalize_download, *args)
+    finalize_futures.add(future)
+    future.add_done_callback(finalize_futures.discard)
+
+def finalize_download(job_id, latest_file, link, video_directory, display_text, state='downloaded', output_file=None):
+    # Runs the downloaded -> remuxed -> moved -> done steps, starting from state when resuming
+    started = time.monotonic()
+    try:
+        temp_dir = os.path.dirname(latest_file)
+        latest_filename = os.path.basename(latest_file).rsplit('.', 1)[0] + '.mkv'
         latest_filename = sanitize_name_colon(latest_filename)  # Ensure sanitize_name_colon is defined
-        
+
         last_underscore_index = latest_filename.rfind('_')
         suffix = latest_filename[last_underscore_index + 1:]
-        new_folder_name = f"{display_text} {suffix}"
+        new_folder_name = sanitize_name(f"{display_text} {suffix}")
         new_file_path = os.path.join(video_directory, new_folder_name)
-        
-        with open('processed_filenames.txt', 'a') as file:
-            file.write(f"{new_folder_name}\n")    
         os.makedirs(video_directory, exist_ok=True)
-        shutil.move(latest_file, new_file_path)
-        print(f"{latest_filename} renamed and moved to: {new_file_path}")
+        # Written under a temporary name so a half finished file never looks complete
+        partial_path = os.path.join(video_directory, f".{new_folder_name}.part.mkv")
+        checksum = duration = verified = None
 
-def convert_to_mkv(filename):
-    if not filename.endswith('.mkv'):
-        # Construct the FFmpeg command to convert the file to .mkv
+        if state == 'downloaded':
+            if latest_file.endswith('.mkv'):
+                output_file = latest_file
+            else:
+                # When the video directory is another disk the remux stays on scratch, and the
+                # copy over reads it once for the checksum while writing the share once. On the
+                # same disk it is remuxed into place and read back once for the checksum, ffmpeg
+                # writing to a pipe instead couldn't seek back to add the cues and duration
+                output_file = partial_path if same_filesystem(temp_dir, video_directory) else os.path.join(temp_dir, '.remuxed.mkv')
+                if not convert_to_mkv(latest_file, output_file):
+                    print(f"ffmpeg failed to remux {latest_file}, it will be retried next run")
+                    update_job(job_id, error="remux failed")
+                    finish_catalog_record(link, 'failed')
+                    return
+            update_job(job_id, 'remuxed', output_file=output_file)
+            state = 'remuxed'
+        if state == 'remuxed':
+            output_file = output_file or partial_path
+            with metrics.span('move'):
+                checksum = move_file(output_file, partial_path, checksum_algorithm if verify_enabled else None)
+            if verify_enabled and ffprobe_missing():
+                # Kept and recorded as unverified, never deleted because a tool is missing
+                verified = False
+            elif verify_enabled:
+                source = latest_file if latest_file != output_file and os.path.exists(latest_file) else None
+                with metrics.span('verify'):
+                    problem, duration = check_video(partial_path, source, catalog_field(link, 'setlist_seconds'))
+                if problem:
+                    requeue_failed_verification(job_id, link, display_text, problem, [partial_path, temp_dir])
+                    return
+                verified = True
+            os.replace(partial_path, new_file_path)
+            print(f"{latest_filename} renamed and moved to: {new_file_path}")
+            update_job(job_id, 'moved', final_path=new_file_path, checksum=checksum, duration=duration)
+            state = 'moved'
+        if state == 'moved':
+            if checksum is None and download_journal is not None:
+                job = download_journal.get(job_id) or {}
+                checksum, duration = job.get('checksum'), job.get('duration')
+            # Only recorded as processed once the file is really in the library
+            with processed_filenames_lock:
+                with open(processed_filenames_path, 'a') as file:
+                    file.write(f"{new_folder_name}\n")
+            size_bytes = os.path.getsize(new_file_path)
+            if library_index is not None:
+                release = nugs_api.parse_release_url(link)
+                library_index.add(new_folder_name, 'download', *(release or (None, None)))
+                library_index.record_file(new_folder_name, new_file_path, size_bytes, checksum, duration)
+            update_job(job_id, 'done', error=None)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            metrics.count('library_bytes', size_bytes)
+            metrics.count('downloads')
+            song_names = catalog_field(link, 'setlist')
+            finish_catalog_record(link, 'downloaded', output_path=new_file_path, resolution=suffix.rsplit('.', 1)[0],
+                                  size_bytes=size_bytes, checksum=checksum, duration_seconds=duration, verified=verified,
+                                  finalize_seconds=round(time.monotonic() - started, 3))
+            if audio_pool is not None:
+                audio_pool.submit(extract_audio, new_file_path, song_names)
+    except Exception as e:
+        print(f"Exception in finalize_download for {display_text}: {e}")
+        update_job(job_id, error=str(e))
+        finish_catalog_record(link, 'failed')
+
+def requeue_failed_verification(job_id, link, display_text, reason, paths):
+    # The files can't be trusted, so they are thrown away and the release is downloaded again
+    print(f"{display_text} failed verification ({reason})")
+    metrics.count('verify_failures')
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+    update_job(job_id, 'queued', error=f"verification failed: {reason}", staged_file=None, output_file=None)
+    # Only failed verifications count, a network error or stall says nothing about the release
+    if download_journal is not None:
+        download_journal.add_attempt(job_id)
+    job = download_journal.get(job_id) if download_journal is not None else None
+    if job and job['attempts'] >= verify_max_attempts:
+        # Most likely the release itself is short or broken, stop spending downloads on it
+        print(f"giving up on {display_text} after failing verification {job['attempts']} times")
+        update_job(job_id, 'failed')
+        finish_catalog_record(link, 'failed', verify_error=reason)
+        return
+    # Once per run, a shared job goes back to the other hosts when its lease runs out
+    if verify_requeue and job and download_pipeline is not None and shared_queue is None \
+            and not shutdown_event.is_set() and job_id not in requeued_jobs:
+        requeued_jobs.add(job_id)
+        update_catalog_record(link, verify_error=reason)
+        download_pipeline.retry(link, job['video_directory'], display_text, exclusive=bool(job['exclusive']))
+    else:
+        print(f"{display_text} will be downloaded again next run")
+        finish_catalog_record(link, 'failed', verify_error=reason)
+
+def resume_unfinished_jobs():
+    # Picks every job of an earlier run back up at the state it reached
+    for job in download_journal.unfinished():
+        state = job['state']
+        if state in ('queued', 'downloading') and in_library(job['url'], job['display_text']):
+            print(f"{job['display_text']} is already in the library, not resuming it")
+            download_journal.update(job['job_id'], 'done', error='already in the library')
+            continue
+        if shared_queue is not None and not resume_shared_job(job):
+            continue
+        print(f"resuming {job['display_text']} ({state})")
+        staged_file = job['staged_file']
+        if state == 'remuxed' and not os.path.exists(job['output_file'] or ''):
+            state = 'downloaded'
+        if state == 'downloaded' and not os.path.exists(staged_file or ''):
+            state = 'queued'
+        if state in ('queued', 'downloading'):
+            download_pipeline.submit(job['url'], job['video_directory'], None, job['display_text'], exclusive=bool(job['exclusive']))
+        else:
+            submit_finalize(job['job_id'], staged_file, job['url'], job['video_directory'], job['display_text'], state,
+                            job['output_file'])
+
+def in_library(url, display_text):
+    if library_index is None:
+        return False
+    release = nugs_api.parse_release_url(url)
+    return library_index.has_key(process_filename(display_text.strip())) or \
+        bool(release and library_index.has_release(*release))
+
+def host_data_path(name):
+    # With a shared data directory every host keeps its own SQLite files, snapshot packs,
+    # catalog and metrics under hosts/<hostname>, SQLite locking and appends from several
+    # hosts at once aren't safe on smb/nfs shares
+    if not shared_queue_enabled:
+        return os.path.join(data_directory, name)
+    folder = os.path.join(data_directory, 'hosts', socket.gethostname())
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+def host_data_paths(data_directory, name):
+    # name in the folder of every host that ran with a shared data directory
+    hosts_folder = os.path.join(data_directory, 'hosts')
+    if not os.path.isdir(hosts_folder):
+        return []
+    paths = [os.path.join(hosts_folder, host, name) for host in sorted(os.listdir(hosts_folder))]
+    return [path for path in paths if os.path.exists(path)]
+
+def catalog_files():
+    # The catalog of a single host run plus those of every cluster host
+    paths = [os.path.join(data_directory, 'catalog.jsonl')] + host_data_paths(data_directory, 'catalog.jsonl')
+    return [path for path in paths if os.path.exists(path)]
+
+def retry_unfinished_downloads():
+    # Downloads that failed earlier in a long watch run are queued again once per poll,
+    # with a shared queue the lease running out does that
+    if download_journal is None or shared_queue is not None:
+        return
+    for job in download_journal.unfinished():
+        if job['state'] not in ('queued', 'downloading') or download_pipeline.is_active(job['job_id']):
+            continue
+        if in_library(job['url'], job['display_text']):
+            download_journal.update(job['job_id'], 'done', error='already in the library')
+            continue
+        print(f"retrying {job['display_text']}" + (f" ({job['error']})" if job['error'] else ''))
+        download_pipeline.forget(job['job_id'])
+        download_pipeline.submit(job['url'], job['video_directory'], None, job['display_text'], exclusive=bool(job['exclusive']))
+
+def download_journal_path():
+    if shared_queue_enabled:
+        # Staged files are on this host's scratch disk, so each host keeps its own journal
+        return os.path.join(data_directory, f'download_journal-{socket.gethostname()}.sqlite3')
+    return os.path.join(data_directory, 'download_journal.sqlite3')
+
+def resume_shared_job(job):
+    # Jobs not downloaded yet go back to the shared queue for any host, jobs with a
+    # staged file here need the lease back before they are finished on this host
+    job_id = job['job_id']
+    if shared_queue.is_done(job_id):
+        print(f"{job['display_text']} was finished by another host")
+        download_journal.update(job_id, 'done', error=None)
+        return False
+    payload = {'url': job['url'], 'video_directory': job['video_directory'], 'display_text': job['display_text'],
+               'exclusive': bool(job['exclusive'])}
+    shared_queue.enqueue(job_id, payload)
+    if job['state'] in ('queued', 'downloading'):
+        return False
+    if shared_queue.claim(job_id) is None:
+        print(f"{job['display_text']} is being downloaded by another host, not resuming it here")
+        return False
+    return True
+
+def same_filesystem(path, other_path):
+    return os.stat(path).st_dev == os.stat(other_path).st_dev
+
+def move_file(source, destination, checksum=None):
+    # A rename when both paths are on the same filesystem, otherwise a copy and delete.
+    # Given a hashlib algorithm the file is hashed in the same pass that copies it (or read
+    # once after a rename) and 'algorithm:hexdigest' is returned
+    if source != destination:
+        if same_filesystem(source, os.path.dirname(destination)):
+            os.replace(source, destination)
+        elif checksum:
+            digest = copy_with_checksum(source, destination, checksum)
+            os.remove(source)
+            return digest
+        else:
+            shutil.move(source, destination)
+    if checksum:
+        return copy_with_checksum(destination, None, checksum)
+
+def copy_with_checksum(source, destination, algorithm, chunk_size=8 * 1024 * 1024):
+    # Hashes source while copying it to destination, or only hashes it when destination is None
+    digest = hashlib.new(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(source, 'rb') as reader, open(destination, 'wb') if destination else contextlib.nullcontext() as writer:
+        while True:
+            size = reader.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+            if writer is not None:
+                writer.write(view[:size])
+    if destination:
+        shutil.copystat(source, destination)
+    return f'{algorithm}:{digest.hexdigest()}'
+
+def probe_media(path):
+    # (duration in seconds, stream types) of a video, None when ffprobe can't read it
+    command = tool_program(ffprobe_command, 'ffprobe') + ['-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', path]
+    try:
+        info = json.loads(subprocess.run(command, capture_output=True, text=True).stdout or '{}')
+        if 'format' not in info:
+            return None
+        return float(info['format'].get('duration') or 0), [stream.get('codec_type') for stream in info.get('streams', [])]
+    except Exception as e:
+        print(f'Exception in probe_media: {e}')
+        return None
+
+def ffprobe_missing():
+    # True when ffprobe can't be started at all, a missing tool says nothing about the video
+    global ffprobe_unavailable
+    if ffprobe_unavailable is None:
+        try:
+            subprocess.run(tool_program(ffprobe_command, 'ffprobe') + ['-version'], capture_output=True)
+            ffprobe_unavailable = False
+        except OSError as e:
+            print(f"warning: ffprobe can't run ({e}), finished videos are kept without being verified")
+            ffprobe_unavailable = True
+    return ffprobe_unavailable
+
+def check_video(path, source=None, setlist_seconds=None):
+    # (what is wrong with a finished video or None, its duration), compared with the running
+    # time of the setlist and the downloaded file it was remuxed from when those are known
+    probed = probe_media(path)
+    if probed is None:
+        return "ffprobe can't read it", None
+    duration, streams = probed
+    for stream_type in ('video', 'audio'):
+        if stream_type not in streams:
+            return f"no {stream_type} stream", duration
+    if duration < verify_min_duration_minutes * 60:
+        return f"only {duration / 60:.1f} minutes long", duration
+    if setlist_seconds and duration < setlist_seconds * verify_min_setlist_ratio:
+        return f"{duration / 60:.0f} minutes long but the setlist runs {setlist_seconds / 60:.0f}", duration
+    expected = probe_media(source) if source else None
+    if expected and expected[0] and abs(expected[0] - duration) > max(2.0, expected[0] * 0.01):
+        return f"{duration:.0f}s long but the download is {expected[0]:.0f}s", duration
+    return None, duration
+
+def tool_program(command, name):
+    # The configured command line, or the program of that name in the binaries folder
+    if command:
+        return nugs_downloader.split_command(command)
+    return [os.path.join(os.getcwd(), "binaries", name)]
+
+def convert_to_mkv(filename, new_filename=None):
+    # Stream copies into .mkv, straight to new_filename when given so the remux is the only write
+    if new_filename is None:
+        if filename.endswith('.mkv'):
+            return filename
         new_filename = filename.rsplit('.', 1)[0] + '.mkv'
-        ffmpeg_convert_command = [ os.path.join(os.getcwd(), "binaries",'ffmpeg'), '-i', filename, '-c', 'copy', new_filename]
-        subprocess.run(ffmpeg_convert_command)
-        return new_filename
-    return filename
+    # Construct the FFmpeg command to convert the file to .mkv
+    ffmpeg_program = tool_program(ffmpeg_command, 'ffmpeg')
+    # Every stream but data streams (e.g. timed_id3 in HLS .ts), which matroska can't hold
+    ffmpeg_convert_command = ffmpeg_program + ['-y', '-i', filename, '-map', '0', '-map', '-0:d', '-c', 'copy', '-f', 'matroska', new_filename]
+    with metrics.span('remux'):
+        returncode = subprocess.run(ffmpeg_convert_command).returncode
+    if returncode != 0:
+        if os.path.exists(new_filename):
+            os.remove(new_filename)
+        return None
+    return new_filename
+
+def read_chapters(video_file):
+    # [(start, end, title)] in seconds, empty when the video has no chapters
+    command = tool_program(ffprobe_command, 'ffprobe') + ['-v', 'quiet', '-print_format', 'json', '-show_chapters', video_file]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+        chapters = json.loads(result.stdout or '{}').get('chapters', [])
+        return [(float(chapter['start_time']), float(chapter['end_time']), chapter.get('tags', {}).get('title'))
+                for chapter in chapters]
+    except Exception as e:
+        print(f'Exception in read_chapters: {e}')
+        return []
 
-def parse_arguments():
+def audio_folder_for(video_file):
+    return os.path.join(audio_directory, os.path.basename(video_file).rsplit('.', 1)[0])
+
+def extract_audio(video_file, song_names=None):
+    # Stream copies the audio tracks of a finished video into the audio directory, one file
+    # per chapter named after the setlist when the video has chapters. Written into a .part
+    # folder that is renamed at the end, so an existing folder means the show is done
+    audio_folder = audio_folder_for(video_file)
+    name = os.path.basename(audio_folder)
+    if os.path.isdir(audio_folder):
+        print(f"audio of {name} already extracted")
+        return True
+    partial_folder = os.path.join(audio_directory, f".{name}.part")
+    try:
+        os.makedirs(partial_folder, exist_ok=True)
+        with metrics.span('audio'):
+            chapters = read_chapters(video_file)
+            # The setlist only names the chapters when they line up one to one
+            if not song_names or len(song_names) != len(chapters):
+                song_names = [title for _, _, title in chapters]
+            pieces = [(None, None, name)] if not chapters else \
+                [(start, end, f"{number:02d} - {sanitize_name(song_names[number - 1] or f'Track {number}')}")
+                 for number, (start, end, _) in enumerate(chapters, 1)]
+            for start, end, piece_name in pieces:
+                command = tool_program(ffmpeg_command, 'ffmpeg') + ['-y', '-v', 'error']
+                if start is not None:
+                    command += ['-ss', f'{start:.3f}', '-to', f'{end:.3f}']
+                command += ['-i', video_file, '-map', '0:a', '-c', 'copy',
+                            os.path.join(partial_folder, f"{piece_name}.{audio_extension}")]
+                if subprocess.run(command).returncode != 0:
+                    print(f"ffmpeg failed to extract the audio of {name}, it will be retried next time")
+                    shutil.rmtree(partial_folder, ignore_errors=True)
+                    return False
+        os.replace(partial_folder, audio_folder)
+        metrics.count('audio_files', len(pieces))
+        print(f"audio of {name} extracted to {audio_folder} ({len(pieces)} files)")
+        return True
+    except Exception as e:
+        print(f'Exception in extract_audio for {name}: {e}')
+        shutil.rmtree(partial_folder, ignore_errors=True)
+        return False
+
+COMMANDS = ('download', 'list', 'status', 'reindex', 'export', 'audio')
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description='Automated video downloader for Nugs.net.')
-    parser.add_argument('--page-url', nargs='+', help='URLs of the pages to navigate to. Can be multiple URLs.', default=['https://play.nugs.net/watch/videos/recent'])
-    parser.add_argument('--upload', action='store_true', help='Enable upload functionality for the downloaded video.')
-    return parser.parse_args()
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    download = subparsers.add_parser('download', help='Crawl the pages and download new releases (the default).')
+    download.add_argument('--page-url', nargs='+', help='URLs of the pages to navigate to. Can be multiple URLs.', default=['https://play.nugs.net/watch/videos/recent'])
+    download.add_argument('--upload', action='store_true', help='Enable upload functionality for the downloaded video.')
+    download.add_argument('--full', action='store_true', help='Walk every "Load More" page of each listing instead of stopping at releases seen before.')
+    download.add_argument('--backend', choices=['selenium', 'http'], help='Where release metadata is read from, overrides [catalog] backend in the config ini.')
+    download.add_argument('--metrics', action='store_true', help='Record stage timings for this run, as if [metrics] enabled = true.')
+    download.add_argument('--retry-failed', action='store_true', help='Queue the downloads given up after [verify] max_attempts again.')
+    download.add_argument('--watch', action='store_true', help='Stay running and poll the pages every [watch] interval_minutes until stopped with Ctrl+C or SIGTERM.')
+    show_list = subparsers.add_parser('list', help='List the shows in the library index.')
+    show_list.add_argument('pattern', nargs='?', help='Only shows whose name contains this, ignoring case.')
+    subparsers.add_parser('status', help='Library size, unfinished downloads and catalog counts.')
+    reindex = subparsers.add_parser('reindex', help='Re-parse every saved release page with the current parsers and update changed info.txt files.')
+    reindex.add_argument('--migrate-html', action='store_true', help='First move the saved .html pages in the data directory into the compressed snapshot archive.')
+    export = subparsers.add_parser('export', help='Export the release catalog to a .csv or .parquet file.')
+    export.add_argument('path', help='Output file, .csv or .parquet.')
+    audio = subparsers.add_parser('audio', help='Extract the audio of library videos that has not been extracted yet.')
+    audio.add_argument('pattern', nargs='?', help='Only videos whose name contains this, ignoring case.')
+    argv = sys.argv[1:] if argv is None else argv
+    # Options without a command are a download, so existing cron lines keep working
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['download'] + list(argv)
+    return parser.parse_args(argv)
 
 
 def validate_url(url, valid_choices):
@@ -589,18 +1945,168 @@ def validate_url(url, valid_choices):
 
     return False, f"Invalid URL provided: {url}"
 
+def crawl_pages(pages_to_scrape, browser_session, video_directory, combined_folder_names_set, args):
+    # One pass over the pages, returns False if any of them failed
+    ok = True
+    for page in pages_to_scrape:
+        if shutdown_event.is_set():
+            break
+        try:
+            if api_client is not None and scrape_release_info_http(page, video_directory, combined_folder_names_set, args):
+                continue
+            # One browser and one login for every page in the run
+            driver = browser_session.get_driver()
+            driver = navigate_to_page(driver, page)
+            if 'id.nugs.net/account/login' in driver.current_url:
+                # The saved session was rejected, log in again and retry the page once
+                browser_session.invalidate()
+                driver = navigate_to_page(browser_session.get_driver(), page)
+            ok = scrape_release_info(driver, video_directory, combined_folder_names_set, args) and ok
+        except WebDriverException as e:
+            # Chrome crashed or lost its session, the next poll starts a new one
+            print(f'Exception in crawl_pages: {e.msg}')
+            browser_session.quit()
+            ok = False
+    return ok
+
+def next_poll_delay(failures):
+    # Exponential backoff after failed polls, with jitter so polls don't line up with anything else
+    delay = min(watch_interval_minutes * 2 ** min(failures, 16), watch_max_backoff_minutes) * 60
+    return delay * random.uniform(1 - watch_jitter, 1 + watch_jitter)
+
+def request_shutdown(signum, frame):
+    if shutdown_event.is_set():
+        print('\nstopping running downloads now, they resume next run')
+        cancel_event.set()
+    else:
+        print('\nstopping after the running downloads finish (Ctrl+C again to stop them now)')
+        shutdown_event.set()
+
+def watch_pages(pages_to_scrape, browser_session, video_directory, combined_folder_names_set, args):
+    # Polls the pages until a stop signal, keeping the browser, login, api client and
+    # library index open in between. Only the first poll honours --full
+    failures = 0
+    polls = 0
+    while not shutdown_event.is_set():
+        polls += 1
+        print(f"\npoll {polls} at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        if polls > 1:
+            # The first poll comes right after resume_unfinished_jobs
+            retry_unfinished_downloads()
+        if crawl_pages(pages_to_scrape, browser_session, video_directory, combined_folder_names_set, args):
+            failures = 0
+        else:
+            failures += 1
+        args.full = False
+        metrics.set_gauge('watch_polls', polls)
+        metrics.set_gauge('watch_failed_polls_in_a_row', failures)
+        report_rate_limits()
+        # What a one-shot run does on exit, so a long running watch stays within its limits
+        # and status sees its catalog records
+        catalog_writer.flush()
+        image_cache.evict()
+        rescan_volumes(library_index, storage_volumes)
+        metrics.flush()
+        delay = next_poll_delay(failures)
+        print(f"next poll in {delay / 60:.1f} minutes" + (f" ({failures} failed in a row)" if failures else ''))
+        shutdown_event.wait(delay)
+
+def list_command(args):
+    load_config(quiet=True)
+    index = open_library_index(storage_volumes)
+    try:
+        names = index.names(args.pattern)
+    finally:
+        index.close()
+    for name in names:
+        print(name)
+    print(f"\n{len(names)} shows" + (f" matching '{args.pattern}'" if args.pattern else ''))
+
+def status_command(args):
+    load_config(quiet=True)
+    index = open_library_index(storage_volumes)
+    print(f"library: {index.count()} shows in {', '.join(storage_volumes)}")
+    index.close()
+    if len(storage_volumes) > 1:
+        for volume, free, _ in StoragePool(storage_volumes).describe():
+            print(f"    {volume}: " + (f"{free / GB:.1f} GB free" if free is not None else "not reachable"))
+    journal_path = download_journal_path()
+    if os.path.exists(journal_path):
+        journal = DownloadJournal(journal_path)
+        unfinished = journal.unfinished()
+        failed = journal.failed()
+        journal.close()
+        print(f"unfinished downloads: {len(unfinished)}")
+        for job in unfinished:
+            error = f", {job['error']}" if job['error'] else ''
+            failures = f", failed verification {job['attempts']} times" if job['attempts'] else ''
+            print(f"    {job['display_text']} ({job['state']}{failures}{error})")
+        if failed:
+            print(f"given up after failing verification: {len(failed)} (download --retry-failed tries them again)")
+            for job in failed:
+                print(f"    {job['display_text']} (failed verification {job['attempts']} times, {job['error']})")
+    if shared_queue_enabled and os.path.isdir(shared_queue_directory):
+        jobs = SharedJobQueue(shared_queue_directory)
+        waiting, running, done = jobs.counts()
+        jobs.close()
+        print(f"shared queue: {waiting} waiting, {running} running, {done} done")
+    catalog_paths = catalog_files()
+    if catalog_paths:
+        statuses = {}
+        last_seen = None
+        for record in iter_catalog(catalog_paths):
+            statuses[record.get('status')] = statuses.get(record.get('status'), 0) + 1
+            last_seen = record.get('recorded_at') or last_seen
+        counts = ', '.join(f'{status} {count}' for status, count in sorted(statuses.items(), key=lambda item: str(item[0])))
+        last = f", last at {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_seen))}" if last_seen else ''
+        print(f"catalog: {sum(statuses.values())} releases looked at ({counts}){last}")
+
+def reindex_command(args):
+    load_config()
+    if args.migrate_html:
+        migrate_html_snapshots(data_directory)
+    reindex_saved_pages(data_directory)
+
+def export_command(args):
+    load_config(quiet=True)
+    count = export_catalog(catalog_files(), args.path)
+    print(f"Exported {count} releases to {args.path}")
+
+def audio_command(args):
+    load_config()
+    videos = []
+    for volume in storage_volumes:
+        if not os.path.isdir(volume):
+            continue
+        for entry in os.scandir(volume):
+            if entry.name.endswith('.mkv') and not entry.name.startswith('.') and \
+                    (not args.pattern or args.pattern.lower() in entry.name.lower()):
+                videos.append(entry.path)
+    todo = [video for video in videos if not os.path.isdir(audio_folder_for(video))]
+    print(f"{len(videos) - len(todo)} of {len(videos)} videos already extracted, extracting {len(todo)}")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=audio_workers, thread_name_prefix='audio-worker') as pool:
+        extracted = sum(pool.map(extract_audio, todo))
+    print(f"\nextracted the audio of {extracted} videos" + (f", {len(todo) - extracted} failed" if extracted < len(todo) else ''))
+
 def main():
+    args = parse_arguments()  # Parse command-line arguments
+    commands = {'download': download_command, 'list': list_command, 'status': status_command,
+                'reindex': reindex_command, 'export': export_command, 'audio': audio_command}
+    commands[args.command](args)
+
+def download_command(args):
     print("\n**starting script**")
+    load_selenium()
+    from image_cache import ImageCache
     nugs_email, nugs_password, video_directory = load_credentials()
-    args = parse_arguments()  # Parse command-line arguments
     pages_to_scrape = []  # Initialize an empty list to hold valid URLs
-    folder_names_set_from_file = process_filenames_from_file('processed_filenames.txt')
-    folder_names_set_from_dir = initialize_folder_names_set(video_directory)
-    combined_folder_names_set = folder_names_set_from_dir.union(folder_names_set_from_file)
-
-    print("\npotentially skipping the following (form processed.txt):")
-    for name in sorted(combined_folder_names_set):
-        print(name)
+    global library_index
+    library_index = open_library_index(storage_volumes)
+    global storage_pool
+    storage_pool = StoragePool(storage_volumes, storage_placement, int(min_free_gb * GB))
+    # Shows queued during this run, the index only learns about them once they are moved
+    combined_folder_names_set = set()
+    print(f"\nlibrary index: {library_index.count()} shows already downloaded")
 
     valid_choices = ['watch', 'exclusive']
     for page_url in args.page_url:
@@ -615,11 +2121,87 @@ def main():
         return
 
     print(f'Pages to scrape: {pages_to_scrape}')
-    for page in pages_to_scrape:
-        driver = setup_headless_driver()
-        driver = login_to_nugs(driver, nugs_email, nugs_password)
-        driver = navigate_to_page(driver, page)
-        scrape_release_info(driver, video_directory, combined_folder_names_set, args)
+    if metrics_enabled or args.metrics:
+        metrics.start(host_data_path('metrics.jsonl'), metrics_textfile or host_data_path('nugs_vid_dl.prom'))
+    global download_pipeline, api_client, finalize_pool, download_journal, image_cache, snapshot_store, catalog_writer
+    catalog_writer = CatalogWriter(host_data_path('catalog.jsonl'))
+    snapshot_store = SnapshotStore(host_data_path('snapshots'))
+    image_cache = ImageCache(host_data_path('image_cache'), image_cache_size_mb * 1000 ** 2, image_workers,
+                             limiter=request_bucket)
+    finalize_pool = concurrent.futures.ThreadPoolExecutor(max_workers=remux_workers, thread_name_prefix='remux-worker')
+    global audio_pool
+    if audio_extract:
+        # Its own workers, so extracting never holds up the next remux
+        audio_pool = concurrent.futures.ThreadPoolExecutor(max_workers=audio_workers, thread_name_prefix='audio-worker')
+    global shared_queue
+    if shared_queue_enabled:
+        shared_queue = SharedJobQueue(shared_queue_directory, lease_seconds=lease_minutes * 60)
+        print(f"Sharing download jobs through {shared_queue_directory} as {shared_queue.owner}")
+    download_journal = DownloadJournal(download_journal_path())
+    backend = args.backend or catalog_backend
+    if backend == 'http':
+        print(f'Reading release data from {api_base}')
+        api_client = nugs_api.NugsApiClient(api_base, limiter=request_bucket)
+    global download_concurrency
+    download_concurrency = DownloadConcurrency(download_workers, min_download_workers, max_download_workers,
+                                               adaptive_downloads, max_download_error_rate)
+    if adaptive_downloads:
+        print(f"download workers: {download_concurrency.limit}, adapting between {download_concurrency.minimum} and {download_concurrency.maximum}")
+    report_rate_limits()
+    # Enough threads for the most downloads the controller may allow, the others wait for a slot
+    download_pipeline = DownloadPipeline(download_concurrency.maximum if adaptive_downloads else download_workers,
+                                         job_queue_size, combined_folder_names_set, shared_queue)
+    if args.retry_failed:
+        print(f"{download_journal.retry_failed()} downloads that failed verification queued again")
+    resume_unfinished_jobs()
+    browser_session = BrowserSession(nugs_email, nugs_password, host_data_path('nugs_session_cookies.json'), session_max_age_hours)
+    # A one-shot run that is stopped also lets its downloads finish and keeps the journal tidy
+    previous_handlers = {signum: signal.signal(signum, request_shutdown) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        if args.watch:
+            watch_pages(pages_to_scrape, browser_session, video_directory, combined_folder_names_set, args)
+        else:
+            crawl_pages(pages_to_scrape, browser_session, video_directory, combined_folder_names_set, args)
+    finally:
+        if shutdown_event.is_set():
+            dropped = download_pipeline.drop_pending()
+            if dropped:
+                print(f"{dropped} queued downloads kept in the journal for the next run")
+        browser_session.quit()
+        image_cache.close()
+        image_cache = None
+        snapshot_store.close()
+        snapshot_store = None
+        print("\ncrawl finished, waiting for queued downloads...")
+        download_pipeline.close(busy=lambda: bool(finalize_futures) and not shutdown_event.is_set())
+        download_pipeline = None
+        # Remuxes that haven't started stay 'downloaded' in the journal when stopping now
+        finalize_pool.shutdown(wait=True, cancel_futures=cancel_event.is_set())
+        finalize_pool = None
+        if audio_pool is not None:
+            # Shows not extracted when stopping now are picked up by the audio command
+            audio_pool.shutdown(wait=True, cancel_futures=cancel_event.is_set())
+            audio_pool = None
+        download_journal.close()
+        download_journal = None
+        if shared_queue is not None:
+            shared_queue.close()
+            shared_queue = None
+        catalog_writer.close()
+        catalog_writer = None
+        if api_client is not None:
+            api_client.close()
+            api_client = None
+        library_index.close()
+        library_index = None
+        report_rate_limits()
+        download_concurrency = None
+        summary = metrics.close()
+        if summary:
+            print(f"\nrun summary\n{summary}")
+        # Only now, a second Ctrl+C while waiting for the downloads still stops them
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
 
 
 
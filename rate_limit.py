@@ -0,0 +1,151 @@
+import threading
+import time
+
+# Budgets for everything the script sends to nugs.
+# A TokenBucket spaces out one kind of traffic (page navigations, API and image
+# requests, downloader starts): it refills at rate tokens per second up to burst, and
+# acquire() waits for a token. A 429 pauses the whole bucket for the Retry-After time.
+# DownloadConcurrency limits how many downloads run at once and moves the limit with
+# what it sees: halved after throttling or many failures, raised by one while the total
+# download throughput keeps growing, and lowered again when the last raise didn't help
+# (additive increase, multiplicative decrease).
+
+
+class TokenBucket:
+    def __init__(self, name, rate, burst=1):
+        # rate in tokens per second, 0 = unlimited
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self.throttled = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, cancel=None):
+        # Seconds waited, returns early when the cancel event is set
+        if not self.rate:
+            return 0.0
+        started = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    waited = now - started
+                    self.waited += waited
+                    return waited
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            if cancel is not None:
+                if cancel.wait(delay):
+                    return time.monotonic() - started
+            else:
+                time.sleep(delay)
+
+    def pause(self, seconds):
+        # After a 429, nothing goes out of this bucket for seconds
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.throttled += 1
+
+
+def retry_after_seconds(value, default=30.0):
+    # Retry-After header in seconds (the HTTP date form is rare enough to use the default)
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class DownloadConcurrency:
+    def __init__(self, limit, minimum=1, maximum=4, adaptive=True, max_error_rate=0.2, min_gain=0.05):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, limit))
+        self.adaptive = adaptive
+        self.max_error_rate = max_error_rate
+        self.min_gain = min_gain
+        self.active = 0
+        self.samples = []
+        self.last_throughput = None
+        self.last_change = 0
+        self.throughput = None
+        # Limit that a raise past didn't help, kept for probe_after judgements
+        self.ceiling = None
+        self.ceiling_window = 0
+        self.windows = 0
+        self.probe_after = 10
+        self.changed_at = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self, cancel=None):
+        # Waits for a free slot, False when the cancel event was set meanwhile
+        with self.condition:
+            while self.active >= self.limit:
+                if cancel is not None and cancel.is_set():
+                    return False
+                self.condition.wait(1)
+            self.active += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def record(self, ok, throttled, byte_count, seconds):
+        # One finished download. Returns (old limit, new limit, why) when the limit moved
+        if not self.adaptive:
+            return None
+        finished = time.monotonic()
+        with self.condition:
+            if finished - seconds < self.changed_at and not throttled:
+                # Started under the old limit, it would blur the measurement of the new one
+                return None
+            self.samples.append((ok, throttled, byte_count, finished - seconds, finished))
+            # Judged once as many downloads finished as may run at once
+            if len(self.samples) < max(2, self.limit):
+                return None
+            samples, self.samples = self.samples, []
+            old = self.limit
+            failed = sum(1 for sample in samples if not sample[0] or sample[1])
+            was_throttled = any(sample[1] for sample in samples)
+            # Every slot moves about as fast as an average download of the window
+            speeds = [sample[2] / (sample[4] - sample[3]) for sample in samples if sample[0] and sample[4] > sample[3]]
+            self.throughput = old * sum(speeds) / len(speeds) if speeds else None
+            self.windows += 1
+            if self.ceiling is not None and self.windows - self.ceiling_window >= self.probe_after:
+                # Conditions change, try going past the old ceiling again now and then
+                self.ceiling = None
+            why = None
+            if was_throttled or failed / len(samples) > self.max_error_rate:
+                self.limit = max(self.minimum, self.limit // 2)
+                why = 'throttled' if was_throttled else f'{failed} of {len(samples)} failed'
+                if was_throttled:
+                    # Climb back up to just below where nugs started refusing, not past it
+                    self.ceiling, self.ceiling_window = max(self.minimum, old - 1), self.windows
+                # Throughput measured while being throttled says nothing about the new limit
+                self.last_throughput = None
+            elif self.throughput is None:
+                return None
+            elif self.last_change > 0 and self.throughput < self.last_throughput * (1 + self.min_gain):
+                # The last raise didn't buy anything, go back and stay below it for a while
+                self.limit = max(self.minimum, self.limit - 1)
+                self.ceiling, self.ceiling_window = self.limit, self.windows
+                why = f'{self.throughput / 1000 ** 2:.1f} MB/s, no faster than with {self.limit}'
+            elif self.ceiling is None or self.limit < self.ceiling:
+                self.limit = min(self.maximum, self.limit + 1)
+                why = f'{self.throughput / 1000 ** 2:.1f} MB/s'
+                self.last_throughput = self.throughput
+            self.last_change = self.limit - old
+            if self.limit != old:
+                self.changed_at = finished
+            self.condition.notify_all()
+            if self.limit == old:
+                return None
+            return old, self.limit, why
@@ -0,0 +1,172 @@
+import collections
+import datetime
+import functools
+import re
+import unicodedata
+
+# One place for turning release names and dates into canonical form.
+# Dedupe and file naming both go through here, so a show gets the same
+# (artist, date, venue) key whether it came from a release page, an exclusive,
+# the API, processed_filenames.txt or a file already in the video directory.
+# Patterns are compiled once and results are memoized, a library scan calls
+# dedupe_key for every file name.
+
+# Bumped whenever dedupe_key changes, so stored keys get recomputed
+KEY_VERSION = 2
+
+ReleaseKey = collections.namedtuple('ReleaseKey', ['artist', 'date', 'venue'])
+
+MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+          'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+
+iso_date_pattern = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})(?!\d)')
+month_date_pattern = re.compile(
+    r'\b(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|Sep(?:t(?:ember)?)?|'
+    r'Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b(?:,?\s*(\d{4})\b)?',
+    re.IGNORECASE)
+digit_pattern = re.compile(r'\d')
+numeric_date_pattern = re.compile(r'\b(\d{2})\s(\d{2})\s(\d{4})\b')
+placeholder_date_pattern = re.compile(r'\b(?:Invalid|Unknown) Date\b')
+venue_prefix_pattern = re.compile(r'^(?:(?:Premiere|Friday Night Cheese):\s*)?(?:at\s+)?')
+resolution_pattern = re.compile(r'\d{3,4}p|[248]K|HD|SD', re.IGNORECASE)
+media_extensions = {'mkv', 'mp4', 'm4v', 'mov', 'ts', 'jpg', 'json', 'html'}
+illegal_chars_pattern = re.compile(r'[<>:"/\\|?*]')
+key_separator_pattern = re.compile(r'[<>:"/\\|?*_\s]+')
+comma_pattern = re.compile(r'\s*,[\s,]*')
+colon_comma_pattern = re.compile(r'\s*:\s*,?\s*')
+quote_table = str.maketrans({'‘': "'", '’': "'", '“': '"', '”': '"', '–': '-', '—': '-'})
+
+
+def clean_text(text):
+    # NFKC, straight quotes and single spaces
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKC', text).translate(quote_table)
+    return ' '.join(text.split())
+
+
+def make_date(year, month, day):
+    try:
+        return datetime.date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def find_date(text):
+    # First date in text as (YYYY-MM-DD, start, end), or None.
+    # Handles ISO dates, "December 31, 2004", "Dec 31 2004", "Sept. 9th, 2023" and "12 31 2004";
+    # a date without a year is skipped
+    found = []
+    match = iso_date_pattern.search(text)
+    if match:
+        found.append((match.start(), make_date(*match.groups()), match.end()))
+        # Only a date before the ISO one could come first
+        text = text[:match.start()]
+    if not digit_pattern.search(text):
+        text = ''
+    for match in month_date_pattern.finditer(text):
+        month, day, year = match.groups()
+        if year is None:
+            continue
+        date = make_date(year, MONTHS[month[:3].lower()], day)
+        if date:
+            found.append((match.start(), date, match.end()))
+            break
+    match = numeric_date_pattern.search(text)
+    if match:
+        month, day, year = match.groups()
+        found.append((match.start(), make_date(year, month, day), match.end()))
+    found = [item for item in found if item[1]]
+    if not found:
+        return None
+    start, date, end = min(found)
+    return date, start, end
+
+
+def parse_date(text):
+    # YYYY-MM-DD for the first date in text, or None
+    found = find_date(clean_text(text))
+    return found[0] if found else None
+
+
+def remove_date(text, start, end):
+    # Drops text[start:end] and tidies the punctuation left around it
+    text = text[:start] + ' ' + text[end:]
+    text = colon_comma_pattern.sub(': ', text)
+    text = comma_pattern.sub(', ', text)
+    return ' '.join(text.split()).strip(' ,:')
+
+
+def strip_media_suffix(name):
+    # Drops a trailing extension and resolution tags ("4K 1080p.mkv")
+    base, dot, extension = name.rpartition('.')
+    if dot and extension.lower() in media_extensions:
+        name = base
+    words = name.split(' ')
+    while words and resolution_pattern.fullmatch(words[-1]):
+        words.pop()
+    return ' '.join(words)
+
+
+def clean_venue(venue):
+    venue = clean_text(venue)
+    return venue_prefix_pattern.sub('', venue)
+
+
+@functools.lru_cache(maxsize=65536)
+def release_key(name):
+    # Splits "Artist YYYY-MM-DD Venue, City, ST 1080p.mkv" (or any display/file name
+    # with a recognizable date) into a ReleaseKey, or None when there is no date
+    name = clean_text(name)
+    found = find_date(name)
+    if not found:
+        return None
+    date, start, end = found
+    artist = name[:start]
+    if 'Date' in artist:
+        artist = placeholder_date_pattern.sub('', artist)
+    artist = artist.strip(' -_,')
+    venue = strip_media_suffix(name[end:].strip()).strip(' -_,')
+    return ReleaseKey(artist, date, clean_venue(venue))
+
+
+@functools.lru_cache(maxsize=4096)
+def artist_key(artist):
+    # Case, quote style and characters that get replaced in file names don't matter
+    return key_separator_pattern.sub(' ', clean_text(artist)).strip().casefold()
+
+
+def dedupe_key(name):
+    # "artist date" key for dedupe, the same for every spelling of a show's name
+    key = release_key(name)
+    if key is None or not key.artist:
+        return None
+    return f"{artist_key(key.artist)} {key.date}"
+
+
+def display_name(artist, date, venue):
+    # "Artist YYYY-MM-DD Venue", the name used for data folders and video files
+    return ' '.join(f"{clean_text(artist)} {date} {clean_venue(venue)}".split())
+
+
+def exclusive_display_name(artist, venue, event_date):
+    # Exclusives often carry the real show date in the venue text
+    # ("Archival Roulette: December 31, 2004, Chicago, IL"), which wins over the stream date
+    venue = clean_text(venue)
+    found = find_date(venue)
+    if found:
+        date, start, end = found
+        venue = remove_date(venue, start, end)
+    else:
+        date = event_date if event_date else 'Invalid Date'
+    return display_name(artist, date, venue)
+
+
+def safe_filename(name):
+    # Replaces characters that aren't allowed in Windows file names
+    return illegal_chars_pattern.sub('_', name)
+
+
+def replace_colons(name):
+    return name.replace(':', '_')
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed, deduplicated archive of saved release pages.
+# Pages are appended to one pack file per artist (zstd when the zstandard package is
+# installed, gzip otherwise). An SQLite index maps each release to the offset of its
+# compressed record, identical pages are stored once, and reading a release only
+# decompresses that one record.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    pack TEXT,
+    offset INTEGER,
+    length INTEGER,
+    codec TEXT,
+    raw_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    release_key TEXT PRIMARY KEY,
+    sha256 TEXT,
+    url TEXT,
+    display_text TEXT,
+    saved_at REAL
+);
+'''
+
+
+def compress(data):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(data)
+    return 'gzip', gzip.compress(data, compresslevel=6)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('this snapshot is zstd compressed, install the zstandard package to read it')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def pack_name(artist):
+    return re.sub(r'[^a-z0-9]+', '-', (artist or '').lower()).strip('-') or 'unknown'
+
+
+class SnapshotStore:
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.pack_dir = os.path.join(store_dir, 'packs')
+        os.makedirs(self.pack_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(store_dir, 'snapshots.sqlite3'), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def put(self, release_key, html, url=None, display_text=None, artist=None):
+        # Returns True when new page content was written, False when it was already stored
+        data = html.encode('utf-8')
+        sha256 = hashlib.sha256(data).hexdigest()
+        with self.lock:
+            written = self.conn.execute('SELECT 1 FROM blobs WHERE sha256 = ?', (sha256,)).fetchone() is None
+            if written:
+                codec, compressed = compress(data)
+                pack = pack_name(artist) + '.pack'
+                with open(os.path.join(self.pack_dir, pack), 'ab') as file:
+                    offset = file.tell()
+                    file.write(compressed)
+                    file.flush()
+                    os.fsync(file.fileno())
+            with self.conn:
+                if written:
+                    self.conn.execute('INSERT INTO blobs (sha256, pack, offset, length, codec, raw_size) VALUES (?, ?, ?, ?, ?, ?)',
+                                      (sha256, pack, offset, len(compressed), codec, len(data)))
+                self.conn.execute('INSERT OR REPLACE INTO snapshots (release_key, sha256, url, display_text, saved_at) '
+                                  'VALUES (?, ?, ?, ?, ?)', (release_key, sha256, url, display_text, time.time()))
+        return written
+
+    def get(self, release_key):
+        # The saved HTML of one release, or None; only that record is read and decompressed
+        with self.lock:
+            row = self.conn.execute('SELECT b.pack, b.offset, b.length, b.codec FROM snapshots s '
+                                    'JOIN blobs b ON b.sha256 = s.sha256 WHERE s.release_key = ?', (release_key,)).fetchone()
+        if row is None:
+            return None
+        with open(os.path.join(self.pack_dir, row['pack']), 'rb') as file:
+            file.seek(row['offset'])
+            data = file.read(row['length'])
+        return decompress(row['codec'], data).decode('utf-8')
+
+    def __contains__(self, release_key):
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM snapshots WHERE release_key = ?', (release_key,)).fetchone() is not None
+
+    def entries(self):
+        # (release_key, url, display_text) for every stored release
+        with self.lock:
+            rows = self.conn.execute('SELECT release_key, url, display_text FROM snapshots ORDER BY release_key').fetchall()
+        return [tuple(row) for row in rows]
+
+    def stats(self):
+        with self.lock:
+            snapshots = self.conn.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0]
+            blobs, raw_size, stored_size = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(length), 0) FROM blobs').fetchone()
+        return {'snapshots': snapshots, 'unique_pages': blobs, 'raw_bytes': raw_size, 'stored_bytes': stored_size}
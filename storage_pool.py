@@ -0,0 +1,82 @@
+import itertools
+import os
+import shutil
+import threading
+
+# Output volumes the finished videos are spread over.
+# Before a download starts, its expected size is reserved on one volume. Free space is
+# what the disk reports minus what running downloads have reserved but not written yet,
+# so parallel downloads can't all pick the same nearly full disk. Folders on the same
+# disk share one reservation count.
+
+GB = 1000 ** 3
+
+# Rough size of a ~3 hour show per videoFormat in binaries/config.json
+EXPECTED_SIZE_GB = {1: 1.5, 2: 3, 3: 6, 4: 10, 5: 20}
+
+
+def expected_size_bytes(video_format, override_gb=None):
+    if override_gb:
+        return int(override_gb * GB)
+    return int(EXPECTED_SIZE_GB.get(video_format, max(EXPECTED_SIZE_GB.values())) * GB)
+
+
+class StoragePool:
+    def __init__(self, volumes, placement='free_space', min_free_bytes=0):
+        # placement: 'free_space' (most room first) or 'round_robin'
+        self.volumes = list(dict.fromkeys(volumes))
+        self.placement = placement
+        self.min_free_bytes = min_free_bytes
+        self.lock = threading.Lock()
+        self.reserved = {}
+        self.turns = itertools.cycle(range(len(self.volumes)))
+
+    def device(self, volume):
+        try:
+            return os.stat(volume).st_dev
+        except OSError:
+            return volume
+
+    def free_bytes(self, volume):
+        # None when the volume can't be reached, e.g. an unmounted share
+        try:
+            free = shutil.disk_usage(volume).free
+        except OSError:
+            return None
+        return free - self.reserved.get(self.device(volume), 0) - self.min_free_bytes
+
+    def reserve(self, size_bytes):
+        # Returns the volume the space was reserved on, or None when none has room
+        with self.lock:
+            if self.placement == 'round_robin':
+                start = next(self.turns)
+                candidates = self.volumes[start:] + self.volumes[:start]
+            else:
+                candidates = sorted(self.volumes, key=lambda volume: self.free_bytes(volume) or 0, reverse=True)
+            for volume in candidates:
+                free = self.free_bytes(volume)
+                if free is not None and free >= size_bytes:
+                    device = self.device(volume)
+                    self.reserved[device] = self.reserved.get(device, 0) + size_bytes
+                    return volume
+            return None
+
+    def reserve_on(self, volume, size_bytes):
+        # Reserves on one given folder, e.g. the scratch disk, False when it has no room
+        with self.lock:
+            free = self.free_bytes(volume)
+            if free is None or free < size_bytes:
+                return False
+            device = self.device(volume)
+            self.reserved[device] = self.reserved.get(device, 0) + size_bytes
+            return True
+
+    def release(self, volume, size_bytes):
+        with self.lock:
+            device = self.device(volume)
+            self.reserved[device] = max(0, self.reserved.get(device, 0) - size_bytes)
+
+    def describe(self):
+        # (volume, free bytes or None, reserved bytes) for every volume
+        with self.lock:
+            return [(volume, self.free_bytes(volume), self.reserved.get(self.device(volume), 0)) for volume in self.volumes]